@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+from typing import List, Union
+
+from battery import Battery
+from utils import logger
+import utils
+
+
+class AggregateBattery(Battery):
+    """
+    Combines multiple batteries connected in parallel to one virtual battery.
+
+    The currents and capacities are summed up and the min/max cell voltages are taken over
+    all cells of all batteries. Cell n of the virtual battery has the highest voltage of cell n
+    of all batteries, so that the overvoltage penalty of the charge voltage control reacts on
+    the highest cells. The virtual cells don't belong to one battery, so the voltage sum is the
+    lowest cell voltage sum of the batteries instead of the sum of the virtual cells.
+    The charge and discharge current limits are calculated for each battery and the most
+    restrictive limit is applied to all batteries.
+    """
+
+    def __init__(self, batteries: List[Battery]):
+        """
+        :param batteries: the connected batteries, all of the same type
+        """
+        super(AggregateBattery, self).__init__(
+            batteries[0].port, batteries[0].baud_rate, None
+        )
+        self.batteries = batteries
+        self.type = str(len(batteries)) + "x_" + batteries[0].type
+        self.poll_interval = max(battery.poll_interval for battery in batteries)
+        # lowest cell of all batteries and min/max cell voltage of all cells
+        self.cell_min_no: int = None
+        self.cell_min_voltage: float = None
+        self.cell_max_voltage: float = None
+
+    def test_connection(self) -> bool:
+        """
+        The batteries were already tested, when they were found
+        """
+        return True
+
+    def get_settings(self) -> bool:
+        """
+        Read the settings of all batteries and combine them
+
+        :return: False, if the settings of a battery could not be read or a limit is unknown
+        """
+        result = True
+        for battery in self.batteries:
+            if not battery.get_settings():
+                logger.error(
+                    "Battery "
+                    + battery.connection_name()
+                    + " settings could not be read"
+                )
+                result = False
+
+        self.combine_settings()
+
+        return (
+            result
+            and self.max_battery_charge_current is not None
+            and self.max_battery_discharge_current is not None
+            and self.max_battery_voltage is not None
+            and self.min_battery_voltage is not None
+        )
+
+    def combine_settings(self) -> None:
+        """
+        Combine the settings of all batteries into this battery
+        """
+        self.hardware_version = (
+            str(len(self.batteries)) + "x " + str(self.batteries[0].hardware_version)
+        )
+        self.max_battery_charge_current = self.get_limit(
+            [battery.max_battery_charge_current for battery in self.batteries]
+        )
+        self.max_battery_discharge_current = self.get_limit(
+            [battery.max_battery_discharge_current for battery in self.batteries]
+        )
+        # the narrowest voltage range of all batteries
+        max_voltages = [
+            b.max_battery_voltage
+            for b in self.batteries
+            if b.max_battery_voltage is not None
+        ]
+        self.max_battery_voltage = min(max_voltages) if max_voltages else None
+        min_voltages = [
+            b.min_battery_voltage
+            for b in self.batteries
+            if b.min_battery_voltage is not None
+        ]
+        self.min_battery_voltage = max(min_voltages) if min_voltages else None
+        self.combine_data()
+
+    def config_changed(self, old_values: dict) -> None:
+        """
+        Update the settings of all batteries and combine them again
+        """
+        for battery in self.batteries:
+            battery.config_changed(old_values)
+        self.combine_settings()
+
+    def refresh_data(self) -> bool:
+        """
+        Refresh all batteries and combine their data
+
+        :return: False, if one of the batteries could not be read
+        """
+        result = True
+        for battery in self.batteries:
+            # the cell values change, use the live values until the new statistics are calculated
+            battery.cell_stats = None
+            if not battery.refresh_data():
+                logger.debug(
+                    "Battery " + battery.connection_name() + " could not be read"
+                )
+                battery.reset_refreshed()
+                result = False
+
+        if result:
+            self.combine_data()
+
+        return result
+
+    def combine_data(self) -> None:
+        """
+        Combine the data of all batteries into this battery
+        """
+        for battery in self.batteries:
+            battery.calculate_cell_statistics()
+
+        voltages = [b.voltage for b in self.batteries if b.voltage is not None]
+        self.voltage = sum(voltages) / len(voltages) if voltages else None
+        self.current = self.get_sum([b.current for b in self.batteries])
+        self.capacity = self.get_sum([b.capacity for b in self.batteries])
+        self.capacity_remain = self.get_sum([b.capacity_remain for b in self.batteries])
+
+        # weight the SoC with the capacity of the batteries
+        if all(b.soc is not None and b.capacity for b in self.batteries):
+            self.soc = sum(b.soc * b.capacity for b in self.batteries) / self.capacity
+        else:
+            socs = [b.soc for b in self.batteries if b.soc is not None]
+            self.soc = sum(socs) / len(socs) if socs else None
+
+        cycles = [b.cycles for b in self.batteries if b.cycles is not None]
+        self.cycles = max(cycles) if cycles else None
+
+        self.charge_fet = self.get_all([b.charge_fet for b in self.batteries])
+        self.discharge_fet = self.get_all([b.discharge_fet for b in self.batteries])
+        balance_fets = [
+            b.balance_fet for b in self.batteries if b.balance_fet is not None
+        ]
+        self.balance_fet = any(balance_fets) if balance_fets else None
+
+        # take the worst protection state of all batteries
+        for name in vars(self.protection):
+            values = [
+                getattr(b.protection, name)
+                for b in self.batteries
+                if getattr(b.protection, name) is not None
+            ]
+            setattr(self.protection, name, max(values) if values else None)
+
+        # highest and lowest temperature of all batteries
+        max_temps = [b.get_max_temp() for b in self.batteries]
+        min_temps = [b.get_min_temp() for b in self.batteries]
+        self.temp_sensors = 2
+        self.temp1 = max([t for t in max_temps if t is not None], default=None)
+        self.temp2 = min([t for t in min_temps if t is not None], default=None)
+        mos_temps = [b.temp_mos for b in self.batteries if b.temp_mos is not None]
+        self.temp_mos = max(mos_temps) if mos_temps else None
+
+        # cell n has the highest voltage of cell n of all batteries
+        cell_counts = [b.cell_count for b in self.batteries if b.cell_count]
+        self.cell_count = min(cell_counts) if cell_counts else None
+        if self.cell_count is not None:
+            self.cells.resize(self.cell_count)
+            voltages = []
+            balances = []
+            for c in range(self.cell_count):
+                cell_voltages = [
+                    b.get_cell_voltage(c)
+                    for b in self.batteries
+                    if b.get_cell_voltage(c) is not None
+                ]
+                voltages.append(max(cell_voltages) if cell_voltages else None)
+                balances.append(any(b.get_cell_balancing(c) for b in self.batteries))
+            self.cells.set_voltages(voltages)
+            self.cells.set_balances(balances)
+
+        # min/max cell voltage of all cells, used by calculate_cell_statistics()
+        self.cell_min_voltage = None
+        self.cell_min_no = None
+        for battery in self.batteries:
+            voltage = battery.get_min_cell_voltage()
+            if voltage is not None and (
+                self.cell_min_voltage is None or voltage < self.cell_min_voltage
+            ):
+                self.cell_min_voltage = voltage
+                self.cell_min_no = battery.get_min_cell()
+        max_voltages = [b.get_max_cell_voltage() for b in self.batteries]
+        self.cell_max_voltage = max(
+            [v for v in max_voltages if v is not None], default=None
+        )
+
+    def calculate_cell_statistics(self) -> None:
+        """
+        Calculate the cell statistics of the virtual cells, but keep the lowest cell of all batteries
+        """
+        super(AggregateBattery, self).calculate_cell_statistics()
+        if self.cell_stats is not None:
+            self.cell_stats.voltage_sum = self.get_cell_voltage_sum()
+            if self.cell_min_no is not None:
+                self.cell_stats.min_no = self.cell_min_no
+
+    def get_cell_voltage_sum(self) -> float:
+        """
+        The lowest cell voltage sum of all batteries. The batteries are connected in parallel,
+        so this is the real voltage of the bus, while the sum of the virtual cells would be
+        higher than the voltage of each battery.
+
+        :return: The lowest sum of all cell voltages of a battery
+        """
+        voltage_sums = [
+            battery.get_cell_voltage_sum()
+            for battery in self.batteries
+            if battery.cell_count
+        ]
+        return min(voltage_sums) if voltage_sums else 0
+
+    def manage_charge_current(self) -> None:
+        """
+        Calculate the charge and discharge current limits of each battery and apply the most
+        restrictive limit multiplied by the number of batteries
+        """
+        for battery in self.batteries:
+            # the batteries don't run manage_charge_voltage(), which sets soc_calc
+            battery.soc_calc = self.soc_calc if utils.SOC_CALCULATION else battery.soc
+            battery.manage_charge_current()
+
+        self.control_charge_current = self.get_limit(
+            [battery.control_charge_current for battery in self.batteries]
+        )
+        self.control_discharge_current = self.get_limit(
+            [battery.control_discharge_current for battery in self.batteries]
+        )
+        self.control_allow_charge = self.get_all(
+            [battery.control_allow_charge for battery in self.batteries]
+        )
+        self.control_allow_discharge = self.get_all(
+            [battery.control_allow_discharge for battery in self.batteries]
+        )
+
+        # show the limitation of the most restrictive battery
+        limiting = min(
+            self.batteries,
+            key=lambda b: (
+                b.control_charge_current
+                if b.control_charge_current is not None
+                else float("inf")
+            ),
+        )
+        self.charge_limitation = limiting.charge_limitation
+        limiting = min(
+            self.batteries,
+            key=lambda b: (
+                b.control_discharge_current
+                if b.control_discharge_current is not None
+                else float("inf")
+            ),
+        )
+        self.discharge_limitation = limiting.discharge_limitation
+
+    def get_limit(self, values: List[Union[float, None]]) -> Union[float, None]:
+        """
+        The most restrictive limit of all batteries multiplied by the number of batteries
+        """
+        values = [v for v in values if v is not None]
+        return round(min(values) * len(self.batteries), 3) if values else None
+
+    @staticmethod
+    def get_sum(values: List[Union[float, None]]) -> Union[float, None]:
+        """
+        The sum of the values, None if a value is missing
+        """
+        return None if None in values else sum(values)
+
+    @staticmethod
+    def get_all(values: List[Union[bool, None]]) -> Union[bool, None]:
+        """
+        True, if all values are True. None, if no value is known
+        """
+        values = [v for v in values if v is not None]
+        return all(values) if values else None
@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
-from typing import Union, Tuple, List, Callable
+from typing import Union, Tuple, List, Callable, Dict, Iterable, Iterator, Set
 
 from utils import logger
 import utils
 import logging
 import math
-from time import time
+from array import array
+from collections.abc import MutableSequence
+from time import monotonic, time
 from abc import ABC, abstractmethod
 import sys
+import threading
 
 
 class Protection(object):
@@ -39,13 +42,197 @@ class Protection(object):
 class Cell:
     """
     This class holds information about a single Cell
-    """
 
-    voltage = None
-    balance = None
+    Once the cell is added to a CellStore (Battery.cells), the values are kept in the arrays of the
+    store and the Cell is only a view on them
+    """
 
     def __init__(self, balance):
-        self.balance = balance
+        self._store: CellStore = None
+        self._index: int = None
+        self._voltage: float = None
+        self._balance: bool = balance
+        self._temp: float = None
+
+    @property
+    def voltage(self) -> Union[float, None]:
+        if self._store is None:
+            return self._voltage
+        return _from_float(self._store.voltages[self._index])
+
+    @voltage.setter
+    def voltage(self, value: Union[float, None]) -> None:
+        if self._store is None:
+            self._voltage = value
+        else:
+            self._store.voltages[self._index] = _to_float(value)
+
+    @property
+    def balance(self) -> Union[bool, None]:
+        if self._store is None:
+            return self._balance
+        return _from_flag(self._store.balances[self._index])
+
+    @balance.setter
+    def balance(self, value: Union[bool, None]) -> None:
+        if self._store is None:
+            self._balance = value
+        else:
+            self._store.balances[self._index] = _to_flag(value)
+
+    @property
+    def temp(self) -> Union[float, None]:
+        if self._store is None:
+            return self._temp
+        return _from_float(self._store.temps[self._index])
+
+    @temp.setter
+    def temp(self, value: Union[float, None]) -> None:
+        if self._store is None:
+            self._temp = value
+        else:
+            self._store.temps[self._index] = _to_float(value)
+
+
+# NaN and -1 mark missing values in the arrays of the CellStore
+def _to_float(value: Union[float, None]) -> float:
+    return math.nan if value is None else float(value)
+
+
+def _from_float(value: float) -> Union[float, None]:
+    return None if math.isnan(value) else value
+
+
+def _to_flag(value: Union[bool, None]) -> int:
+    return -1 if value is None else (1 if value else 0)
+
+
+def _from_flag(value: int) -> Union[bool, None]:
+    return None if value == -1 else value == 1
+
+
+class CellStore(MutableSequence):
+    """
+    This class holds the cells of a battery. It behaves like a list of Cell objects, but the values
+    are stored in arrays, which can be filled by the drivers in one call and are cheap to evaluate.
+
+    - voltages: cell voltages in V, NaN if unknown
+    - balances: 1 if balancing, 0 if not, -1 if unknown
+    - temps: cell temperatures in °C, NaN if unknown
+    """
+
+    def __init__(self, cells: Iterable[Cell] = ()):
+        self.voltages = array("d")
+        self.balances = array("b")
+        self.temps = array("d")
+        self._cells: List[Cell] = []
+        for cell in cells:
+            self.append(cell)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __iter__(self) -> Iterator[Cell]:
+        return iter(self._cells)
+
+    def __getitem__(self, index):
+        return self._cells[index]
+
+    def __setitem__(self, index, cell: Cell) -> None:
+        if isinstance(index, slice):
+            raise TypeError("CellStore does not support slice assignment")
+        index = range(len(self._cells))[index]
+        del self[index]
+        self.insert(index, cell)
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            for i in sorted(range(len(self._cells))[index], reverse=True):
+                del self[i]
+            return
+
+        index = range(len(self._cells))[index]
+        cell = self._cells.pop(index)
+        cell._voltage = _from_float(self.voltages.pop(index))
+        cell._balance = _from_flag(self.balances.pop(index))
+        cell._temp = _from_float(self.temps.pop(index))
+        cell._store = None
+        cell._index = None
+        for i in range(index, len(self._cells)):
+            self._cells[i]._index = i
+
+    def insert(self, index: int, cell: Cell) -> None:
+        # a cell can only be a view on one store, copy it if it's already part of another one
+        if cell._store is not None:
+            source = cell
+            cell = Cell(source.balance)
+            cell._voltage = source.voltage
+            cell._temp = source.temp
+
+        if index < 0:
+            index = max(len(self._cells) + index, 0)
+        index = min(index, len(self._cells))
+        self.voltages.insert(index, _to_float(cell._voltage))
+        self.balances.insert(index, _to_flag(cell._balance))
+        self.temps.insert(index, _to_float(cell._temp))
+        self._cells.insert(index, cell)
+        cell._store = self
+        for i in range(index, len(self._cells)):
+            self._cells[i]._index = i
+
+    def resize(self, count: int, balance: bool = False) -> None:
+        """
+        Add or remove cells at the end, so that the store holds `count` cells
+
+        :param count: the number of cells
+        :param balance: the balance state of the added cells
+        """
+        while len(self._cells) > count:
+            del self[-1]
+        while len(self._cells) < count:
+            self.append(Cell(balance))
+
+    def set_voltages(
+        self, voltages: Iterable[Union[float, None]], start: int = 0
+    ) -> None:
+        """
+        Set the voltages of consecutive cells in one call, e.g. from the result of struct.unpack_from()
+
+        :param voltages: the cell voltages in V
+        :param start: the index of the first cell to set
+        """
+        for index, voltage in enumerate(voltages, start):
+            self.voltages[index] = _to_float(voltage)
+
+    def set_balances(
+        self, balances: Iterable[Union[bool, None]], start: int = 0
+    ) -> None:
+        """
+        Set the balance states of consecutive cells in one call
+
+        :param balances: the balance states
+        :param start: the index of the first cell to set
+        """
+        for index, balance in enumerate(balances, start):
+            self.balances[index] = _to_flag(balance)
+
+
+class CellStatistics(object):
+    """
+    This class holds the cell values of one poll. They are calculated in a single pass over the cells
+    by Battery.calculate_cell_statistics() after each refresh_data()
+    """
+
+    def __init__(self):
+        self.min_no: int = None
+        self.max_no: int = None
+        self.min_voltage: float = None
+        self.max_voltage: float = None
+        self.voltage_sum: float = 0
+        self.delta: float = None
+        self.midpoint: float = None
+        self.deviation: float = None
+        self.balancing: int = 0
 
 
 class Battery(ABC):
@@ -55,6 +242,25 @@ class Battery(ABC):
     use the individual implementations as type Battery and work with it.
     """
 
+    BUS_ADDRESSABLE: bool = False
+    """
+    True, if multiple BMS of this type can be polled on the same bus by passing their address.
+    See BUS_ADDRESSES in the config.
+    """
+
+    REFRESH_FAST = "fast"
+    """
+    Refresh group of the telemetry, which is read on every poll: voltage, current, SoC and cells
+    """
+    REFRESH_MEDIUM = "medium"
+    """
+    Refresh group of the values, which change slowly: temperatures, balancing, FET states and alarms
+    """
+    REFRESH_SLOW = "slow"
+    """
+    Refresh group of the values, which rarely change: capacity, cycles, identity and settings
+    """
+
     def __init__(self, port: str, baud: int, address: str):
         self.port: str = port
         self.baud_rate: int = baud
@@ -98,8 +304,23 @@ class Battery(ABC):
         # only if available
         self.custom_field: str = None
 
+        # protects the values set by the dbus callbacks in the main loop, which are written
+        # to the BMS by the poll thread, see set_callback_value() and take_callback_value()
+        self.callback_lock = threading.Lock()
+
         self.init_values()
 
+    @property
+    def cells(self) -> CellStore:
+        """
+        The cells of the battery. A list of Cell objects assigned by a driver is converted to a CellStore.
+        """
+        return self._cells
+
+    @cells.setter
+    def cells(self, cells: Iterable[Cell]) -> None:
+        self._cells = cells if isinstance(cells, CellStore) else CellStore(cells)
+
     def init_values(self) -> None:
         """
         Used to reset values, if battery unexpectly disconnects
@@ -126,7 +347,9 @@ class Battery(ABC):
         self.temp3: float = None
         self.temp4: float = None
         self.temp_mos: float = None
-        self.cells: List[Cell] = []
+        self.cells: CellStore = CellStore()
+        # cell values of the current poll, None while the cells are updated
+        self.cell_stats: CellStatistics = None
         self.control_voltage: float = None
         self.soc_reset_requested: bool = False
         self.soc_reset_last_reached: int = 0  # save state to preserve on restart
@@ -147,6 +370,9 @@ class Battery(ABC):
         self.linear_dcl_last_set: int = 0
         # list of available callbacks, in order to display the buttons in the GUI
         self.available_callbacks: List[str] = []
+        # time of the last successful refresh of each refresh group, cleared after a
+        # failed refresh, so that all groups are refreshed again after a disconnect
+        self.refresh_time_last: Dict[str, float] = {}
 
     @abstractmethod
     def test_connection(self) -> bool:
@@ -217,6 +443,39 @@ class Battery(ABC):
         """
         return False
 
+    def config_changed(self, old_values: dict) -> None:
+        """
+        Called by the ConfigWatcher after config values were changed while the driver is running.
+        Updates the settings, which get_settings() derived from the config. Values which were
+        read from the BMS are kept.
+
+        :param old_values: the previous values of the changed settings by name
+        """
+        if (
+            "MAX_BATTERY_CHARGE_CURRENT" in old_values
+            and self.max_battery_charge_current
+            == old_values["MAX_BATTERY_CHARGE_CURRENT"]
+        ):
+            self.max_battery_charge_current = utils.MAX_BATTERY_CHARGE_CURRENT
+        if (
+            "MAX_BATTERY_DISCHARGE_CURRENT" in old_values
+            and self.max_battery_discharge_current
+            == old_values["MAX_BATTERY_DISCHARGE_CURRENT"]
+        ):
+            self.max_battery_discharge_current = utils.MAX_BATTERY_DISCHARGE_CURRENT
+        if (
+            "MIN_CELL_VOLTAGE" in old_values
+            and self.cell_count is not None
+            and self.min_battery_voltage is not None
+            and abs(
+                self.min_battery_voltage
+                - old_values["MIN_CELL_VOLTAGE"] * self.cell_count
+            )
+            < 0.005
+        ):
+            self.min_battery_voltage = utils.MIN_CELL_VOLTAGE * self.cell_count
+        # max_battery_voltage is recalculated by manage_charge_voltage() on every poll
+
     def use_callback(self, callback: Callable) -> bool:
         """
         Each driver may override this function to indicate whether it is
@@ -228,6 +487,55 @@ class Battery(ABC):
         """
         return False
 
+    def get_refresh_periods(self) -> Dict[str, float]:
+        """
+        Get the period of each refresh group. A driver may override it to adjust the periods
+        to its BMS.
+
+        :return: the period in seconds by refresh group
+        """
+        return {
+            self.REFRESH_FAST: 0,
+            self.REFRESH_MEDIUM: utils.REFRESH_PERIOD_MEDIUM,
+            self.REFRESH_SLOW: utils.REFRESH_PERIOD_SLOW,
+        }
+
+    def get_refresh_groups(self) -> Set[str]:
+        """
+        Get the refresh groups, which are due on this poll. A driver, which splits its requests
+        in refresh groups, calls it at the start of refresh_data() and reads only the data of
+        the due groups. A group is due again, when its period passed since it was refreshed
+        successfully, see set_refreshed().
+
+        :return: the due refresh groups, the fast group is always due
+        """
+        now = monotonic()
+        # allow half a poll interval of jitter, else a period of 5 s is only met every 6th poll
+        tolerance = self.poll_interval / 2000
+        return {
+            group
+            for group, period in self.get_refresh_periods().items()
+            if group not in self.refresh_time_last
+            or now - self.refresh_time_last[group] >= period - tolerance
+        }
+
+    def set_refreshed(self, groups: Iterable[str]) -> None:
+        """
+        Mark refresh groups as successfully refreshed
+
+        :param groups: the refreshed groups
+        """
+        now = monotonic()
+        for group in groups:
+            self.refresh_time_last[group] = now
+
+    def reset_refreshed(self) -> None:
+        """
+        Mark all refresh groups as due. Called after a failed refresh, so that the data of
+        all groups is read again, as soon as the BMS replies.
+        """
+        self.refresh_time_last.clear()
+
     @abstractmethod
     def refresh_data(self) -> bool:
         """
@@ -238,6 +546,36 @@ class Battery(ABC):
         """
         return False
 
+    def get_serial_port(
+        self,
+        timeout: float = 0.1,
+        parity: str = utils.serial.PARITY_NONE,
+        stopbits: float = utils.serial.STOPBITS_ONE,
+    ) -> utils.serial.Serial:
+        """
+        Get the serial port of the battery, which is shared with all drivers and kept open across polls.
+        Hold the lock returned by get_serial_port_lock() while communicating.
+
+        :return: the opened serial port
+        """
+        return utils.get_serial_port(
+            self.port, self.baud_rate, timeout, parity, stopbits
+        )
+
+    def get_serial_port_lock(self):
+        """
+        Get the lock that has to be held while communicating over the serial port of the battery
+
+        :return: the lock of the port
+        """
+        return utils.get_serial_port_lock(self.port)
+
+    def close_serial_port(self) -> None:
+        """
+        Close the serial port of the battery after an error, it's opened again on the next poll
+        """
+        utils.close_serial_port(self.port)
+
     def to_temp(self, sensor: int, value: float) -> None:
         """
         Keep the temp value between -20 and 100 to handle sensor issues or no data.
@@ -311,11 +649,7 @@ class Battery(ABC):
             if utils.SOC_CALC_CURRENT:
                 # calculate current from real current
                 self.current_corrected = round(
-                    utils.calcLinearRelationship(
-                        self.get_current(),
-                        utils.SOC_CALC_CURRENT_REPORTED_BY_BMS,
-                        utils.SOC_CALC_CURRENT_MEASURED_BY_USER,
-                    ),
+                    utils.SOC_CALC_CURRENT_CURVE.linear(self.get_current()),
                     3,
                 )
             else:
@@ -464,12 +798,13 @@ class Battery(ABC):
         measurement_tolerance_variation = 0.5
 
         try:
-            # calculate voltage sum and check for cell overvoltage
+            # calculate voltage sum
+            voltage_sum = self.get_cell_voltage_sum()
+
+            # check for cell overvoltage
             for i in range(self.cell_count):
                 voltage = self.get_cell_voltage(i)
                 if voltage:
-                    voltage_sum += voltage
-
                     # calculate penalty sum to prevent single cell overcharge by using current cell voltage
                     if (
                         self.max_battery_voltage != self.soc_reset_battery_voltage
@@ -777,10 +1112,7 @@ class Battery(ABC):
 
         try:
             # calculate battery sum
-            for i in range(self.cell_count):
-                voltage = self.get_cell_voltage(i)
-                if voltage:
-                    voltage_sum += voltage
+            voltage_sum = self.get_cell_voltage_sum()
 
             voltage_cell_diff = (
                 self.get_max_cell_voltage() - self.get_min_cell_voltage()
@@ -1122,16 +1454,11 @@ class Battery(ABC):
 
         try:
             if utils.LINEAR_LIMITATION_ENABLE:
-                return utils.calcLinearRelationship(
-                    self.get_max_cell_voltage(),
-                    utils.CELL_VOLTAGES_WHILE_CHARGING,
-                    utils.MAX_CHARGE_CURRENT_CV,
+                return utils.MAX_CHARGE_CURRENT_CV_CURVE.linear(
+                    self.get_max_cell_voltage()
                 )
-            return utils.calcStepRelationship(
-                self.get_max_cell_voltage(),
-                utils.CELL_VOLTAGES_WHILE_CHARGING,
-                utils.MAX_CHARGE_CURRENT_CV,
-                False,
+            return utils.MAX_CHARGE_CURRENT_CV_CURVE.step(
+                self.get_max_cell_voltage(), False
             )
         except Exception:
             # set state to error, to show in the GUI that something is wrong
@@ -1174,16 +1501,11 @@ class Battery(ABC):
 
         try:
             if utils.LINEAR_LIMITATION_ENABLE:
-                return utils.calcLinearRelationship(
-                    self.get_min_cell_voltage(),
-                    utils.CELL_VOLTAGES_WHILE_DISCHARGING,
-                    utils.MAX_DISCHARGE_CURRENT_CV,
+                return utils.MAX_DISCHARGE_CURRENT_CV_CURVE.linear(
+                    self.get_min_cell_voltage()
                 )
-            return utils.calcStepRelationship(
-                self.get_min_cell_voltage(),
-                utils.CELL_VOLTAGES_WHILE_DISCHARGING,
-                utils.MAX_DISCHARGE_CURRENT_CV,
-                True,
+            return utils.MAX_DISCHARGE_CURRENT_CV_CURVE.step(
+                self.get_min_cell_voltage(), True
             )
         except Exception:
             # set state to error, to show in the GUI that something is wrong
@@ -1229,17 +1551,12 @@ class Battery(ABC):
         try:
             for key, currentMaxTemperature in temps.items():
                 if utils.LINEAR_LIMITATION_ENABLE:
-                    temps[key] = utils.calcLinearRelationship(
-                        currentMaxTemperature,
-                        utils.TEMPERATURES_WHILE_CHARGING,
-                        utils.MAX_CHARGE_CURRENT_T,
+                    temps[key] = utils.MAX_CHARGE_CURRENT_T_CURVE.linear(
+                        currentMaxTemperature
                     )
                 else:
-                    temps[key] = utils.calcStepRelationship(
-                        currentMaxTemperature,
-                        utils.TEMPERATURES_WHILE_CHARGING,
-                        utils.MAX_CHARGE_CURRENT_T,
-                        False,
+                    temps[key] = utils.MAX_CHARGE_CURRENT_T_CURVE.step(
+                        currentMaxTemperature, False
                     )
             return min(temps[0], temps[1])
         except Exception:
@@ -1286,17 +1603,12 @@ class Battery(ABC):
         try:
             for key, currentMaxTemperature in temps.items():
                 if utils.LINEAR_LIMITATION_ENABLE:
-                    temps[key] = utils.calcLinearRelationship(
-                        currentMaxTemperature,
-                        utils.TEMPERATURES_WHILE_DISCHARGING,
-                        utils.MAX_DISCHARGE_CURRENT_T,
+                    temps[key] = utils.MAX_DISCHARGE_CURRENT_T_CURVE.linear(
+                        currentMaxTemperature
                     )
                 else:
-                    temps[key] = utils.calcStepRelationship(
-                        currentMaxTemperature,
-                        utils.TEMPERATURES_WHILE_DISCHARGING,
-                        utils.MAX_DISCHARGE_CURRENT_T,
-                        True,
+                    temps[key] = utils.MAX_DISCHARGE_CURRENT_T_CURVE.step(
+                        currentMaxTemperature, True
                     )
             return min(temps[0], temps[1])
         except Exception:
@@ -1331,17 +1643,8 @@ class Battery(ABC):
         """
         try:
             if utils.LINEAR_LIMITATION_ENABLE:
-                return utils.calcLinearRelationship(
-                    self.soc_calc,
-                    utils.SOC_WHILE_CHARGING,
-                    utils.MAX_CHARGE_CURRENT_SOC,
-                )
-            return utils.calcStepRelationship(
-                self.soc_calc,
-                utils.SOC_WHILE_CHARGING,
-                utils.MAX_CHARGE_CURRENT_SOC,
-                True,
-            )
+                return utils.MAX_CHARGE_CURRENT_SOC_CURVE.linear(self.soc_calc)
+            return utils.MAX_CHARGE_CURRENT_SOC_CURVE.step(self.soc_calc, True)
         except Exception:
             # set state to error, to show in the GUI that something is wrong
             self.state = 10
@@ -1373,17 +1676,8 @@ class Battery(ABC):
         """
         try:
             if utils.LINEAR_LIMITATION_ENABLE:
-                return utils.calcLinearRelationship(
-                    self.soc_calc,
-                    utils.SOC_WHILE_DISCHARGING,
-                    utils.MAX_DISCHARGE_CURRENT_SOC,
-                )
-            return utils.calcStepRelationship(
-                self.soc_calc,
-                utils.SOC_WHILE_DISCHARGING,
-                utils.MAX_DISCHARGE_CURRENT_SOC,
-                True,
-            )
+                return utils.MAX_DISCHARGE_CURRENT_SOC_CURVE.linear(self.soc_calc)
+            return utils.MAX_DISCHARGE_CURRENT_SOC_CURVE.step(self.soc_calc, True)
         except Exception:
             # set state to error, to show in the GUI that something is wrong
             self.state = 10
@@ -1407,12 +1701,105 @@ class Battery(ABC):
             )
             return self.max_battery_discharge_current
 
+    def calculate_cell_statistics(self) -> None:
+        """
+        Calculate the min/max cell, voltage sum, delta, midpoint and balancing state in a single pass
+        over the cells. Until the next refresh_data() the cell getters return these values instead of
+        walking the cells on each call.
+
+        :return: None
+        """
+        self.cell_stats = None
+        if self.cell_count is None:
+            return
+
+        stats = CellStatistics()
+        cell_count = min(len(self.cells), self.cell_count)
+        half_count = int(math.floor(self.cell_count / 2))
+        uneven_cells_offset = self.cell_count % 2
+        half1voltage = 0
+        half2voltage = 0
+        min_voltage = 9999
+        max_voltage = 0
+        # min/max of all cells, used if the BMS does not provide them
+        min_voltage_all = None
+        max_voltage_all = None
+
+        # work on the arrays of the cell store instead of the Cell views
+        if 1 in self.cells.balances[:cell_count]:
+            stats.balancing = 1
+
+        for c, voltage in enumerate(self.cells.voltages):
+            # skip unknown voltages (NaN)
+            if voltage != voltage:
+                continue
+
+            if min_voltage_all is None or voltage < min_voltage_all:
+                min_voltage_all = voltage
+            if max_voltage_all is None or voltage > max_voltage_all:
+                max_voltage_all = voltage
+
+            if c < half_count:
+                half1voltage += voltage
+            elif c >= half_count + uneven_cells_offset:
+                half2voltage += voltage
+
+            if c >= cell_count:
+                continue
+
+            if min_voltage > voltage:
+                min_voltage = voltage
+                stats.min_no = c
+            if max_voltage < voltage:
+                max_voltage = voltage
+                stats.max_no = c
+            stats.voltage_sum += voltage
+
+        if len(self.cells) == 0:
+            stats.min_no = getattr(self, "cell_min_no", None)
+            stats.max_no = getattr(self, "cell_max_no", None)
+
+        stats.min_voltage = getattr(self, "cell_min_voltage", None)
+        if stats.min_voltage is None:
+            stats.min_voltage = min_voltage_all
+        stats.max_voltage = getattr(self, "cell_max_voltage", None)
+        if stats.max_voltage is None:
+            stats.max_voltage = max_voltage_all
+
+        if stats.min_voltage is not None and stats.max_voltage is not None:
+            stats.delta = stats.max_voltage - stats.min_voltage
+
+        if (
+            utils.MIDPOINT_ENABLE
+            and self.cell_count >= 4
+            and len(self.cells) == self.cell_count
+        ):
+            try:
+                extra = (
+                    0
+                    if self.cell_count % 2 == 0
+                    else self.cells[half_count].voltage / 2
+                )
+                # get the midpoint of the battery
+                stats.midpoint = abs(half1voltage + extra)
+                stats.deviation = abs(
+                    (half2voltage - half1voltage) / (half2voltage + half1voltage) * 100
+                )
+            except (TypeError, ValueError, ZeroDivisionError):
+                stats.midpoint = None
+                stats.deviation = None
+
+        self.cell_stats = stats
+
     def get_min_cell(self) -> int:
         """
         Get the cell with the lowest voltage
 
         :return: The number of the cell with the lowest voltage
         """
+        if self.cell_stats is not None:
+            return self.cell_stats.min_no
+
         min_voltage = 9999
         min_cell = None
         if len(self.cells) == 0 and hasattr(self, "cell_min_no"):
@@ -1433,6 +1820,9 @@ class Battery(ABC):
 
         :return: The number of the cell with the highest voltage
         """
+        if self.cell_stats is not None:
+            return self.cell_stats.max_no
+
         max_voltage = 0
         max_cell = None
         if len(self.cells) == 0 and hasattr(self, "cell_max_no"):
@@ -1482,6 +1872,9 @@ class Battery(ABC):
 
         :return: The sum of all cell voltages
         """
+        if self.cell_stats is not None:
+            return self.cell_stats.voltage_sum
+
         voltage_sum = 0
         for i in range(self.cell_count):
             voltage = self.get_cell_voltage(i)
@@ -1570,6 +1963,9 @@ class Battery(ABC):
         return tmp.rstrip()
 
     def get_min_cell_voltage(self) -> Union[float, None]:
+        if self.cell_stats is not None:
+            return self.cell_stats.min_voltage
+
         min_voltage = None
         if hasattr(self, "cell_min_voltage"):
             min_voltage = self.cell_min_voltage
@@ -1584,6 +1980,9 @@ class Battery(ABC):
         return min_voltage
 
     def get_max_cell_voltage(self) -> Union[float, None]:
+        if self.cell_stats is not None:
+            return self.cell_stats.max_voltage
+
         max_voltage = None
         if hasattr(self, "cell_max_voltage"):
             max_voltage = self.cell_max_voltage
@@ -1604,6 +2003,9 @@ class Battery(ABC):
         of the cells and adding 1/2 of the "middle cell" voltage (if it exists)
         :return: a tuple of the voltage in the middle, as well as a percentage deviation (total_voltage / 2)
         """
+        if self.cell_stats is not None:
+            return self.cell_stats.midpoint, self.cell_stats.deviation
+
         if (
             not utils.MIDPOINT_ENABLE
             or self.cell_count is None
@@ -1646,6 +2048,9 @@ class Battery(ABC):
             return None, None
 
     def get_balancing(self) -> int:
+        if self.cell_stats is not None:
+            return self.cell_stats.balancing
+
         for c in range(min(len(self.cells), self.cell_count)):
             if self.cells[c].balance is not None and self.cells[c].balance:
                 return 1
@@ -1934,6 +2339,32 @@ class Battery(ABC):
     def turn_balancing_off_callback(self, path: str, value: int) -> bool:
         return False  # return False to indicate that the callback was not handled
 
+    def set_callback_value(self, name: str, value) -> None:
+        """
+        Set a value requested by a dbus callback, which is written to the BMS on the next poll.
+        Runs in the main loop.
+
+        :param name: the name of the attribute, e.g. "trigger_force_disable_charge"
+        :param value: the requested value
+        """
+        with self.callback_lock:
+            setattr(self, name, value)
+
+    def take_callback_value(self, name: str):
+        """
+        Get a value requested by a dbus callback and reset it to None. Runs in the poll thread.
+
+        The value is read and reset in one step, so that a value set by a callback
+        in between is not lost, but written on the next poll.
+
+        :param name: the name of the attribute, e.g. "trigger_force_disable_charge"
+        :return: the requested value or None, if nothing was requested
+        """
+        with self.callback_lock:
+            value = getattr(self, name)
+            setattr(self, name, None)
+        return value
+
     def trigger_soc_reset(self) -> bool:
         """
         This method can be used to implement SOC reset when the battery is assumed to be full
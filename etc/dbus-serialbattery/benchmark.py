@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the charge control, which runs on every poll
+
+The control methods of the battery are driven by a synthetic trace of several days with night
+discharge, solar charging into absorption and float, evening loads and daily temperature swings.
+A simulated clock is used, so the time based states like the float transition and the linear
+recalculation intervals are passed like on a real system, but the trace runs as fast as possible.
+
+For each method the calls per second and the memory allocated per call are reported:
+- peak: the most memory held by temporary objects during a call
+- retained: the memory allocated during a call, which is still referenced after it, like new
+  state values. If objects pile up with every poll, it shows here
+
+The config of the driver is used, so the results show the cost of the own settings.
+
+    python benchmark.py --days 3
+    python benchmark.py --json results.json
+    python benchmark.py --baseline results.json --tolerance 0.2
+
+With --baseline the script exits with 1, if a method got slower or allocates more than the
+tolerance, so it can be used in CI to catch regressions before they reach the GX devices.
+"""
+import argparse
+import bisect
+import json
+import logging
+import math
+import random
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import battery
+from battery import Battery
+from utils import logger
+import utils
+
+
+class TraceSample(NamedTuple):
+    """
+    The values of the battery at one poll
+    """
+
+    time: float
+    """
+    Seconds since the start of the trace
+    """
+    current: float
+    """
+    Current in A, positive while charging
+    """
+    soc: float
+    """
+    SoC in %
+    """
+    cell_voltages: Tuple[float, ...]
+    """
+    Cell voltages in V
+    """
+    temperature: float
+    """
+    Cell temperature in °C
+    """
+
+
+# open circuit voltage of a LiFePO4 cell by SoC
+OCV_SOC = [0, 5, 10, 20, 30, 60, 90, 97, 99, 100]
+OCV_VOLTAGE = [2.80, 3.10, 3.20, 3.25, 3.27, 3.30, 3.33, 3.38, 3.45, 3.55]
+
+# internal resistance of a cell in Ohm
+CELL_RESISTANCE = 0.0003
+
+
+def get_ocv(soc: float) -> float:
+    """
+    Interpolate the open circuit voltage of a cell
+
+    :param soc: the SoC of the cell in %
+    :return: the cell voltage in V
+    """
+    soc = min(max(soc, OCV_SOC[0]), OCV_SOC[-1])
+    index = min(bisect.bisect_right(OCV_SOC, soc), len(OCV_SOC) - 1)
+    soc_low, soc_high = OCV_SOC[index - 1], OCV_SOC[index]
+    voltage_low, voltage_high = OCV_VOLTAGE[index - 1], OCV_VOLTAGE[index]
+    return voltage_low + (voltage_high - voltage_low) * (soc - soc_low) / (
+        soc_high - soc_low
+    )
+
+
+def generate_trace(
+    days: float,
+    interval: float,
+    cell_count: int,
+    capacity: float,
+    seed: int = 1,
+) -> List[TraceSample]:
+    """
+    Generate a synthetic trace of an off grid battery with solar charging
+
+    :param days: length of the trace in days
+    :param interval: time between the samples in seconds, like the poll interval
+    :param cell_count: number of cells in series
+    :param capacity: capacity in Ah
+    :param seed: seed of the random load and imbalance
+    :return: list of samples
+    """
+    rand = random.Random(seed)
+    # imbalance of the cells in % SoC, the high cells run up first when charging
+    cell_offsets = [rand.uniform(-1.5, 1.5) for _ in range(cell_count)]
+    # minimum temperature of each day, some days are below freezing
+    day_temperatures = [rand.uniform(-3.0, 18.0) for _ in range(int(days) + 2)]
+
+    trace = []
+    soc = 60.0
+    load = 0.0
+    samples = int(days * 24 * 3600 / interval)
+    for sample in range(samples):
+        now = sample * interval
+        day = int(now // 86400)
+        hour = (now % 86400) / 3600
+
+        # change the load every few minutes
+        if rand.random() < interval / 300:
+            load = rand.choice([0.02, 0.05, 0.05, 0.1, 0.3]) * capacity
+
+        solar = 0.0
+        if 7 <= hour <= 17:
+            solar = 0.35 * capacity * math.sin(math.pi * (hour - 7) / 10)
+        current = solar - load
+        # the charger reduces the current when the battery is nearly full
+        if current > 0 and soc > 95:
+            current *= max((100 - soc) / 5, 0.01)
+
+        soc = min(max(soc + current * interval / 3600 / capacity * 100, 0.0), 100.0)
+
+        cell_voltages = tuple(
+            round(get_ocv(soc + offset) + current * CELL_RESISTANCE, 3)
+            for offset in cell_offsets
+        )
+        temperature = day_temperatures[day] + 12 * max(
+            math.sin(math.pi * (hour - 8) / 14), 0
+        )
+        trace.append(
+            TraceSample(
+                now, round(current, 2), soc, cell_voltages, round(temperature, 1)
+            )
+        )
+
+    return trace
+
+
+class SimulatedClock:
+    """
+    Replaces the time() used by the battery, so the trace runs faster than real time
+    """
+
+    def __init__(self, start: float):
+        self.start = start
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+
+class BenchmarkBattery(Battery):
+    """
+    Battery fed from the trace instead of a BMS
+    """
+
+    def __init__(self, cell_count: int, capacity: float):
+        super(BenchmarkBattery, self).__init__("benchmark", 0, None)
+        self.type = "Benchmark"
+        self.cell_count = cell_count
+        self.capacity = capacity
+        self.temp_sensors = 2
+        self.max_battery_voltage = utils.MAX_CELL_VOLTAGE * cell_count
+        self.min_battery_voltage = utils.MIN_CELL_VOLTAGE * cell_count
+        self.max_battery_charge_current = utils.MAX_BATTERY_CHARGE_CURRENT
+        self.max_battery_discharge_current = utils.MAX_BATTERY_DISCHARGE_CURRENT
+        self.charge_fet = True
+        self.discharge_fet = True
+        self.cells.resize(cell_count)
+
+    def test_connection(self) -> bool:
+        return True
+
+    def get_settings(self) -> bool:
+        return True
+
+    def refresh_data(self) -> bool:
+        return True
+
+    def apply(self, sample: TraceSample) -> None:
+        """
+        Set the values of a sample like refresh_data() and the poll do
+        """
+        self.cell_stats = None
+        self.cells.set_voltages(sample.cell_voltages)
+        self.voltage = round(sum(sample.cell_voltages), 2)
+        self.current = sample.current
+        self.soc = round(sample.soc, 1)
+        self.capacity_remain = round(self.capacity * sample.soc / 100, 2)
+        self.temp1 = sample.temperature
+        self.temp2 = sample.temperature + 1.0
+        # set by manage_charge_voltage() and needed by the SoC limits, when they run alone
+        if self.soc_calc is None or not utils.SOC_CALCULATION:
+            self.soc_calc = self.soc
+        self.calculate_cell_statistics()
+
+
+def run_control_cycle(bat: Battery) -> None:
+    """
+    The complete charge control of one poll
+    """
+    bat.manage_charge_voltage()
+    bat.manage_charge_current()
+
+
+BENCHMARKS: Dict[str, Callable[[Battery], object]] = {
+    "soc_calculation": Battery.soc_calculation,
+    "manage_charge_voltage_linear": Battery.manage_charge_voltage_linear,
+    "manage_charge_voltage_step": Battery.manage_charge_voltage_step,
+    "manage_charge_current": Battery.manage_charge_current,
+    "calcMaxChargeCurrentReferringToCellVoltage": (
+        Battery.calcMaxChargeCurrentReferringToCellVoltage
+    ),
+    "calcMaxDischargeCurrentReferringToCellVoltage": (
+        Battery.calcMaxDischargeCurrentReferringToCellVoltage
+    ),
+    "calcMaxChargeCurrentReferringToTemperature": (
+        Battery.calcMaxChargeCurrentReferringToTemperature
+    ),
+    "calcMaxDischargeCurrentReferringToTemperature": (
+        Battery.calcMaxDischargeCurrentReferringToTemperature
+    ),
+    "calcMaxChargeCurrentReferringToSoc": Battery.calcMaxChargeCurrentReferringToSoc,
+    "calcMaxDischargeCurrentReferringToSoc": (
+        Battery.calcMaxDischargeCurrentReferringToSoc
+    ),
+    "control_cycle": run_control_cycle,
+}
+
+
+def run_benchmark(
+    function: Callable[[Battery], object],
+    trace: List[TraceSample],
+    cell_count: int,
+    capacity: float,
+    memory_samples: int,
+) -> Dict[str, float]:
+    """
+    Run a method over the trace
+
+    :param function: the method to benchmark, called with the battery
+    :param trace: the samples
+    :param cell_count: number of cells
+    :param capacity: capacity in Ah
+    :param memory_samples: number of samples at the start of the trace, for which the
+        allocations are measured in a second run
+    :return: dict with "calls", "ops_per_second", "peak_bytes" and "retained_bytes" per call
+    """
+    # the battery module imported time() by name, replace it with the simulated clock
+    time_original = battery.time
+    # start at a realistic timestamp, some states use 0 as "never"
+    clock = SimulatedClock(1_700_000_000.0)
+    battery.time = clock.time
+    try:
+        bat = BenchmarkBattery(cell_count, capacity)
+        duration = 0.0
+        for sample in trace:
+            clock.now = clock.start + sample.time
+            bat.apply(sample)
+            time_start = perf_counter()
+            function(bat)
+            duration += perf_counter() - time_start
+
+        peak = 0
+        retained = 0
+        samples = trace[:memory_samples]
+        if len(samples) > 0:
+            bat = BenchmarkBattery(cell_count, capacity)
+            tracemalloc.start()
+            for sample in samples:
+                clock.now = clock.start + sample.time
+                bat.apply(sample)
+                # only count the memory allocated by the call
+                tracemalloc.clear_traces()
+                function(bat)
+                current, peak_call = tracemalloc.get_traced_memory()
+                peak += peak_call
+                retained += current
+            tracemalloc.stop()
+            peak /= len(samples)
+            retained /= len(samples)
+    finally:
+        battery.time = time_original
+
+    return {
+        "calls": len(trace),
+        "ops_per_second": len(trace) / duration if duration > 0 else 0.0,
+        "peak_bytes": peak,
+        "retained_bytes": retained,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    """
+    Compare the results with a baseline
+
+    :return: list of regressions, empty if there is none
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result["ops_per_second"] < base["ops_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['ops_per_second']:.0f} ops/s, baseline"
+                + f" {base['ops_per_second']:.0f} ops/s"
+            )
+        # allow some bytes, the allocations of the interpreter vary slightly
+        for key in ("peak_bytes", "retained_bytes"):
+            if result[key] > base[key] * (1 + tolerance) + 64:
+                regressions.append(
+                    f"{name}: {result[key]:.0f} {key} per call, baseline {base[key]:.0f}"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the charge control methods of the battery"
+    )
+    parser.add_argument("--days", type=float, default=3, help="length of the trace")
+    parser.add_argument(
+        "--interval", type=float, default=5, help="seconds between the samples"
+    )
+    parser.add_argument("--cells", type=int, default=16, help="number of cells")
+    parser.add_argument("--capacity", type=float, default=280, help="capacity in Ah")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the trace")
+    parser.add_argument(
+        "--memory-samples",
+        type=int,
+        default=2000,
+        help="number of samples to measure the allocations, 0 to skip",
+    )
+    parser.add_argument(
+        "--only", action="append", choices=sorted(BENCHMARKS), help="run only this"
+    )
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with the results in this file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed regression compared to the baseline, 0.2 is 20%%",
+    )
+    args = parser.parse_args()
+
+    # the control methods log their changes, which would be measured too
+    logger.setLevel(logging.WARNING)
+
+    trace = generate_trace(
+        args.days, args.interval, args.cells, args.capacity, args.seed
+    )
+    print(
+        f"Trace: {args.days} days, {len(trace)} samples, {args.cells} cells,"
+        + f" {args.capacity} Ah"
+    )
+    print(
+        f"{'benchmark':<48}{'ops/s':>10}{'us/call':>10}{'peak B':>10}{'retained B':>12}"
+    )
+
+    results = {}
+    for name, function in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        result = run_benchmark(
+            function, trace, args.cells, args.capacity, args.memory_samples
+        )
+        results[name] = result
+        ops_per_second = result["ops_per_second"]
+        us_per_call = 1000000 / ops_per_second if ops_per_second > 0 else 0.0
+        print(
+            f"{name:<48}{result['ops_per_second']:>10.0f}"
+            + f"{us_per_call:>10.1f}"
+            + f"{result['peak_bytes']:>10.0f}{result['retained_bytes']:>12.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 from battery import Battery, Cell
-from utils import open_serial_port, logger
+from utils import logger
 import utils
 from struct import unpack_from, pack_into
-from time import sleep, time
+from time import monotonic, sleep
+from typing import Dict, List, Tuple, Union
 from datetime import datetime
 from re import sub
 import sys
@@ -28,6 +29,13 @@ class Daly(Battery):
         self.trigger_force_disable_discharge = None
         self.trigger_force_disable_charge = None
         self.cells_volts_data_lastreadbad = False
+        # received bytes, which were not parsed to a sentence yet
+        self.receive_buffer = bytearray()
+        # wait time between the end of a reply and the next request, learned from the replies
+        self.request_gap = self.REQUEST_GAP_START
+        self.request_gap_floor = self.REQUEST_GAP_MIN
+        self.request_gap_successes = 0
+        self.request_time_last = 0.0
         self.last_charge_mode = self.charge_mode
         # list of available callbacks, in order to display the buttons in the GUI
         self.available_callbacks = [
@@ -60,6 +68,28 @@ class Daly(Battery):
     LENGTH_POS = 3
     CURRENT_ZERO_CONSTANT = 30000
     TEMP_ZERO_CONSTANT = 40
+    SENTENCE_LENGTH = 13
+    SENTENCE_TIMEOUT = 0.5
+    """
+    Time in seconds to wait for the next sentence of a reply
+    """
+    REQUEST_GAP_START = 0.020
+    """
+    Wait time in seconds between a reply and the next request at startup. Without a gap the
+    Daly is not ready and throws a lot of no reply errors
+    """
+    REQUEST_GAP_MIN = 0.002
+    REQUEST_GAP_MAX = 0.050
+    REQUEST_GAP_DECREASE = 0.001
+    """
+    The gap is decreased by this value after every complete reply
+    """
+    REQUEST_GAP_INCREASE = 0.005
+    """
+    The gap is increased by this value after a reply timed out and is not decreased below
+    this value again, until REQUEST_GAP_PROBE replies in a row were complete
+    """
+    REQUEST_GAP_PROBE = 200
 
     def test_connection(self):
         # call a function that will connect to the battery, send a command and retrieve the result.
@@ -67,7 +97,8 @@ class Daly(Battery):
         # Return True if success, False for failure
         result = False
         try:
-            with open_serial_port(self.port, self.baud_rate) as ser:
+            with self.get_serial_port_lock():
+                ser = self.get_serial_port()
                 result = self.read_status_data(ser)
                 # get first data to show in startup log, only if result is true
                 if result:
@@ -87,6 +118,7 @@ class Daly(Battery):
             logger.error(
                 f"Exception occurred: {repr(exception_object)} of type {exception_type} in {file} line #{line}"
             )
+            self.close_serial_port()
             result = False
 
         # give the user a feedback that no BMS was found
@@ -97,7 +129,8 @@ class Daly(Battery):
 
     def get_settings(self):
         self.capacity = utils.BATTERY_CAPACITY if not None else 0.0
-        with open_serial_port(self.port, self.baud_rate) as ser:
+        with self.get_serial_port_lock():
+            ser = self.get_serial_port()
             self.read_capacity(ser)
             self.read_production_date(ser)
 
@@ -108,89 +141,72 @@ class Daly(Battery):
     def refresh_data(self):
         result = False
 
-        # Open serial port to be used for all data reads instead of opening multiple times
+        # Use the shared serial port, which stays open across polls
         try:
-            with open_serial_port(self.port, self.baud_rate) as ser:
-                result = self.read_soc_data(ser)
+            with self.get_serial_port_lock():
+                ser = self.get_serial_port()
+                time_start = monotonic()
+
+                # read the slowly changing data less often, see get_refresh_groups()
+                groups = self.get_refresh_groups()
+                readers = [
+                    (self.REFRESH_FAST, self.command_soc, 1, self.read_soc_data),
+                    (
+                        self.REFRESH_FAST,
+                        self.command_minmax_cell_volts,
+                        1,
+                        self.read_cell_voltage_range_data,
+                    ),
+                    (
+                        self.REFRESH_FAST,
+                        self.command_cell_volts,
+                        self.get_cell_volts_sentences(),
+                        self.read_cells_volts,
+                    ),
+                    (self.REFRESH_MEDIUM, self.command_fet, 1, self.read_fed_data),
+                    (self.REFRESH_MEDIUM, self.command_alarm, 1, self.read_alarm_data),
+                    (
+                        self.REFRESH_MEDIUM,
+                        self.command_minmax_temp,
+                        1,
+                        self.read_temperature_range_data,
+                    ),
+                    (
+                        self.REFRESH_MEDIUM,
+                        self.command_cell_balance,
+                        1,
+                        self.read_balance_state,
+                    ),
+                    (self.REFRESH_SLOW, self.command_status, 1, self.read_status_data),
+                ]
+                readers = [reader for reader in readers if reader[0] in groups]
+
+                replies = self.request_data_multi(
+                    ser,
+                    [(command, sentences) for _, command, sentences, _ in readers],
+                )
+
+                result = True
+                for _, command, _, read in readers:
+                    result = read(ser, replies[command[0]]) and result
                 self.reset_soc = self.soc if self.soc else 0
-                if self.runtime > 0.200:  # TROUBLESHOOTING for no reply errors
-                    logger.debug(
-                        "  |- refresh_data: read_soc_data - result: "
-                        + str(result)
-                        + " - runtime: "
-                        + str(f"{self.runtime:.1f}")
-                        + "s"
-                    )
 
-                result = self.read_fed_data(ser) and result
-                if self.runtime > 0.200:  # TROUBLESHOOTING for no reply errors
-                    logger.debug(
-                        "  |- refresh_data: read_fed_data - result: "
-                        + str(result)
-                        + " - runtime: "
-                        + str(f"{self.runtime:.1f}")
-                        + "s"
-                    )
+                if result:
+                    self.set_refreshed(groups)
 
-                result = self.read_cell_voltage_range_data(ser) and result
-                if self.runtime > 0.200:  # TROUBLESHOOTING for no reply errors
+                runtime = monotonic() - time_start
+                if runtime > 0.500:  # TROUBLESHOOTING for no reply errors
                     logger.debug(
-                        "  |- refresh_data: read_cell_voltage_range_data - result: "
+                        "  |- refresh_data: result: "
                         + str(result)
                         + " - runtime: "
-                        + str(f"{self.runtime:.1f}")
-                        + "s"
+                        + str(f"{runtime:.1f}")
+                        + "s - request gap: "
+                        + str(f"{self.request_gap * 1000:.0f}")
+                        + "ms"
                     )
 
                 self.write_soc_and_datetime(ser)
-                if self.runtime > 0.200:  # TROUBLESHOOTING for no reply errors
-                    logger.debug(
-                        "  |- refresh_data: write_soc_and_datetime - result: "
-                        + str(result)
-                        + " - runtime: "
-                        + str(f"{self.runtime:.1f}")
-                        + "s"
-                    )
-
-                result = self.read_alarm_data(ser) and result
-                if self.runtime > 0.200:  # TROUBLESHOOTING for no reply errors
-                    logger.debug(
-                        "  |- refresh_data: read_alarm_data - result: "
-                        + str(result)
-                        + " - runtime: "
-                        + str(f"{self.runtime:.1f}")
-                        + "s"
-                    )
-
-                result = self.read_temperature_range_data(ser) and result
-                if self.runtime > 0.200:  # TROUBLESHOOTING for no reply errors
-                    logger.debug(
-                        "  |- refresh_data: read_temperature_range_data - result: "
-                        + str(result)
-                        + " - runtime: "
-                        + str(f"{self.runtime:.1f}")
-                        + "s"
-                    )
-
-                result = self.read_balance_state(ser) and result
-                if self.runtime > 0.200:  # TROUBLESHOOTING for no reply errors
-                    logger.debug(
-                        "  |- refresh_data: read_balance_state - result: "
-                        + str(result)
-                        + " - runtime: "
-                        + str(f"{self.runtime:.1f}")
-                        + "s"
-                    )
-
-                result = self.read_cells_volts(ser) and result
-                if self.runtime > 0.200:  # TROUBLESHOOTING for no reply errors
-                    logger.debug(
-                        "  |- refresh_data: read_cells_volts - result: "
-                        + str(result)
-                        + " - runtime: "
-                        + str(f"{self.runtime:.1f}")
-                        + "s"
-                    )
 
                 self.write_charge_discharge_mos(ser)
 
@@ -199,6 +215,7 @@ class Daly(Battery):
 
         except OSError:
             logger.warning("Couldn't open serial port")
+            self.close_serial_port()
 
         if not result:  # TROUBLESHOOTING for no reply errors
             logger.info(
@@ -214,12 +231,13 @@ class Daly(Battery):
                 "Float"
             ) and self.charge_mode.startswith("Float"):
                 # we just entered float mode, so the battery must be full
-                self.soc_to_set = 100
+                self.set_callback_value("soc_to_set", 100)
                 self.write_soc_and_datetime(ser)
         self.last_charge_mode = self.charge_mode
 
-    def read_status_data(self, ser):
-        status_data = self.request_data(ser, self.command_status)
+    def read_status_data(self, ser, status_data=None):
+        if status_data is None:
+            status_data = self.request_data(ser, self.command_status)
         # check if connection success
         if status_data is False:
             logger.debug("No data received in read_status_data()")
@@ -249,16 +267,19 @@ class Daly(Battery):
         logger.debug(self.hardware_version)
         return True
 
-    def read_soc_data(self, ser):
+    def read_soc_data(self, ser, soc_data=None):
         # Ensure data received is valid
         crntMinValid = -(utils.MAX_BATTERY_DISCHARGE_CURRENT * 2.1)
         crntMaxValid = utils.MAX_BATTERY_CHARGE_CURRENT * 1.3
         triesValid = 2
         while triesValid > 0:
             triesValid -= 1
-            soc_data = self.request_data(ser, self.command_soc)
+            # use the already received data only for the first try
+            if soc_data is None:
+                soc_data = self.request_data(ser, self.command_soc)
             # check if connection success
             if soc_data is False:
+                soc_data = None
                 continue
 
             voltage, tmp, current, soc = unpack_from(">hhhh", soc_data)
@@ -277,10 +298,12 @@ class Daly(Battery):
                 return True
 
             logger.warning("read_soc_data - triesValid " + str(triesValid))
+            soc_data = None
         return False
 
-    def read_alarm_data(self, ser):
-        alarm_data = self.request_data(ser, self.command_alarm)
+    def read_alarm_data(self, ser, alarm_data=None):
+        if alarm_data is None:
+            alarm_data = self.request_data(ser, self.command_alarm)
         # check if connection success
         if alarm_data is False:
             logger.warning("No data received in read_alarm_data()")
@@ -389,21 +412,27 @@ class Daly(Battery):
 
         return True
 
-    def read_cells_volts(self, ser):
-        if self.cell_count is None:
-            return True
-
+    def get_cell_volts_sentences(self) -> int:
         # calculate how many sentences we will receive
         # in each sentence, the bms will send 3 cell voltages
         # so for a 4s, we will receive 2 sentences
+        if self.cell_count is None:
+            return 1
         if (int(self.cell_count) % 3) == 0:
-            sentences_expected = int(self.cell_count / 3)
+            return int(self.cell_count / 3)
         else:
-            sentences_expected = int(self.cell_count / 3) + 1
+            return int(self.cell_count / 3) + 1
 
-        cells_volts_data = self.request_data(
-            ser, self.command_cell_volts, sentences_to_receive=sentences_expected
-        )
+    def read_cells_volts(self, ser, cells_volts_data=None):
+        if self.cell_count is None:
+            return True
+
+        sentences_expected = self.get_cell_volts_sentences()
+
+        if cells_volts_data is None:
+            cells_volts_data = self.request_data(
+                ser, self.command_cell_volts, sentences_to_receive=sentences_expected
+            )
 
         if cells_volts_data is False and self.cells_volts_data_lastreadbad is True:
             # if this read out and the last one were bad, report error.
@@ -450,8 +479,9 @@ class Daly(Battery):
                 )
         return True
 
-    def read_cell_voltage_range_data(self, ser):
-        minmax_data = self.request_data(ser, self.command_minmax_cell_volts)
+    def read_cell_voltage_range_data(self, ser, minmax_data=None):
+        if minmax_data is None:
+            minmax_data = self.request_data(ser, self.command_minmax_cell_volts)
         # check if connection success
         if minmax_data is False:
             logger.debug("No data received in read_cell_voltage_range_data()")
@@ -471,8 +501,9 @@ class Daly(Battery):
         self.cell_min_voltage = cell_min_voltage / 1000
         return True
 
-    def read_balance_state(self, ser):
-        balance_data = self.request_data(ser, self.command_cell_balance)
+    def read_balance_state(self, ser, balance_data=None):
+        if balance_data is None:
+            balance_data = self.request_data(ser, self.command_cell_balance)
         # check if connection success
         if balance_data is False:
             logger.debug("No data received in read_balance_state()")
@@ -487,8 +518,9 @@ class Daly(Battery):
 
         return True
 
-    def read_temperature_range_data(self, ser):
-        minmax_data = self.request_data(ser, self.command_minmax_temp)
+    def read_temperature_range_data(self, ser, minmax_data=None):
+        if minmax_data is None:
+            minmax_data = self.request_data(ser, self.command_minmax_temp)
         # check if connection success
         if minmax_data is False:
             logger.debug("No data received in read_temperature_range_data()")
@@ -499,8 +531,9 @@ class Daly(Battery):
         self.temp2 = max_temp - self.TEMP_ZERO_CONSTANT
         return True
 
-    def read_fed_data(self, ser):
-        fed_data = self.request_data(ser, self.command_fet)
+    def read_fed_data(self, ser, fed_data=None):
+        if fed_data is None:
+            fed_data = self.request_data(ser, self.command_fet)
         # check if connection success
         if fed_data is False:
             logger.debug("No data received in read_fed_data()")
@@ -523,7 +556,7 @@ class Daly(Battery):
             logger.debug("No data received in read_capacity()")
             return False
 
-        (capacity, cell_volt) = unpack_from(">LL", capa_data)
+        capacity, cell_volt = unpack_from(">LL", capa_data)
         if capacity is not None and capacity > 0:
             self.capacity = capacity / 1000
             return True
@@ -537,7 +570,7 @@ class Daly(Battery):
             logger.debug("No data received in read_production_date()")
             return False
 
-        (_, _, year, month, day) = unpack_from(">BBBBB", production)
+        _, _, year, month, day = unpack_from(">BBBBB", production)
         self.production = f"{year + 2000}{month:02d}{day:02d}"
         return True
 
@@ -581,17 +614,15 @@ class Daly(Battery):
             return False
 
         self.reset_soc = value
-        self.soc_to_set = value
+        self.set_callback_value("soc_to_set", value)
         return True
 
     def write_soc_and_datetime(self, ser):
-        if self.soc_to_set is None:
+        # take the value, so that it's written only once
+        soc_to_set = self.take_callback_value("soc_to_set")
+        if soc_to_set is None:
             return False
 
-        # wait shortly, else the Daly is not ready and throws a lot of no reply errors
-        # if you see a lot of errors, try to increase in steps of 0.005
-        sleep(0.020)
-
         cmd = bytearray(13)
         now = datetime.now()
 
@@ -609,18 +640,13 @@ class Daly(Battery):
             now.hour,
             now.minute,
             now.second,
-            int(self.soc_to_set * 10),
+            int(soc_to_set * 10),
         )
         cmd[12] = sum(cmd[:12]) & 0xFF
 
-        logger.info(f"write soc {self.soc_to_set}%")
-        self.soc_to_set = None  # Reset value, so we will set it only once
+        logger.info(f"write soc {soc_to_set}%")
 
-        ser.flushOutput()
-        ser.flushInput()
-        ser.write(cmd)
-
-        reply = self.read_sentence(ser, self.command_set_soc)
+        reply = self.request_frames(ser, [(cmd, 1)])[self.command_set_soc[0]]
         if reply is False or reply[0] != 1:
             logger.error("write soc failed")
         return True
@@ -630,11 +656,11 @@ class Daly(Battery):
             return False
 
         if value == 0:
-            self.trigger_force_disable_charge = False
+            self.set_callback_value("trigger_force_disable_charge", False)
             return True
 
         if value == 1:
-            self.trigger_force_disable_charge = True
+            self.set_callback_value("trigger_force_disable_charge", True)
             return True
 
         return False
@@ -644,62 +670,53 @@ class Daly(Battery):
             return False
 
         if value == 0:
-            self.trigger_force_disable_discharge = False
+            self.set_callback_value("trigger_force_disable_discharge", False)
             return True
 
         if value == 1:
-            self.trigger_force_disable_discharge = True
+            self.set_callback_value("trigger_force_disable_discharge", True)
             return True
 
         return False
 
     def write_charge_discharge_mos(self, ser):
-        # wait shortly, else the Daly is not ready and throws a lot of no reply errors
-        # if you see a lot of errors, try to increase in steps of 0.005
-        sleep(0.020)
-
         if (
             self.trigger_force_disable_charge is None
             and self.trigger_force_disable_discharge is None
         ):
             return False
 
-        # wait shortly, else the Daly is not ready and throws a lot of no reply errors
-        # if you see a lot of errors, try to increase in steps of 0.005
-        sleep(0.020)
-
         cmd = bytearray(self.command_base)
 
-        if self.trigger_force_disable_charge is not None:
+        # a value set by a callback while writing is written on the next poll
+        force_disable_charge = self.take_callback_value("trigger_force_disable_charge")
+        if force_disable_charge is not None:
             cmd[2] = self.command_disable_charge_mos[0]
-            cmd[4] = 0 if self.trigger_force_disable_charge else 1
+            cmd[4] = 0 if force_disable_charge else 1
             cmd[12] = sum(cmd[:12]) & 0xFF
             logger.info(
-                f"write force disable charging: {'true' if self.trigger_force_disable_charge else 'false'}"
+                f"write force disable charging: {'true' if force_disable_charge else 'false'}"
             )
-            self.trigger_force_disable_charge = None
-            ser.flushOutput()
-            ser.flushInput()
-            ser.write(cmd)
-
-            reply = self.read_sentence(ser, self.command_disable_charge_mos)
+            reply = self.request_frames(ser, [(cmd, 1)])[
+                self.command_disable_charge_mos[0]
+            ]
             if reply is False or reply[0] != cmd[4]:
                 logger.error("write force disable charge/discharge failed")
                 return False
 
-        if self.trigger_force_disable_discharge is not None:
+        force_disable_discharge = self.take_callback_value(
+            "trigger_force_disable_discharge"
+        )
+        if force_disable_discharge is not None:
             cmd[2] = self.command_disable_discharge_mos[0]
-            cmd[4] = 0 if self.trigger_force_disable_discharge else 1
+            cmd[4] = 0 if force_disable_discharge else 1
             cmd[12] = sum(cmd[:12]) & 0xFF
             logger.info(
-                f"write force disable discharging: {'true' if self.trigger_force_disable_discharge else 'false'}"
+                f"write force disable discharging: {'true' if force_disable_discharge else 'false'}"
             )
-            self.trigger_force_disable_discharge = None
-            ser.flushOutput()
-            ser.flushInput()
-            ser.write(cmd)
-
-            reply = self.read_sentence(ser, self.command_disable_discharge_mos)
+            reply = self.request_frames(ser, [(cmd, 1)])[
+                self.command_disable_discharge_mos[0]
+            ]
             if reply is False or reply[0] != cmd[4]:
                 logger.error("write force disable charge/discharge failed")
                 return False
@@ -713,72 +730,172 @@ class Daly(Battery):
         return buffer
 
     def request_data(self, ser, command, sentences_to_receive=1):
-        # wait shortly, else the Daly is not ready and throws a lot of no reply errors
-        # if you see a lot of errors, try to increase in steps of 0.005
-        sleep(0.020)
-
-        self.runtime = 0
-        time_start = time()
-        ser.flushOutput()
-        ser.flushInput()
-        ser.write(self.generate_command(command))
-
-        reply = bytearray()
-        for i in range(sentences_to_receive):
-            next = self.read_sentence(ser, command)
-            if not next:
-                logger.debug(f"request_data: bad reply no. {i}")
-                return False
-            reply += next
-        self.runtime = time() - time_start
-        return reply
-
-    def read_sentence(self, ser, expected_reply, timeout=0.5):
-        """read one 13 byte sentence from daly smart bms.
-        return false if less than 13 bytes received in timeout secs, or frame errors occured
-        return received datasection as bytearray else
+        return self.request_data_multi(ser, [(command, sentences_to_receive)])[
+            command[0]
+        ]
+
+    def request_data_multi(
+        self, ser, commands: List[Tuple[bytes, int]]
+    ) -> Dict[int, Union[bytearray, bool]]:
         """
-        time_start = time()
+        Request the data of multiple commands in one transaction
 
-        reply = ser.read_until(b"\xA5")
-        if not reply or b"\xA5" not in reply:
-            logger.debug(
-                f"read_sentence {utils.bytearray_to_string(expected_reply)}: no sentence start received"
-            )
-            return False
+        :param ser: the opened serial port
+        :param commands: list of (command, number of sentences in the reply)
+        :return: the data sections of the replies by command byte, False for an incomplete reply
+        """
+        return self.request_frames(
+            ser,
+            [
+                (self.generate_command(command), sentences_to_receive)
+                for command, sentences_to_receive in commands
+            ],
+        )
 
-        idx = reply.index(b"\xA5")
-        reply = reply[idx:]
-        toread = ser.inWaiting()
-        while toread < 12:
-            sleep((12 - toread) * 0.001)
-            toread = ser.inWaiting()
-            time_run = time() - time_start
-            if time_run > timeout:
-                logger.debug(
-                    f"read_sentence {utils.bytearray_to_string(expected_reply)}: timeout"
-                )
-                return False
+    def request_frames(
+        self, ser, frames: List[Tuple[bytearray, int]]
+    ) -> Dict[int, Union[bytearray, bool]]:
+        """
+        Send the frames and collect the replies from the received stream.
 
-        reply += ser.read(12)
-        try:
-            _, id, cmd, length = unpack_from(">BBBB", reply)
-        except Exception:
-            return False
+        The next frame is sent as soon as the reply of the previous one is complete and the
+        learned request gap passed, without flushing the port in between. Every valid sentence
+        is routed to its command by the command byte, so a late sentence of a previous frame still
+        completes its reply instead of being taken as reply of the current frame.
+        Only one frame is on the line at a time, since the RS485 adapters are half duplex.
 
-        # logger.info(f"reply: {utils.bytearray_to_string(reply)}")  # debug
+        :param ser: the opened serial port
+        :param frames: list of (complete command frame, number of sentences in the reply)
+        :return: the data sections of the replies by command byte, False for an incomplete reply
+        """
+        expected = {frame[2]: count for frame, count in frames}
+        replies = {frame[2]: [] for frame, _ in frames}
+
+        # drop the bytes of replies, which were not complete in a previous transaction
+        ser.reset_input_buffer()
+        self.receive_buffer.clear()
+
+        for frame, count in frames:
+            command = frame[2]
+
+            # wait shortly, else the Daly is not ready and throws a lot of no reply errors
+            sleep(max(0.0, self.request_time_last + self.request_gap - monotonic()))
+
+            time_start = monotonic()
+            ser.write(frame)
+
+            deadline = time_start + self.SENTENCE_TIMEOUT
+            timeout = False
+            while len(replies[command]) < count:
+                sentence = self.read_sentence(ser, deadline)
+                if sentence is False:
+                    timeout = True
+                    break
+                if sentence is None:
+                    # the sentence is not sent again, the reply can't be completed
+                    break
+                if (
+                    sentence[2] in replies
+                    and len(replies[sentence[2]]) < expected[sentence[2]]
+                ):
+                    replies[sentence[2]].append(sentence[4:12])
+                    if sentence[2] == command:
+                        deadline = monotonic() + self.SENTENCE_TIMEOUT
+                else:
+                    logger.debug(
+                        f"request_frames: unexpected sentence {utils.bytearray_to_string(sentence)}"
+                    )
 
-        if id != 1 or length != 8 or cmd != expected_reply[0]:
-            logger.debug(
-                f"read_sentence {utils.bytearray_to_string(expected_reply)}: wrong header"
+            self.request_time_last = monotonic()
+            self.runtime = self.request_time_last - time_start
+            complete = len(replies[command]) == count
+            if not complete:
+                logger.debug(
+                    f"request_frames {utils.bytearray_to_string(bytes([command]))}: "
+                    + f"received {len(replies[command])} of {count} sentences"
+                )
+            utils.count_serial_frame(self.port, self.runtime, not complete)
+            if complete or timeout:
+                self.update_request_gap(complete)
+
+        return {
+            command: (
+                bytearray().join(replies[command])
+                if len(replies[command]) == expected[command]
+                else False
             )
-            return False
+            for command in replies
+        }
 
-        chk = unpack_from(">B", reply, 12)[0]
-        if sum(reply[:12]) & 0xFF != chk:
-            logger.debug(
-                f"read_sentence {utils.bytearray_to_string(expected_reply)}: wrong checksum"
+    def update_request_gap(self, complete: bool) -> None:
+        """
+        Learn the shortest gap between a reply and the next request, after which the Daly
+        still replies reliably. Replies with a wrong checksum are not counted, since they
+        are caused by the line and not by a request sent too early
+
+        :param complete: True, if the reply of the last request was complete, False if it
+            timed out
+        """
+        if not complete:
+            self.request_gap_floor = min(
+                self.request_gap + self.REQUEST_GAP_INCREASE, self.REQUEST_GAP_MAX
             )
-            return False
+            self.request_gap = self.request_gap_floor
+            self.request_gap_successes = 0
+            return
+
+        self.request_gap_successes += 1
+        if self.request_gap_successes >= self.REQUEST_GAP_PROBE:
+            # try a shorter gap again, the last error could have had another reason
+            self.request_gap_floor = max(
+                self.request_gap_floor - self.REQUEST_GAP_DECREASE, self.REQUEST_GAP_MIN
+            )
+            self.request_gap_successes = 0
+        self.request_gap = max(
+            self.request_gap - self.REQUEST_GAP_DECREASE, self.request_gap_floor
+        )
+
+    def read_sentence(self, ser, deadline: float) -> Union[bytes, bool, None]:
+        """read the next 13 byte sentence from the received stream.
+        Bytes before the start flag and sentences with a wrong header are skipped
+        return false if no sentence was received until the deadline
+        return None if the sentence has a wrong checksum
+        return the sentence as bytes else
+        """
+        buffer = self.receive_buffer
+        while True:
+            start = buffer.find(b"\xA5")
+            if start < 0:
+                buffer.clear()
+            elif start > 0:
+                del buffer[:start]
+
+            if len(buffer) < self.SENTENCE_LENGTH:
+                data = utils.read_serialport_bytes(
+                    ser, self.SENTENCE_LENGTH - len(buffer), deadline
+                )
+                if not data:
+                    logger.debug("read_sentence: timeout")
+                    return False
+                buffer.extend(data)
+                continue
 
-        return reply[4:12]
+            # header: start flag, address 1 for replies, command, length 8
+            if buffer[1] != 1 or buffer[3] != 8:
+                logger.debug(
+                    "read_sentence: wrong header "
+                    + utils.bytearray_to_string(buffer[: self.SENTENCE_LENGTH])
+                )
+                # search the next start flag
+                del buffer[:1]
+                continue
+
+            sentence = bytes(buffer[: self.SENTENCE_LENGTH])
+            del buffer[: self.SENTENCE_LENGTH]
+            if sum(sentence[:12]) & 0xFF != sentence[12]:
+                logger.debug(
+                    "read_sentence: wrong checksum "
+                    + utils.bytearray_to_string(sentence)
+                )
+                return None
+            return sentence
@@ -17,6 +17,7 @@ from utils import (
     MIN_CELL_VOLTAGE,
 )
 from struct import unpack_from
+from time import monotonic
 import can
 
 
@@ -30,7 +31,6 @@ class Daly_Can(Battery):
         self.cell_min_no = None
         self.cell_max_no = None
         self.poll_interval = 1000
-        self.poll_step = 0
         self.type = self.BATTERYTYPE
         self.can_bus = None
 
@@ -62,6 +62,10 @@ class Daly_Can(Battery):
     LENGTH_POS = 3
     CURRENT_ZERO_CONSTANT = 30000
     TEMP_ZERO_CONSTANT = 40
+    REQUEST_TIMEOUT = 0.5
+    """
+    Time in seconds to wait for the response of a request, counted from sending the request
+    """
 
     def test_connection(self):
         result = False
@@ -99,25 +103,36 @@ class Daly_Can(Battery):
         return True
 
     def refresh_data(self):
-        result = False
+        # send all requests back to back and collect the responses in one round trip
+        responses = self.read_bus_data_daly_multi(
+            self.can_bus,
+            {
+                self.command_soc: 1,
+                self.command_fet: 1,
+                # get_min_cell_voltage and get_max_cell_voltage in battery.py need it
+                # at first cycle for publish_dbus in dbushelper.py
+                self.command_minmax_cell_volts: 1,
+                self.command_alarm: 1,
+                self.command_cell_volts: self.get_cell_volts_frame_count(),
+                self.command_minmax_temp: 1,
+            },
+        )
+
+        result = self.read_soc_data(self.can_bus, responses[self.command_soc])
+        result = result and self.read_fed_data(
+            self.can_bus, responses[self.command_fet]
+        )
+        result = result and self.read_cell_voltage_range_data(
+            self.can_bus, responses[self.command_minmax_cell_volts]
+        )
 
-        result = self.read_soc_data(self.can_bus)
-        result = result and self.read_fed_data(self.can_bus)
-        if self.poll_step == 0:
-            # This must be listed in step 0 as get_min_cell_voltage and get_max_cell_voltage in battery.py
-            # needs it at first cycle for publish_dbus in dbushelper.py
-            result = result and self.read_cell_voltage_range_data(self.can_bus)
-        elif self.poll_step == 1:
-            result = result and self.read_alarm_data(self.can_bus)
-        elif self.poll_step == 2:
-            result = result and self.read_cells_volts(self.can_bus)
-        elif self.poll_step == 3:
-            result = result and self.read_temperature_range_data(self.can_bus)
-            # else:          # A placeholder to remind this is the last step. Add any additional steps before here
-            # This is last step so reset poll_step
-            self.poll_step = -1
-
-        self.poll_step += 1
+        # keep the last values of the other data, if their response was lost
+        if result:
+            self.read_alarm_data(self.can_bus, responses[self.command_alarm])
+            self.read_cells_volts(self.can_bus, responses[self.command_cell_volts])
+            self.read_temperature_range_data(
+                self.can_bus, responses[self.command_minmax_temp]
+            )
 
         return result
 
@@ -147,13 +162,14 @@ class Daly_Can(Battery):
         logger.info(self.hardware_version)
         return True
 
-    def read_soc_data(self, ser):
+    def read_soc_data(self, ser, soc_data=None):
         # Ensure data received is valid
         crntMinValid = -(MAX_BATTERY_DISCHARGE_CURRENT * 2.1)
         crntMaxValid = MAX_BATTERY_CHARGE_CURRENT * 1.3
         triesValid = 2
         while triesValid > 0:
-            soc_data = self.read_bus_data_daly(ser, self.command_soc)
+            if soc_data is None:
+                soc_data = self.read_bus_data_daly(ser, self.command_soc)
             # check if connection success
             if soc_data is False:
                 return False
@@ -173,11 +189,14 @@ class Daly_Can(Battery):
 
             logger.warning("read_soc_data - triesValid " + str(triesValid))
             triesValid -= 1
+            # request the data again
+            soc_data = None
 
         return False
 
-    def read_alarm_data(self, ser):
-        alarm_data = self.read_bus_data_daly(ser, self.command_alarm)
+    def read_alarm_data(self, ser, alarm_data=None):
+        if alarm_data is None:
+            alarm_data = self.read_bus_data_daly(ser, self.command_alarm)
         # check if connection success
         if alarm_data is False:
             logger.warning("read_alarm_data")
@@ -286,11 +305,12 @@ class Daly_Can(Battery):
 
         return True
 
-    def read_cells_volts(self, can_bus):
+    def read_cells_volts(self, can_bus, cells_volts_data=None):
         if self.cell_count is not None:
-            cells_volts_data = self.read_bus_data_daly(
-                can_bus, self.command_cell_volts, 6
-            )
+            if cells_volts_data is None:
+                cells_volts_data = self.read_bus_data_daly(
+                    can_bus, self.command_cell_volts, self.get_cell_volts_frame_count()
+                )
             if cells_volts_data is False:
                 logger.warning("read_cells_volts")
                 return False
@@ -322,8 +342,9 @@ class Daly_Can(Battery):
 
         return True
 
-    def read_cell_voltage_range_data(self, ser):
-        minmax_data = self.read_bus_data_daly(ser, self.command_minmax_cell_volts)
+    def read_cell_voltage_range_data(self, ser, minmax_data=None):
+        if minmax_data is None:
+            minmax_data = self.read_bus_data_daly(ser, self.command_minmax_cell_volts)
         # check if connection success
         if minmax_data is False:
             logger.warning("read_cell_voltage_range_data")
@@ -343,8 +364,9 @@ class Daly_Can(Battery):
         self.cell_min_voltage = cell_min_voltage / 1000
         return True
 
-    def read_temperature_range_data(self, ser):
-        minmax_data = self.read_bus_data_daly(ser, self.command_minmax_temp)
+    def read_temperature_range_data(self, ser, minmax_data=None):
+        if minmax_data is None:
+            minmax_data = self.read_bus_data_daly(ser, self.command_minmax_temp)
         # check if connection success
         if minmax_data is False:
             logger.debug("read_temperature_range_data")
@@ -355,8 +377,9 @@ class Daly_Can(Battery):
         self.temp2 = max_temp - self.TEMP_ZERO_CONSTANT
         return True
 
-    def read_fed_data(self, ser):
-        fed_data = self.read_bus_data_daly(ser, self.command_fet)
+    def read_fed_data(self, ser, fed_data=None):
+        if fed_data is None:
+            fed_data = self.read_bus_data_daly(ser, self.command_fet)
         # check if connection success
         if fed_data is False:
             logger.debug("read_fed_data")
@@ -372,20 +395,73 @@ class Daly_Can(Battery):
         self.capacity_remain = capacity_remain / 1000
         return True
 
+    def get_cell_volts_frame_count(self) -> int:
+        """
+        Each cell voltage frame contains 3 cells
+        """
+        return (self.cell_count + 2) // 3 if self.cell_count else 6
+
+    @staticmethod
+    def get_response_id(command: int) -> int:
+        """
+        The response has the BMS ID and the uplink ID of the command swapped
+        """
+        return (
+            (command & 0xFFFF0000) | ((command & 0xFF) << 8) | ((command >> 8) & 0xFF)
+        )
+
     def read_bus_data_daly(self, can_bus, command, expectedMessageCount=1):
-        # TODO handling of error cases
-        message = can.Message(arbitration_id=command)
-        can_bus.send(message, timeout=0.2)
-        response = bytearray()
-
-        # TODO use async notifier instead of this where we expect a specific frame to be received
-        # this could end up in a deadlock if a package is not received
-        count = 0
-        for msg in can_bus:
-            # print(f"{msg.arbitration_id:X}: {msg.data}")
-            # logger.info('Frame: ' + ", ".join(hex(b) for b in msg.data))
-            response.extend(msg.data)
-            count += 1
-            if count == expectedMessageCount:
+        return self.read_bus_data_daly_multi(can_bus, {command: expectedMessageCount})[
+            command
+        ]
+
+    def read_bus_data_daly_multi(self, can_bus, commands: dict) -> dict:
+        """
+        Send the commands back to back and collect the responses. The responses are matched by
+        their arbitration id, each command waits at most REQUEST_TIMEOUT seconds after it was sent.
+
+        :param can_bus: the CAN bus
+        :param commands: the number of expected response frames by command
+        :return: the data of the received frames by command, False if no frame was received.
+            If only a part of the frames was received, the received data is returned
+        """
+        # drop late responses of previous requests
+        while can_bus.recv(0) is not None:
+            pass
+
+        responses = {}
+        deadlines = {}
+        for command, count in commands.items():
+            try:
+                can_bus.send(can.Message(arbitration_id=command), timeout=0.2)
+                deadlines[command] = monotonic() + self.REQUEST_TIMEOUT
+            except can.CanError as e:
+                logger.error(f"Failed to send command {command:X}: {e}")
+            responses[self.get_response_id(command)] = []
+
+        while True:
+            now = monotonic()
+            waiting = [
+                deadline
+                for command, deadline in deadlines.items()
+                if deadline > now
+                and len(responses[self.get_response_id(command)]) < commands[command]
+            ]
+            if len(waiting) == 0:
                 break
-        return response
+
+            msg = can_bus.recv(max(waiting) - now)
+            if msg is None:
+                break
+            if msg.arbitration_id in responses:
+                responses[msg.arbitration_id].append(msg.data)
+
+        result = {}
+        for command, count in commands.items():
+            frames = responses[self.get_response_id(command)]
+            if len(frames) < count:
+                logger.debug(
+                    f"Command {command:X}: received {len(frames)} of {count} frames"
+                )
+            result[command] = bytearray().join(frames) if len(frames) > 0 else False
+        return result
@@ -27,6 +27,15 @@ class Ecs(Battery):
     LIPRO1X_ID_V3 = 104
     LiProCells = []
 
+    def get_modbus(self, slaveaddress) -> minimalmodbus.Instrument:
+        # use the shared serial port, which stays open across polls
+        utils.use_serial_port_for_modbus(
+            self.get_serial_port(timeout=0.05, parity=minimalmodbus.serial.PARITY_EVEN)
+        )
+        mbdev = minimalmodbus.Instrument(self.port, slaveaddress)
+        mbdev.serial.parity = minimalmodbus.serial.PARITY_EVEN
+        return mbdev
+
     def test_connection(self):
         # call a function that will connect to the battery, send a command and retrieve the result.
         # The result or call should be unique to this BMS. Battery name or version, etc.
@@ -35,8 +44,7 @@ class Ecs(Battery):
         # Trying to find Green Meter ID
         result = False
         try:
-            mbdev = minimalmodbus.Instrument(self.port, utils.GREENMETER_ADDRESS)
-            mbdev.serial.parity = minimalmodbus.serial.PARITY_EVEN
+            mbdev = self.get_modbus(utils.GREENMETER_ADDRESS)
             tmpId = mbdev.read_register(0, 0)
             if tmpId in range(self.GREENMETER_ID_500A, self.GREENMETER_ID_125A + 1):
                 if tmpId == self.GREENMETER_ID_500A:
@@ -58,6 +66,8 @@ class Ecs(Battery):
                     self.refresh_data()
 
         except IOError:
+            # the port is opened again on the next call, e.g. after the USB adapter was plugged in again
+            self.close_serial_port()
             result = False
         except Exception:
             (
@@ -70,6 +80,7 @@ class Ecs(Battery):
             logger.error(
                 f"Exception occurred: {repr(exception_object)} of type {exception_type} in {file} line #{line}"
             )
+            self.close_serial_port()
             result = False
 
         # give the user a feedback that no BMS was found
@@ -84,8 +95,7 @@ class Ecs(Battery):
             utils.LIPRO_START_ADDRESS, utils.LIPRO_END_ADDRESS + 1
         ):
             try:
-                mbdev = minimalmodbus.Instrument(self.port, cell_address)
-                mbdev.serial.parity = minimalmodbus.serial.PARITY_EVEN
+                mbdev = self.get_modbus(cell_address)
 
                 tmpId = mbdev.read_register(0, 0)
                 if tmpId in range(self.LIPRO1X_ID_V1, self.LIPRO1X_ID_V3 + 1):
@@ -94,6 +104,7 @@ class Ecs(Battery):
                     self.cells.append(Cell(False))
 
             except IOError:
+                self.close_serial_port()
                 pass
 
         return True if len(self.LiProCells) > 0 else False
@@ -124,8 +135,7 @@ class Ecs(Battery):
 
     def read_status_data(self):
         try:
-            mbdev = minimalmodbus.Instrument(self.port, utils.GREENMETER_ADDRESS)
-            mbdev.serial.parity = minimalmodbus.serial.PARITY_EVEN
+            mbdev = self.get_modbus(utils.GREENMETER_ADDRESS)
 
             self.max_battery_discharge_current = abs(
                 mbdev.read_register(30, 0, 3, True)
@@ -146,12 +156,12 @@ class Ecs(Battery):
 
             return True
         except IOError:
+            self.close_serial_port()
             return False
 
     def read_soc_data(self):
         try:
-            mbdev = minimalmodbus.Instrument(self.port, utils.GREENMETER_ADDRESS)
-            mbdev.serial.parity = minimalmodbus.serial.PARITY_EVEN
+            mbdev = self.get_modbus(utils.GREENMETER_ADDRESS)
 
             self.voltage = (
                 mbdev.read_long(108, 3, True, minimalmodbus.BYTEORDER_LITTLE_SWAP)
@@ -198,13 +208,13 @@ class Ecs(Battery):
 
             return True
         except IOError:
+            self.close_serial_port()
             return False
 
     def read_cell_data(self):
         for cell in range(len(self.LiProCells)):
             try:
-                mbdev = minimalmodbus.Instrument(self.port, self.LiProCells[cell])
-                mbdev.serial.parity = minimalmodbus.serial.PARITY_EVEN
+                mbdev = self.get_modbus(self.LiProCells[cell])
 
                 self.cells[cell].voltage = mbdev.read_register(100, 0, 3, False) / 1000
                 self.cells[cell].balance = (
@@ -214,4 +224,5 @@ class Ecs(Battery):
 
                 return True
             except IOError:
+                self.close_serial_port()
                 pass
@@ -14,7 +14,6 @@ import serial
 import time
 import minimalmodbus
 from typing import Dict
-import threading
 
 # the Heltec BMS is not always as responsive as it should, so let's try it up to (RETRYCNT - 1) times to talk to it
 RETRYCNT = 10
@@ -24,45 +23,34 @@ RETRYCNT = 10
 SLPTIME = 0.03
 
 mbdevs: Dict[int, minimalmodbus.Instrument] = {}
-locks: Dict[int, any] = {}
 
 
 class HeltecModbus(Battery):
+    BUS_ADDRESSABLE = True
+
     def __init__(self, port, baud, address):
         super(HeltecModbus, self).__init__(port, baud, address)
         self.type = "Heltec_Smart"
         self.unique_identifier_tmp = ""
+        # the address is passed as bytes like b"\x01" in bus master mode
+        self.addresses = (
+            [address[0]] if address is not None else utils.HELTEC_MODBUS_ADDR
+        )
 
     def test_connection(self):
         # call a function that will connect to the battery, send a command and retrieve the result.
         # The result or call should be unique to this BMS. Battery name or version, etc.
         # Return True if success, False for failure
-        for self.address in utils.HELTEC_MODBUS_ADDR:
+        for self.address in self.addresses:
             logger.debug("Testing on slave address " + str(self.address))
             found = False
-            if self.address not in locks:
-                locks[self.address] = threading.Lock()
-
-            # TODO: We need to lock not only based on the address, but based on the port as soon as multiple BMSs
-            # are supported on the same serial interface. Then locking on the port will be enough.
-
-            with locks[self.address]:
-                mbdev = minimalmodbus.Instrument(
-                    self.port,
-                    slaveaddress=self.address,
-                    mode="rtu",
-                    close_port_after_each_call=True,
-                    debug=False,
-                )
-                mbdev.serial.parity = minimalmodbus.serial.PARITY_NONE
-                mbdev.serial.stopbits = serial.STOPBITS_ONE
-                mbdev.serial.baudrate = 9600
-                # yes, 400ms is long but the BMS is sometimes really slow in responding, so this is a good compromise
-                mbdev.serial.timeout = 0.4
-                mbdevs[self.address] = mbdev
+
+            # all BMS on the same serial interface share the port lock
+            with self.get_serial_port_lock():
 
                 for n in range(1, RETRYCNT):
                     try:
+                        mbdev = self.get_modbus()
                         string = mbdev.read_string(7, 13)
                         time.sleep(SLPTIME)
                         found = True
@@ -79,6 +67,7 @@ class HeltecModbus(Battery):
                             + string
                         )
                     except Exception as e:
+                        self.reset_modbus()
                         logger.debug(
                             "testing failed ("
                             + str(e)
@@ -109,6 +98,42 @@ class HeltecModbus(Battery):
             and self.refresh_data()
         )
 
+    def get_modbus(self) -> minimalmodbus.Instrument:
+        """
+        Get the modbus instrument of the BMS, which uses the shared serial port.
+        Hold the lock returned by get_serial_port_lock() while calling it.
+        """
+        # use the shared serial port, which stays open across polls
+        ser = self.get_serial_port(timeout=0.4)
+        mbdev = mbdevs.get(self.address)
+        # create a new instrument, if the port was opened again after an error
+        if mbdev is not None and mbdev.serial is ser:
+            return mbdev
+
+        utils.use_serial_port_for_modbus(ser)
+        mbdev = minimalmodbus.Instrument(
+            self.port,
+            slaveaddress=self.address,
+            mode="rtu",
+            close_port_after_each_call=False,
+            debug=False,
+        )
+        mbdev.serial.parity = minimalmodbus.serial.PARITY_NONE
+        mbdev.serial.stopbits = serial.STOPBITS_ONE
+        mbdev.serial.baudrate = 9600
+        # yes, 400ms is long but the BMS is sometimes really slow in responding, so this is a good compromise
+        mbdev.serial.timeout = 0.4
+        mbdevs[self.address] = mbdev
+        return mbdev
+
+    def reset_modbus(self) -> None:
+        """
+        Close the serial port and drop the instrument after an error, so that both are created
+        again on the next call, e.g. after the USB adapter was plugged in again
+        """
+        self.close_serial_port()
+        mbdevs.pop(self.address, None)
+
     def get_settings(self):
         self.max_battery_voltage = self.max_cell_voltage * self.cell_count
         self.min_battery_voltage = self.min_cell_voltage * self.cell_count
@@ -122,11 +147,11 @@ class HeltecModbus(Battery):
         return self.read_soc_data() and self.read_cell_data()
 
     def read_status_data(self):
-        mbdev = mbdevs[self.address]
 
-        with locks[self.address]:
+        with self.get_serial_port_lock():
             for n in range(1, RETRYCNT + 1):
                 try:
+                    mbdev = self.get_modbus()
                     ccur = mbdev.read_register(191, 0, 3, False)
                     self.max_battery_charge_current = (
                         (int)(((ccur & 0xFF) << 8) | ((ccur >> 8) & 0xFF))
@@ -221,6 +246,7 @@ class HeltecModbus(Battery):
                     # we finished all readings without trouble, so let's break from the retry loop
                     break
                 except Exception as e:
+                    self.reset_modbus()
                     logger.warn(
                         "Error reading settings from BMS, retry ("
                         + str(n)
@@ -253,12 +279,21 @@ class HeltecModbus(Battery):
         """
         return self.unique_identifier_tmp
 
+    def connection_name(self) -> str:
+        # the address is the modbus slave address as int
+        return (
+            "Serial "
+            + self.port
+            + "__"
+            + utils.bytearray_to_string(bytes([self.address])).replace("\\", "0")
+        )
+
     def read_soc_data(self):
-        mbdev = mbdevs[self.address]
 
-        with locks[self.address]:
+        with self.get_serial_port_lock():
             for n in range(1, RETRYCNT):
                 try:
+                    mbdev = self.get_modbus()
                     self.voltage = (
                         mbdev.read_long(76, 3, True, minimalmodbus.BYTEORDER_LITTLE)
                         / 1000
@@ -392,6 +427,7 @@ class HeltecModbus(Battery):
                     return True
 
                 except Exception as e:
+                    self.reset_modbus()
                     logger.warn(
                         "Error reading SOC, retry ("
                         + str(n)
@@ -407,11 +443,11 @@ class HeltecModbus(Battery):
 
     def read_cell_data(self):
         result = False
-        mbdev = mbdevs[self.address]
 
-        with locks[self.address]:
+        with self.get_serial_port_lock():
             for n in range(1, RETRYCNT):
                 try:
+                    mbdev = self.get_modbus()
                     cells = mbdev.read_registers(
                         81, number_of_registers=self.cell_count
                     )
@@ -424,6 +460,7 @@ class HeltecModbus(Battery):
 
                     result = True
                 except Exception as e:
+                    self.reset_modbus()
                     logger.warn(
                         "read_cell_data() failed ("
                         + str(e)
@@ -198,17 +198,20 @@ class HLPdataBMS4S(Battery):
 
 
 def read_serial_data(command, port, baud, time, min_len):
-    try:
-        with serial.Serial(port, baudrate=baud, timeout=0.5) as ser:
+    with utils.get_serial_port_lock(port):
+        try:
+            ser = utils.get_serial_port(port, baud, timeout=0.5)
             ret = read_serialport_data(ser, command, time, min_len)
-        return ret
+            return ret
 
-    except serial.SerialException as e:
-        logger.error(e)
-        return False
+        except serial.SerialException as e:
+            logger.error(e)
+            # reopen the port on the next request
+            utils.close_serial_port(port)
+            return False
 
-    except Exception:
-        return False
+        except Exception:
+            return False
 
 
 def read_serialport_data(ser, command, time, min_len):
@@ -1,10 +1,77 @@
 # -*- coding: utf-8 -*-
 from battery import Battery, Cell
-from utils import is_bit_set, read_serial_data, logger
+from utils import read_serial_data, logger
 import utils
-from struct import unpack_from
+from struct import Struct, unpack_from
 from re import sub
 import sys
+from typing import Union
+
+CELL_VOLTAGES_ID = 0x79
+CELL_VOLTAGE_STRUCT = Struct(">xH")
+"""
+Cell number and voltage in mV of each cell in the cell voltages field
+"""
+
+FIELD_LENGTHS = {
+    **dict.fromkeys((0x80, 0x81, 0x82, 0x83, 0x84, 0x87, 0x8A, 0x8B, 0x8C), 2),
+    **dict.fromkeys(range(0x8E, 0x9D), 2),
+    **dict.fromkeys(range(0x9E, 0xA9), 2),
+    **dict.fromkeys((0xAD, 0xB0), 2),
+    **dict.fromkeys((0x85, 0x86, 0x9D, 0xA9, 0xAB, 0xAC, 0xAE, 0xAF, 0xB1), 1),
+    **dict.fromkeys((0xB3, 0xB8, 0xC0), 1),
+    **dict.fromkeys((0x89, 0xAA, 0xB5, 0xB6, 0xB9), 4),
+    0xB2: 10,
+    0xB4: 8,
+    0xB7: 15,
+    0xBA: 24,
+}
+"""
+Length of the value of each field of the status frame. Each field starts with its id,
+only the cell voltages have a length byte
+"""
+
+STATUS_FIELDS = {
+    0x80: ("temp_mos", ">H", False),
+    0x81: ("temp1", ">H", False),
+    0x82: ("temp2", ">H", False),
+    0x83: ("voltage", ">H", False),
+    0x84: ("current", ">H", False),
+    0x85: ("soc", ">B", False),
+    0x87: ("cycles", ">H", True),
+    0x8A: ("cell_count", ">H", False),
+    0x8B: ("protection", ">H", False),
+    0x8C: ("fet", ">H", False),
+    0x97: ("max_discharge_current", ">H", True),
+    0x99: ("max_charge_current", ">H", True),
+    0x9D: ("balance", ">B", False),
+    0xAA: ("capacity", ">L", True),
+    0xB4: ("custom_field", ">8s", True),
+    0xB5: ("production", ">4s", True),
+    0xB7: ("version", ">15s", True),
+    0xBA: ("unique_identifier", ">24s", True),
+}
+"""
+Name, struct format and if the value is static of the fields, which are decoded.
+Static fields are only decoded, if the slow refresh group is due
+"""
+
+# compiled once, field id: (length, name, unpack function, static)
+STATUS_FIELD_DECODERS = {
+    field_id: (length, None, None, False) for field_id, length in FIELD_LENGTHS.items()
+}
+STATUS_FIELD_DECODERS.update(
+    {
+        field_id: (FIELD_LENGTHS[field_id], name, Struct(fmt).unpack_from, static)
+        for field_id, (name, fmt, static) in STATUS_FIELDS.items()
+    }
+)
+STATUS_FIELDS_ALL = frozenset(
+    ["cell_voltages"] + [name for name, _, _ in STATUS_FIELDS.values()]
+)
+STATUS_FIELDS_FAST = STATUS_FIELDS_ALL - {
+    name for name, _, static in STATUS_FIELDS.values() if static
+}
 
 
 class Jkbms(Battery):
@@ -12,6 +79,8 @@ class Jkbms(Battery):
         super(Jkbms, self).__init__(port, baud, address)
         self.type = self.BATTERYTYPE
         self.unique_identifier_tmp = ""
+        # positions of the fields in the status frame, see compile_status_layout()
+        self.status_layout = None
 
     BATTERYTYPE = "JKBMS"
     LENGTH_CHECK = 1
@@ -70,13 +139,76 @@ class Jkbms(Battery):
 
         return result
 
-    def get_data(self, bytes, idcode, start, length):
-        # logger.debug("start "+str(start) + " length " + str(length))
-        # logger.debug(binascii.hexlify(bytearray(bytes[start:start + 1 + length])).decode('ascii'))
-        start = bytes.find(idcode, start, start + 1 + length)
-        if start < 0:
-            return False
-        return bytes[start + 1 : start + length + 1]
+    @staticmethod
+    def compile_status_layout(data: memoryview) -> Union[tuple, None]:
+        """
+        Walk the fields of the status frame once and locate the fields, which are decoded.
+        The layout only depends on the number of cells, so it is reused for the next frames
+
+        :param data: the payload of the status frame
+        :return: the position of the cell voltages and the position, id, name, unpack
+            function and if the value is static of each decoded field
+        """
+        end = len(data)
+        cell_voltages = None
+        fields = []
+        # the first byte is the transport type
+        pos = 1
+        while pos < end:
+            field_id = data[pos]
+            if field_id == CELL_VOLTAGES_ID:
+                length = data[pos + 1]
+                cell_voltages = (pos + 2, pos + 2 + length)
+                pos += 2 + length
+                continue
+
+            field = STATUS_FIELD_DECODERS.get(field_id)
+            if field is None:
+                # the length of the following fields is unknown
+                logger.debug(f"Unknown field 0x{field_id:02X} at position {pos}")
+                break
+            length, name, unpack, static = field
+            if pos + 1 + length > end:
+                break
+            if unpack is not None:
+                fields.append((pos + 1, field_id, name, unpack, static))
+            pos += 1 + length
+
+        if cell_voltages is None:
+            return None
+        return cell_voltages, tuple(fields)
+
+    def parse_status_data(self, status_data, static: bool) -> dict:
+        """
+        Decode the fields of the status frame in one pass, without copying the data
+
+        :param status_data: the payload of the status frame
+        :param static: also decode the static fields
+        :return: the values by field name, the cell voltages as memoryview
+        """
+        data = memoryview(status_data)
+        if len(data) < 3:
+            return {}
+
+        # the cell voltages are the first field and define the position of the others
+        key = (len(data), data[2])
+        if self.status_layout is None or self.status_layout[0] != key:
+            self.status_layout = (key, self.compile_status_layout(data))
+        layout = self.status_layout[1]
+        if layout is None:
+            return {}
+
+        (start, end), fields = layout
+        values = {"cell_voltages": data[start:end]}
+        for pos, field_id, name, unpack, is_static in fields:
+            if static or not is_static:
+                if data[pos - 1] != field_id:
+                    # unexpected frame layout, compile it from this frame
+                    self.status_layout = (key, self.compile_status_layout(data))
+                    return self.parse_status_data(status_data, static)
+                values[name] = unpack(data, pos)[0]
+
+        return values
 
     def read_status_data(self):
         status_data = self.read_serial_data_jkbms(self.command_status)
@@ -84,131 +216,108 @@ class Jkbms(Battery):
         if status_data is False:
             return False
 
+        # the frame always contains all data, but the settings and identifiers
+        # change rarely, so they are only decoded, if the slow group is due
+        groups = self.get_refresh_groups()
+        static = self.REFRESH_SLOW in groups
+        fields = self.parse_status_data(status_data, static)
+
+        missing = (STATUS_FIELDS_ALL if static else STATUS_FIELDS_FAST) - fields.keys()
+        if len(missing) > 0:
+            logger.error(
+                "Incomplete status data, missing: " + ", ".join(sorted(missing))
+            )
+            return False
+
         # cell voltages
-        offset = 1
-        cellbyte_count = unpack_from(
-            ">B", self.get_data(status_data, b"\x79", offset, 1)
-        )[0]
-
-        offset = cellbyte_count + 30
-        self.cell_count = unpack_from(
-            ">H", self.get_data(status_data, b"\x8A", offset, 2)
-        )[0]
-
-        if cellbyte_count == 3 * self.cell_count and self.cell_count == len(self.cells):
-            offset = 1
-            celldata = self.get_data(status_data, b"\x79", offset, 1 + cellbyte_count)
-            for c in range(self.cell_count):
-                self.cells[c].voltage = (
-                    unpack_from(">xH", celldata, c * 3 + 1)[0] / 1000
-                )
+        self.cell_count = fields["cell_count"]
+        cell_voltages = fields["cell_voltages"]
+        if (
+            len(cell_voltages) == 3 * self.cell_count
+            and self.cell_count == len(self.cells)
+            and self.cell_count > 0
+        ):
+            voltages = [
+                voltage for (voltage,) in CELL_VOLTAGE_STRUCT.iter_unpack(cell_voltages)
+            ]
+            self.cells.set_voltages(voltage / 1000 for voltage in voltages)
+            min_cell = voltages.index(min(voltages))
+            max_cell = voltages.index(max(voltages))
+        else:
+            min_cell = self.get_min_cell()
+            max_cell = self.get_max_cell()
 
         # MOSFET temperature
-        offset = cellbyte_count + 3
-        temp_mos = unpack_from(">H", self.get_data(status_data, b"\x80", offset, 2))[0]
+        temp_mos = fields["temp_mos"]
         self.to_temp(0, temp_mos if temp_mos < 99 else (100 - temp_mos))
 
         # Temperature sensors
-        offset = cellbyte_count + 6
-        temp1 = unpack_from(">H", self.get_data(status_data, b"\x81", offset, 2))[0]
-
-        offset = cellbyte_count + 9
-        temp2 = unpack_from(">H", self.get_data(status_data, b"\x82", offset, 2))[0]
+        temp1 = fields["temp1"]
+        temp2 = fields["temp2"]
         self.to_temp(1, temp1 if temp1 < 99 else (100 - temp1))
         self.to_temp(2, temp2 if temp2 < 99 else (100 - temp2))
 
-        offset = cellbyte_count + 12
-        voltage = unpack_from(">H", self.get_data(status_data, b"\x83", offset, 2))[0]
-        self.voltage = voltage / 100
+        self.voltage = fields["voltage"] / 100
 
-        offset = cellbyte_count + 15
-        current = unpack_from(">H", self.get_data(status_data, b"\x84", offset, 2))[0]
+        current = fields["current"]
         self.current = (
             current / -100
             if current < self.CURRENT_ZERO_CONSTANT
             else (current - self.CURRENT_ZERO_CONSTANT) / 100
         )
 
-        # Continued discharge current
-        offset = cellbyte_count + 66
-        self.max_battery_discharge_current = float(
-            unpack_from(">H", self.get_data(status_data, b"\x97", offset, 2))[0]
-        )
-
-        # Continued charge current
-        offset = cellbyte_count + 72
-        self.max_battery_charge_current = float(
-            unpack_from(">H", self.get_data(status_data, b"\x99", offset, 2))[0]
-        )
-
         # the JKBMS resets to
         # 95% SoC, if all cell voltages are above or equal to OVPR (Over Voltage Protection Recovery)
         # 100% Soc, if all cell voltages are above or equal to OVP (Over Voltage Protection)
-        offset = cellbyte_count + 18
-        self.soc = unpack_from(">B", self.get_data(status_data, b"\x85", offset, 1))[0]
-
-        offset = cellbyte_count + 22
-        self.cycles = unpack_from(">H", self.get_data(status_data, b"\x87", offset, 2))[
-            0
-        ]
-
-        # offset = cellbyte_count + 25
-        # self.capacity_remain = unpack_from('>L', self.get_data(status_data, b'\x89', offset, 4))[0]
-        offset = cellbyte_count + 121
-        self.capacity = unpack_from(
-            ">L", self.get_data(status_data, b"\xAA", offset, 4)
-        )[0]
-
-        offset = cellbyte_count + 33
-        self.to_protection_bits(
-            unpack_from(">H", self.get_data(status_data, b"\x8B", offset, 2))[0]
-        )
+        self.soc = fields["soc"]
 
-        offset = cellbyte_count + 36
-        self.to_fet_bits(
-            unpack_from(">H", self.get_data(status_data, b"\x8C", offset, 2))[0]
-        )
+        self.to_protection_bits(fields["protection"])
+        self.to_fet_bits(fields["fet"])
+        self.to_balance_bits(fields["balance"])
 
-        offset = cellbyte_count + 84
-        self.to_balance_bits(
-            unpack_from(">B", self.get_data(status_data, b"\x9D", offset, 1))[0]
-        )
+        if static:
+            self.read_static_data(fields)
+
+        # show wich cells are balancing
+        if min_cell is not None and max_cell is not None:
+            self.cells.set_balances(
+                self.balancing and (c == min_cell or c == max_cell)
+                for c in range(self.cell_count)
+            )
+
+        self.set_refreshed(groups)
+
+        # logger.info(self.hardware_version)
+        return True
+
+    def read_static_data(self, fields):
+        # Continued discharge and charge current
+        self.max_battery_discharge_current = float(fields["max_discharge_current"])
+        self.max_battery_charge_current = float(fields["max_charge_current"])
+
+        self.cycles = fields["cycles"]
+        self.capacity = fields["capacity"]
 
         # "User Private Data" field in APP
-        offset = cellbyte_count + 155
         tmp = sub(
-            " +",
-            " ",
-            (
-                unpack_from(">8s", self.get_data(status_data, b"\xB4", offset, 8))[0]
-                .decode()
-                .replace("\x00", " ")
-                .strip()
-            ),
+            " +", " ", fields["custom_field"].decode().replace("\x00", " ").strip()
         )
         self.custom_field = tmp if tmp != "Input Us" else None
 
         # production date
         try:
-            offset = cellbyte_count + 164
-            tmp = unpack_from(">4s", self.get_data(status_data, b"\xB5", offset, 4))[
-                0
-            ].decode()
+            tmp = fields["production"].decode()
             self.production = "20" + tmp + "01" if tmp and tmp != "" else None
         except UnicodeDecodeError:
             self.production = None
 
-        offset = cellbyte_count + 174
-        self.version = unpack_from(
-            ">15s", self.get_data(status_data, b"\xB7", offset, 15)
-        )[0].decode()
+        self.version = fields["version"].decode()
 
-        offset = cellbyte_count + 197
         self.unique_identifier_tmp = sub(
             " +",
             "_",
             (
-                unpack_from(">24s", self.get_data(status_data, b"\xBA", offset, 24))[0]
+                fields["unique_identifier"]
                 .decode()
                 .replace("\x00", " ")
                 .replace("Input Userda", "")
@@ -216,19 +325,6 @@ class Jkbms(Battery):
             ),
         )
 
-        # show wich cells are balancing
-        if self.get_min_cell() is not None and self.get_max_cell() is not None:
-            for c in range(self.cell_count):
-                if self.balancing and (
-                    self.get_min_cell() == c or self.get_max_cell() == c
-                ):
-                    self.cells[c].balance = True
-                else:
-                    self.cells[c].balance = False
-
-        # logger.info(self.hardware_version)
-        return True
-
     def unique_identifier(self) -> str:
         """
         Used to identify a BMS when multiple BMS are connected
@@ -236,14 +332,12 @@ class Jkbms(Battery):
         return self.unique_identifier_tmp
 
     def to_fet_bits(self, byte_data):
-        tmp = bin(byte_data)[2:].rjust(3, utils.zero_char)
-        self.charge_fet = is_bit_set(tmp[2])
-        self.discharge_fet = is_bit_set(tmp[1])
-        self.balancing = is_bit_set(tmp[0])
+        self.charge_fet = byte_data & 0x01 != 0
+        self.discharge_fet = byte_data & 0x02 != 0
+        self.balancing = byte_data & 0x04 != 0
 
     def to_balance_bits(self, byte_data):
-        tmp = bin(byte_data)[2:]
-        self.balance_fet = is_bit_set(tmp)
+        self.balance_fet = byte_data != 0
 
     def get_balancing(self):
         return 1 if self.balancing else 0
@@ -289,36 +383,30 @@ class Jkbms(Battery):
         Bit 12:309_A protection: 1 alarm, 0 nomal
         Bit 13:309_B protection: 1 alarm, 0 nomal
         """
-        pos = 13
-        tmp = bin(byte_data)[15 - pos :].rjust(pos + 1, utils.zero_char)
-        # logger.debug(tmp)
-
         # low capacity alarm
-        self.protection.soc_low = 2 if is_bit_set(tmp[pos - 0]) else 0
+        self.protection.soc_low = 2 if byte_data & 0x0001 else 0
         # MOSFET temperature alarm
-        self.protection.temp_high_internal = 2 if is_bit_set(tmp[pos - 1]) else 0
+        self.protection.temp_high_internal = 2 if byte_data & 0x0002 else 0
         # charge over voltage alarm
         # TODO: check if "self.soc_reset_requested is False" works,
         # else use "self.soc_reset_last_reached < int(time()) - (60 * 60)"
-        self.protection.voltage_high = 2 if is_bit_set(tmp[pos - 2]) else 0
+        self.protection.voltage_high = 2 if byte_data & 0x0004 else 0
         # discharge under voltage alarm
-        self.protection.voltage_low = 2 if is_bit_set(tmp[pos - 3]) else 0
+        self.protection.voltage_low = 2 if byte_data & 0x0008 else 0
         # charge overcurrent alarm
-        self.protection.current_over = 1 if is_bit_set(tmp[pos - 5]) else 0
+        self.protection.current_over = 1 if byte_data & 0x0020 else 0
         # discharge over current alarm
-        self.protection.current_under = 1 if is_bit_set(tmp[pos - 6]) else 0
+        self.protection.current_under = 1 if byte_data & 0x0040 else 0
         # core differential pressure alarm OR unit overvoltage alarm
         self.protection.cell_imbalance = (
-            2 if is_bit_set(tmp[pos - 7]) else 1 if is_bit_set(tmp[pos - 10]) else 0
+            2 if byte_data & 0x0080 else 1 if byte_data & 0x0400 else 0
         )
         # unit undervoltage alarm
-        self.protection.voltage_cell_low = 1 if is_bit_set(tmp[pos - 11]) else 0
+        self.protection.voltage_cell_low = 1 if byte_data & 0x0800 else 0
         # battery overtemperature alarm OR overtemperature alarm in the battery box
-        alarm_temp_high = (
-            1 if is_bit_set(tmp[pos - 4]) or is_bit_set(tmp[pos - 8]) else 0
-        )
+        alarm_temp_high = 1 if byte_data & 0x0110 else 0
         # battery low temperature alarm
-        alarm_temp_low = 1 if is_bit_set(tmp[pos - 9]) else 0
+        alarm_temp_low = 1 if byte_data & 0x0200 else 0
         # check if low/high temp alarm arise during charging
         self.protection.temp_high_charge = (
             1 if self.current > 0 and alarm_temp_high == 1 else 0
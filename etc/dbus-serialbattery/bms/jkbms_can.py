@@ -16,7 +16,7 @@ from utils import (
     JKBMS_CAN_CELL_COUNT,
     zero_char,
 )
-from struct import unpack_from
+from struct import Struct
 import can
 import time
 
@@ -25,6 +25,10 @@ class Jkbms_Can(Battery):
     def __init__(self, port, baud, address):
         super(Jkbms_Can, self).__init__(port, baud, address)
         self.can_bus = False
+        self.can_notifier = None
+        # latest frame of each arbitration id as (receive time, data), filled by the notifier thread
+        self.can_frames = {}
+        self.alarm_time_decoded = None
         self.cell_count = 1
         self.poll_interval = 1500
         self.type = self.BATTERYTYPE
@@ -32,6 +36,13 @@ class Jkbms_Can(Battery):
         self.error_active = False
 
     def __del__(self):
+        self.close_can_bus()
+
+    def close_can_bus(self) -> None:
+        # the notifier thread references this battery, stop it before the bus is shut down
+        if self.can_notifier is not None:
+            self.can_notifier.stop()
+            self.can_notifier = None
         if self.can_bus:
             self.can_bus.shutdown()
             self.can_bus = False
@@ -46,7 +57,23 @@ class Jkbms_Can(Battery):
     CELL_TEMP = "CELL_TEMP"
     ALM_INFO = "ALM_INFO"
 
-    MESSAGES_TO_READ = 100
+    FRAME_TIMEOUT = 5
+    """
+    Time in seconds, after which the battery is assumed to be offline, if no frame was received
+    """
+    CONNECTION_TIMEOUT = 2
+    """
+    Time in seconds to wait for the first status frame, when testing the connection
+    """
+
+    # voltage, current, soc, time to go
+    BATT_STAT_STRUCT = Struct("<HHBxH")
+    # max cell voltage, max cell number, min cell voltage, min cell number
+    CELL_VOLT_STRUCT = Struct("<HBHB")
+    # max temperature, min temperature
+    CELL_TEMP_STRUCT = Struct("<BxB")
+    # alarm bits
+    ALM_INFO_STRUCT = Struct("<L")
 
     # B2A... Black is using 0x0XF4
     # B2A... Silver is using 0x0XF5
@@ -62,13 +89,27 @@ class Jkbms_Can(Battery):
         # call a function that will connect to the battery, send a command and retrieve the result.
         # The result or call should be unique to this BMS. Battery name or version, etc.
         # Return True if success, False for failure
-        return self.read_status_data()
+        if not self.open_can_bus():
+            return False
+
+        # the BMS sends its frames cyclically, wait for the first status frame
+        time_end = time.monotonic() + self.CONNECTION_TIMEOUT
+        while time.monotonic() < time_end:
+            if self.get_frame(self.BATT_STAT) is not None:
+                return self.read_status_data()
+            time.sleep(0.1)
+
+        logger.info("No CAN Message received")
+        # stop the notifier, else this battery is never released
+        self.close_can_bus()
+        return False
 
     def get_settings(self):
         # After successful  connection get_settings will be call to set up the battery.
         # Set the current limits, populate cell count, etc
         # Return True if success, False for failure
-        self.cell_count = JKBMS_CAN_CELL_COUNT
+        # keep a higher cell count, which was detected from the cell voltage frames
+        self.cell_count = max(JKBMS_CAN_CELL_COUNT, self.cell_count)
         self.max_battery_charge_current = MAX_BATTERY_CHARGE_CURRENT
         self.max_battery_discharge_current = MAX_BATTERY_DISCHARGE_CURRENT
         self.max_battery_voltage = MAX_CELL_VOLTAGE * self.cell_count
@@ -173,7 +214,10 @@ class Jkbms_Can(Battery):
         self.protection.internal_failure = 0
         self.protection.internal_failure = 0
 
-    def read_serial_data_jkbms_CAN(self):
+    def open_can_bus(self) -> bool:
+        """
+        Open the CAN bus and start the notifier, which receives the frames in a background thread
+        """
         if self.can_bus is False:
             logger.debug("Can bus init")
             # intit the can interface
@@ -183,88 +227,100 @@ class Jkbms_Can(Battery):
                 )
             except can.CanError as e:
                 logger.error(e)
-
-            if self.can_bus is None:
+                self.can_bus = False
                 return False
 
+            self.can_notifier = can.Notifier(self.can_bus, [self.on_message_received])
             logger.debug("Can bus init done")
 
+        return True
+
+    def on_message_received(self, msg: can.Message) -> None:
+        """
+        Called by the notifier thread for every received frame. Only the latest frame of each
+        arbitration id is kept, the frames are decoded by refresh_data()
+        """
+        self.can_frames[msg.arbitration_id] = (time.monotonic(), msg.data)
+
+    def get_frame(self, frame_type: str):
+        """
+        Get the latest frame of a type
+
+        :param frame_type: key of CAN_FRAMES
+        :return: (receive time, data) or None, if the frame was not received yet
+        """
+        frames = [
+            self.can_frames[arbitration_id]
+            for arbitration_id in self.CAN_FRAMES[frame_type]
+            if arbitration_id in self.can_frames
+        ]
+        return max(frames, key=lambda frame: frame[0]) if frames else None
+
+    def read_serial_data_jkbms_CAN(self):
+        if not self.open_can_bus():
+            return False
+
         # reset errors after timeout
         if ((time.time() - self.last_error_time) > 120.0) and self.error_active is True:
             self.error_active = False
             self.reset_protection_bits()
 
-        # read msgs until we get one we want
-        messages_to_read = self.MESSAGES_TO_READ
-        while messages_to_read > 0:
-            msg = self.can_bus.recv(1)
-            if msg is None:
-                logger.info("No CAN Message received")
-                return False
+        # snapshot the frame cache, the notifier thread keeps replacing the frames
+        batt_stat = self.get_frame(self.BATT_STAT)
+        cell_volt = self.get_frame(self.CELL_VOLT)
+        cell_temp = self.get_frame(self.CELL_TEMP)
+        alm_info = self.get_frame(self.ALM_INFO)
+
+        if batt_stat is None or time.monotonic() - batt_stat[0] > self.FRAME_TIMEOUT:
+            logger.info("No CAN Message received")
+            return False
+
+        voltage, current, self.soc, time_to_go = self.BATT_STAT_STRUCT.unpack_from(
+            batt_stat[1]
+        )
+        self.voltage = voltage / 10
+        self.current = (current / 10) - 400
+        self.time_to_go = time_to_go * 36
+
+        if cell_volt is not None:
+            (
+                max_cell_volt,
+                max_cell_nr,
+                min_cell_volt,
+                min_cell_nr,
+            ) = self.CELL_VOLT_STRUCT.unpack_from(cell_volt[1])
+            max_cell_volt = max_cell_volt / 1000
+            min_cell_volt = min_cell_volt / 1000
+            max_cell_cnt = max(max_cell_nr, min_cell_nr, self.cell_count)
+
+            if max_cell_cnt > self.cell_count:
+                self.cell_count = max_cell_cnt
+                self.get_settings()
+
+            for c_nr in range(len(self.cells)):
+                self.cells[c_nr].balance = False
+
+            if self.cell_count == len(self.cells):
+                self.cells[max_cell_nr - 1].voltage = max_cell_volt
+                self.cells[max_cell_nr - 1].balance = True
+
+                self.cells[min_cell_nr - 1].voltage = min_cell_volt
+                self.cells[min_cell_nr - 1].balance = True
+
+        if cell_temp is not None:
+            max_temp, min_temp = self.CELL_TEMP_STRUCT.unpack_from(cell_temp[1])
+            max_temp -= 50
+            min_temp -= 50
+            self.to_temp(1, max_temp if max_temp <= 100 else 100)
+            self.to_temp(2, min_temp if min_temp <= 100 else 100)
+
+        # the alarm frame is only sent while an alarm is active, decode each frame once
+        if alm_info is not None and alm_info[0] != self.alarm_time_decoded:
+            self.alarm_time_decoded = alm_info[0]
+            alarms = self.ALM_INFO_STRUCT.unpack_from(alm_info[1])[0]
+            logger.debug("alarms %d" % (alarms))
+            self.last_error_time = time.time()
+            self.error_active = True
+            self.to_protection_bits(alarms)
 
-            if msg is not None:
-                # print("message received")
-                messages_to_read -= 1
-                # print(messages_to_read)
-                if msg.arbitration_id in self.CAN_FRAMES[self.BATT_STAT]:
-                    voltage = unpack_from("<H", bytes([msg.data[0], msg.data[1]]))[0]
-                    self.voltage = voltage / 10
-
-                    current = unpack_from("<H", bytes([msg.data[2], msg.data[3]]))[0]
-                    self.current = (current / 10) - 400
-
-                    self.soc = unpack_from("<B", bytes([msg.data[4]]))[0]
-
-                    self.time_to_go = (
-                        unpack_from("<H", bytes([msg.data[6], msg.data[7]]))[0] * 36
-                    )
-
-                    # print(self.voltage)
-                    # print(self.current)
-                    # print(self.soc)
-                    # print(self.time_to_go)
-
-                elif msg.arbitration_id in self.CAN_FRAMES[self.CELL_VOLT]:
-                    max_cell_volt = (
-                        unpack_from("<H", bytes([msg.data[0], msg.data[1]]))[0] / 1000
-                    )
-                    max_cell_nr = unpack_from("<B", bytes([msg.data[2]]))[0]
-                    max_cell_cnt = max(max_cell_nr, self.cell_count)
-
-                    min_cell_volt = (
-                        unpack_from("<H", bytes([msg.data[3], msg.data[4]]))[0] / 1000
-                    )
-                    min_cell_nr = unpack_from("<B", bytes([msg.data[5]]))[0]
-                    max_cell_cnt = max(min_cell_nr, max_cell_cnt)
-
-                    if max_cell_cnt > self.cell_count:
-                        self.cell_count = max_cell_cnt
-                        self.get_settings()
-
-                    for c_nr in range(len(self.cells)):
-                        self.cells[c_nr].balance = False
-
-                    if self.cell_count == len(self.cells):
-                        self.cells[max_cell_nr - 1].voltage = max_cell_volt
-                        self.cells[max_cell_nr - 1].balance = True
-
-                        self.cells[min_cell_nr - 1].voltage = min_cell_volt
-                        self.cells[min_cell_nr - 1].balance = True
-
-                elif msg.arbitration_id in self.CAN_FRAMES[self.CELL_TEMP]:
-                    max_temp = unpack_from("<B", bytes([msg.data[0]]))[0] - 50
-                    min_temp = unpack_from("<B", bytes([msg.data[2]]))[0] - 50
-                    self.to_temp(1, max_temp if max_temp <= 100 else 100)
-                    self.to_temp(2, min_temp if min_temp <= 100 else 100)
-                    # print(max_temp)
-                    # print(min_temp)
-                elif msg.arbitration_id in self.CAN_FRAMES[self.ALM_INFO]:
-                    alarms = unpack_from(
-                        "<L",
-                        bytes([msg.data[0], msg.data[1], msg.data[2], msg.data[3]]),
-                    )[0]
-                    print("alarms %d" % (alarms))
-                    self.last_error_time = time.time()
-                    self.error_active = True
-                    self.to_protection_bits(alarms)
         return True
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from battery import Protection, Battery, Cell
+from battery import Protection, Battery
 from utils import is_bit_set, read_serial_data, logger
 import utils
 from struct import unpack_from, pack
@@ -327,14 +327,17 @@ class LltJbd(Battery):
             return False
 
         self.reset_soc = value
-        self.soc_to_set = value
+        self.set_callback_value("soc_to_set", value)
         return True
 
     def write_soc(self):
-        if self.soc_to_set is None or self.soc_to_set != 100 or not self.voltage:
+        if not self.voltage:
             return False
-        logger.info(f"write soc {self.soc_to_set}%")
-        self.soc_to_set = None  # Reset value, so we will set it only once
+        # take the value, so that it's written only once
+        soc_to_set = self.take_callback_value("soc_to_set")
+        if soc_to_set is None or soc_to_set != 100:
+            return False
+        logger.info(f"write soc {soc_to_set}%")
         # TODO implement logic to map current pack readings into
         # REG_CAP_100, REG_CAP_90, REG_CAP_80, REG_CAP_70, REG_CAP_60, ...
         with self.eeprom(writable=True):
@@ -346,11 +349,11 @@ class LltJbd(Battery):
             return False
 
         if value == 0:
-            self.trigger_force_disable_charge = False
+            self.set_callback_value("trigger_force_disable_charge", False)
             return True
 
         if value == 1:
-            self.trigger_force_disable_charge = True
+            self.set_callback_value("trigger_force_disable_charge", True)
             return True
 
         return False
@@ -360,11 +363,11 @@ class LltJbd(Battery):
             return False
 
         if value == 0:
-            self.trigger_force_disable_discharge = False
+            self.set_callback_value("trigger_force_disable_discharge", False)
             return True
 
         if value == 1:
-            self.trigger_force_disable_discharge = True
+            self.set_callback_value("trigger_force_disable_discharge", True)
             return True
 
         return False
@@ -376,25 +379,29 @@ class LltJbd(Battery):
         ):
             return False
 
+        # a value set by a callback while writing is written on the next poll
+        force_disable_charge = self.take_callback_value("trigger_force_disable_charge")
+        force_disable_discharge = self.take_callback_value(
+            "trigger_force_disable_discharge"
+        )
+
         charge_disabled = 0 if self.charge_fet else 1
-        if self.trigger_force_disable_charge is not None:
-            charge_disabled = 1 if self.trigger_force_disable_charge else 0
+        if force_disable_charge is not None:
+            charge_disabled = 1 if force_disable_charge else 0
             logger.info(
-                f"write force disable charging: {'true' if self.trigger_force_disable_charge else 'false'}"
+                f"write force disable charging: {'true' if force_disable_charge else 'false'}"
             )
-        self.trigger_force_disable_charge = None
 
         discharge_disabled = 0 if self.discharge_fet else 1
-        if self.trigger_force_disable_discharge is not None:
-            discharge_disabled = 1 if self.trigger_force_disable_discharge else 0
+        if force_disable_discharge is not None:
+            discharge_disabled = 1 if force_disable_discharge else 0
             logger.info(
-                f"write force disable discharging: {'true' if self.trigger_force_disable_discharge else 'false'}"
+                f"write force disable discharging: {'true' if force_disable_discharge else 'false'}"
             )
-        self.trigger_force_disable_discharge = None
 
         logger.debug(
-            f"trigger_force_disable_charge: {self.trigger_force_disable_charge} - "
-            + f"trigger_force_disable_discharge: {self.trigger_force_disable_discharge}"
+            f"trigger_force_disable_charge: {force_disable_charge} - "
+            + f"trigger_force_disable_discharge: {force_disable_discharge}"
         )
         logger.debug(
             f"CHARGE: charge_disabled: {charge_disabled} - "
@@ -418,24 +425,23 @@ class LltJbd(Battery):
             return False
 
         if value == 0:
-            self.trigger_disable_balancer = False
+            self.set_callback_value("trigger_disable_balancer", False)
             return True
 
         if value == 1:
-            self.trigger_disable_balancer = True
+            self.set_callback_value("trigger_disable_balancer", True)
             return True
 
         return False
 
     def write_balancer(self):
-        if self.trigger_disable_balancer is None:
+        disable_balancer = self.take_callback_value("trigger_disable_balancer")
+        if disable_balancer is None:
             return False
 
-        disable_balancer = self.trigger_disable_balancer
         logger.info(
-            f"write disable balancer: {'true' if self.trigger_disable_balancer else 'false'}"
+            f"write disable balancer: {'true' if disable_balancer else 'false'}"
         )
-        self.trigger_disable_balancer = None
         new_func_config = None
 
         with self.eeprom():
@@ -498,39 +504,13 @@ class LltJbd(Battery):
     def to_cell_bits(self, byte_data, byte_data_high):
         # init the cell array once
         if len(self.cells) == 0:
-            for _ in range(self.cell_count):
-                print("#" + str(_))
-                self.cells.append(Cell(False))
-
-        # get up to the first 16 cells
-        tmp = bin(byte_data)[2:].rjust(min(self.cell_count, 16), utils.zero_char)
-        # 4 cells
-        # tmp = 0101
-        # 16 cells
-        # tmp = 0101010101010101
+            self.cells.resize(self.cell_count)
 
-        tmp_reversed = list(reversed(tmp))
-        # print(tmp_reversed) --> ['1', '0', '1', '0', '1', '0', '1', '0', '1', '0', '1', '0', '1', '0', '1', '0']
-        # [cell1, cell2, cell3, ...]
-
-        if self.cell_count > 16:
-            tmp2 = bin(byte_data_high)[2:].rjust(self.cell_count - 16, utils.zero_char)
-            # tmp = 1100110011001100
-            tmp_reversed = tmp_reversed + list(reversed(tmp2))
-            # print(tmp_reversed) --> [
-            # '1', '0', '1', '0', '1', '0', '1', '0', '1', '0', '1', '0', '1', '0', '1', '0',
-            # '0', '0', '1', '1', '0', '0', '1', '1', '0', '0', '1', '1', '0', '0', '1', '1'
-            # ]
-            # [
-            # cell1, cell2, ..., cell16,
-            # cell17, cell18, ..., cell32
-            # ]
-
-        for c in range(self.cell_count):
-            if is_bit_set(tmp_reversed[c]):
-                self.cells[c].balance = True
-            else:
-                self.cells[c].balance = False
+        # bit n of the low word is cell n + 1, bit n of the high word is cell n + 17
+        balance_bits = byte_data | (byte_data_high << 16)
+        self.cells.set_balances(
+            (balance_bits >> c) & 1 == 1 for c in range(self.cell_count)
+        )
 
         """
         # clear the list
@@ -615,13 +595,11 @@ class LltJbd(Battery):
         if cell_data is False or len(cell_data) < self.cell_count * 2:
             return False
 
-        for c in range(self.cell_count):
-            try:
-                cell_volts = unpack_from(">H", cell_data, c * 2)
-                if len(cell_volts) != 0:
-                    self.cells[c].voltage = cell_volts[0] / 1000
-            except struct.error:
-                self.cells[c].voltage = 0
+        # decode all cell voltages in one call
+        self.cells.set_voltages(
+            cell_volts / 1000
+            for cell_volts in unpack_from(">" + str(self.cell_count) + "H", cell_data)
+        )
         return True
 
     def read_hardware_data(self):
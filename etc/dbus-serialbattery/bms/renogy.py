@@ -16,6 +16,7 @@ class Renogy(Battery):
         self.command_address = address
 
     BATTERYTYPE = "Renogy"
+    BUS_ADDRESSABLE = True
     LENGTH_CHECK = 4
     LENGTH_POS = 2
 
@@ -309,28 +309,34 @@ class Seplos(Battery):
     def read_serial_data_seplos(self, command):
         logger.debug("read serial data seplos")
 
-        with serial.Serial(self.port, baudrate=self.baud_rate, timeout=1) as ser:
-            ser.flushOutput()
-            ser.flushInput()
-            written = ser.write(command)
-            logger.debug(
-                "wrote {} bytes to serial port {}, command={}".format(
-                    written, self.port, command
+        with self.get_serial_port_lock():
+            try:
+                ser = self.get_serial_port(timeout=1)
+                ser.reset_input_buffer()
+                written = ser.write(command)
+                logger.debug(
+                    "wrote {} bytes to serial port {}, command={}".format(
+                        written, self.port, command
+                    )
                 )
-            )
-
-            data = ser.readline()
 
-            if not Seplos.is_valid_frame(data):
+                data = ser.readline()
+            except serial.SerialException as e:
+                logger.error(e)
+                # reopen the port on the next request
+                self.close_serial_port()
                 return False
 
-            length_pos = 10
-            return_data = data[length_pos + 3 : -5]
-            info_length = Seplos.int_from_2byte_hex_ascii(b"0" + data[length_pos:], 0)
-            logger.debug(
-                "returning info data of length {}, info_length is {} : {}".format(
-                    len(return_data), info_length, return_data
-                )
+        if not Seplos.is_valid_frame(data):
+            return False
+
+        length_pos = 10
+        return_data = data[length_pos + 3 : -5]
+        info_length = Seplos.int_from_2byte_hex_ascii(b"0" + data[length_pos:], 0)
+        logger.debug(
+            "returning info data of length {}, info_length is {} : {}".format(
+                len(return_data), info_length, return_data
             )
+        )
 
-            return return_data
+        return return_data
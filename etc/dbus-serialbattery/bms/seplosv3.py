@@ -7,19 +7,24 @@ from typing import Union
 import minimalmodbus
 import serial
 from battery import Battery, Cell, Protection
-from utils import logger, SEPLOS_USE_BMS_VALUES
+from utils import logger, use_serial_port_for_modbus, SEPLOS_USE_BMS_VALUES
 
 RETRYCNT = 3
 
 
 class Seplosv3(Battery):
+    BUS_ADDRESSABLE = True
+
     def __init__(self, port, baud, address):
         super(Seplosv3, self).__init__(port, baud, address)
         self.type = "Seplosv3_BMS_modbus"
         self.serialnumber = ""
         self.mbdev: Union[minimalmodbus.Instrument, None] = None
         if address is not None and len(address) > 0:
-            self.slaveaddress: int = int(address)
+            # the address is passed as bytes like b"\x01" by the driver
+            self.slaveaddress: int = (
+                address[0] if isinstance(address, (bytes, bytearray)) else int(address)
+            )
             self.slaveaddresses: list[int] = [self.slaveaddress]
         else:
             self.slaveaddress: int = 0
@@ -38,7 +43,14 @@ class Seplosv3(Battery):
         return struct.unpack("<h", packval)[0]
 
     def get_modbus(self, slaveaddress=0) -> minimalmodbus.Instrument:
-        if self.mbdev is not None and slaveaddress == self.slaveaddress:
+        # use the shared serial port, which stays open across polls
+        ser = self.get_serial_port(timeout=0.4)
+        # create a new instrument, if the port was opened again after an error
+        if (
+            self.mbdev is not None
+            and self.mbdev.address == slaveaddress
+            and self.mbdev.serial is ser
+        ):
             return self.mbdev
 
         # hack to allow communication to the Seplos BMS using minimodbus which uses slaveaddress 0 as broadcast
@@ -47,19 +59,30 @@ class Seplosv3(Battery):
         else:
             minimalmodbus._SLAVEADDRESS_BROADCAST = 0
 
+        use_serial_port_for_modbus(ser)
         mbdev = minimalmodbus.Instrument(
             self.port,
             slaveaddress=slaveaddress,
             mode="rtu",
-            close_port_after_each_call=True,
+            close_port_after_each_call=False,
             debug=False,
         )
         mbdev.serial.parity = minimalmodbus.serial.PARITY_NONE
         mbdev.serial.stopbits = serial.STOPBITS_ONE
         mbdev.serial.baudrate = 19200
         mbdev.serial.timeout = 0.4
+        if slaveaddress == self.slaveaddress:
+            self.mbdev = mbdev
         return mbdev
 
+    def reset_modbus(self) -> None:
+        """
+        Close the serial port and drop the instrument after an error, so that both are created
+        again on the next call, e.g. after the USB adapter was plugged in again
+        """
+        self.close_serial_port()
+        self.mbdev = None
+
     def test_connection(self):
         # call a function that will connect to the battery, send a command and retrieve the result.
         # The result or call should be unique to this BMS. Battery name or version, etc.
@@ -68,12 +91,12 @@ class Seplosv3(Battery):
 
         # This will cycle through all the slave addresses to find the BMS.
         for self.slaveaddress in self.slaveaddresses:
-            mbdev = self.get_modbus(self.slaveaddress)
             if len(self.slaveaddresses) > 1:
                 logger.info(f"|- on slave address {self.slaveaddress}")
 
             for n in range(1, RETRYCNT):
                 try:
+                    mbdev = self.get_modbus(self.slaveaddress)
                     factory = mbdev.read_string(
                         registeraddress=0x1700, number_of_registers=10, functioncode=4
                     )
@@ -107,9 +130,9 @@ class Seplosv3(Battery):
                         self.version = sw_version[0] + "." + sw_version[1]
                         logger.info(f"Firmware Version: {self.version}")
                         found = True
-                        self.mbdev = mbdev
 
                 except Exception as e:
+                    self.reset_modbus()
                     logger.debug(
                         f"Seplos v3 testing failed ({e}) {n}/{RETRYCNT} for {self.port}({str(self.slaveaddress)})"
                     )
@@ -164,6 +187,7 @@ class Seplosv3(Battery):
             logger.debug(f"sfa: {sfa}")
             logger.debug(f"pic: {pic}")
         except Exception as e:
+            self.reset_modbus()
             logger.info(f"Error getting data {e}")
         return spa, pia, pib, sca, pic, sfa
 
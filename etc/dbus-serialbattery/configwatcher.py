@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+from typing import List
+
+from gi.repository import GLib as gobject
+
+from dbushelper import DbusHelper
+from utils import logger
+import utils
+
+CONFIG_CHECK_INTERVAL = 5
+"""
+Interval in seconds, in which the config files are checked for changes
+"""
+
+RELOADABLE_SETTINGS = {
+    # limits
+    "MAX_BATTERY_CHARGE_CURRENT",
+    "MAX_BATTERY_DISCHARGE_CURRENT",
+    "MIN_CELL_VOLTAGE",
+    "MAX_CELL_VOLTAGE",
+    "FLOAT_CELL_VOLTAGE",
+    "SOC_RESET_VOLTAGE",
+    "SOC_RESET_AFTER_DAYS",
+    "BLOCK_ON_DISCONNECT",
+    # charge voltage control
+    "LINEAR_LIMITATION_ENABLE",
+    "LINEAR_RECALCULATION_EVERY",
+    "LINEAR_RECALCULATION_ON_PERC_CHANGE",
+    "CVCM_ENABLE",
+    "CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL",
+    "CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT",
+    "MAX_VOLTAGE_TIME_SEC",
+    "SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT",
+    "CVL_ICONTROLLER_MODE",
+    "CVL_ICONTROLLER_FACTOR",
+    # charge current control
+    "CCCM_CV_ENABLE",
+    "DCCM_CV_ENABLE",
+    "CCCM_T_ENABLE",
+    "DCCM_T_ENABLE",
+    "CCCM_SOC_ENABLE",
+    "DCCM_SOC_ENABLE",
+    "CELL_VOLTAGES_WHILE_CHARGING",
+    "MAX_CHARGE_CURRENT_CV",
+    "MAX_CHARGE_CURRENT_CV_CURVE",
+    "CELL_VOLTAGES_WHILE_DISCHARGING",
+    "MAX_DISCHARGE_CURRENT_CV",
+    "MAX_DISCHARGE_CURRENT_CV_CURVE",
+    "TEMPERATURES_WHILE_CHARGING",
+    "MAX_CHARGE_CURRENT_T",
+    "MAX_CHARGE_CURRENT_T_CURVE",
+    "TEMPERATURES_WHILE_DISCHARGING",
+    "MAX_DISCHARGE_CURRENT_T",
+    "MAX_DISCHARGE_CURRENT_T_CURVE",
+    "SOC_WHILE_CHARGING",
+    "MAX_CHARGE_CURRENT_SOC",
+    "MAX_CHARGE_CURRENT_SOC_CURVE",
+    "SOC_WHILE_DISCHARGING",
+    "MAX_DISCHARGE_CURRENT_SOC",
+    "MAX_DISCHARGE_CURRENT_SOC_CURVE",
+    # SoC calculation
+    "SOC_RESET_CURRENT",
+    "SOC_RESET_TIME",
+    "SOC_CALC_CURRENT_REPORTED_BY_BMS",
+    "SOC_CALC_CURRENT_MEASURED_BY_USER",
+    "SOC_CALC_CURRENT",
+    "SOC_CALC_CURRENT_CURVE",
+    # refresh groups
+    "REFRESH_PERIOD_MEDIUM",
+    "REFRESH_PERIOD_SLOW",
+    # misc
+    "VOLTAGE_DROP",
+    "LOGGING",
+}
+"""
+Settings that are read by the charge control on every poll and can be changed while the
+driver is running. All other settings are only used at startup (e.g. BMS_TYPE, addresses,
+intervals, dbus paths) and need a restart of the driver.
+"""
+
+
+class ConfigWatcher:
+    """
+    Checks the config files for changes and applies the changed settings without restart.
+
+    The check runs in the main loop, like the charge control of the batteries, so the settings
+    are never swapped in the middle of a calculation. A config with new issues is rejected as a
+    whole and the last valid settings stay active.
+    """
+
+    def __init__(self, helpers: List[DbusHelper]):
+        """
+        :param helpers: the dbus helpers of all batteries served by the driver
+        """
+        self.helpers = helpers
+        self.applied_stats = self.get_stats()
+        self.last_stats = self.applied_stats
+
+    @staticmethod
+    def get_stats() -> tuple:
+        return utils.get_file_stats(
+            (utils.default_config_file_path, utils.custom_config_file_path)
+        )
+
+    def start(self) -> None:
+        """
+        Check the config files every CONFIG_CHECK_INTERVAL seconds
+        """
+        gobject.timeout_add_seconds(CONFIG_CHECK_INTERVAL, self.check)
+
+    def check(self) -> bool:
+        """
+        Reload the config, if the files changed. A file has to be unchanged for one interval,
+        so that a file, which is still written, is not read.
+
+        :return: True to keep the timer running
+        """
+        try:
+            stats = self.get_stats()
+            if stats != self.last_stats:
+                self.last_stats = stats
+            elif stats != self.applied_stats:
+                self.applied_stats = stats
+                self.reload()
+        except Exception:
+            logger.exception("Config reload failed")
+        return True
+
+    def reload(self) -> None:
+        """
+        Parse and validate the config files and apply the changed settings
+        """
+        logger.info("Config files changed, reloading config")
+        try:
+            config, errors = utils.load_config()
+        except Exception as error:
+            logger.error(f"Config could not be parsed: {repr(error)}")
+            self.publish("rejected, config could not be parsed", {})
+            return
+
+        # reject the whole config, if it has issues, which were not there at startup
+        new_errors = [error for error in errors if error not in utils.errors_in_config]
+        if len(new_errors) > 0:
+            for error in new_errors:
+                logger.error(f"**CONFIG ISSUE**: {error.message}")
+            self.publish(
+                "rejected, invalid "
+                + ", ".join(sorted({error.option for error in new_errors})),
+                {},
+            )
+            return
+
+        values = config._asdict()
+        changed = {
+            name
+            for name, value in values.items()
+            if value != getattr(utils.config, name)
+        }
+        apply = {name: values[name] for name in changed & RELOADABLE_SETTINGS}
+        restart = sorted(changed - RELOADABLE_SETTINGS)
+
+        if len(apply) > 0:
+            old_values = {name: getattr(utils.config, name) for name in apply}
+            utils.apply_config_values(apply, errors)
+            for helper in self.helpers:
+                helper.battery.config_changed(old_values)
+            logger.info("Config reloaded, applied: " + ", ".join(sorted(apply)))
+
+        if len(restart) > 0:
+            logger.warning(
+                "Config reloaded, restart the driver to apply: " + ", ".join(restart)
+            )
+
+        status = []
+        if len(apply) > 0:
+            status.append("applied " + ", ".join(sorted(apply)))
+        if len(restart) > 0:
+            status.append("restart needed for " + ", ".join(restart))
+        self.publish("; ".join(status) if status else "no changes", apply)
+
+    def publish(self, status: str, values: dict) -> None:
+        status = datetime.now().strftime("%H:%M:%S") + " " + status
+        for helper in self.helpers:
+            helper.publish_config_reload(status, values)
@@ -1,10 +1,11 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-from typing import Union
+from typing import List, Tuple, Union
 
 from time import sleep
 from dbus.mainloop.glib import DBusGMainLoop
 
+import signal
 import sys
 
 # not needed anymore since a few years
@@ -17,62 +18,47 @@ from gi.repository import GLib as gobject
 # Victron packages
 # from ve_utils import exit_on_error
 
+from aggregatebattery import AggregateBattery
 from dbushelper import DbusHelper
+from configwatcher import ConfigWatcher
+from pollscheduler import PollScheduler
+import detection
 from utils import logger
 import utils
 from battery import Battery
 
-# import battery classes
-from bms.daly import Daly
-from bms.ecs import Ecs
-from bms.eg4_lifepower import EG4_Lifepower
-from bms.eg4_ll import EG4_LL
-from bms.heltecmodbus import HeltecModbus
-from bms.hlpdatabms4s import HLPdataBMS4S
-from bms.jkbms import Jkbms
-from bms.jkbms_pb import Jkbms_pb
-from bms.lltjbd import LltJbd
-from bms.renogy import Renogy
-from bms.seplos import Seplos
-from bms.seplosv3 import Seplosv3
-
-# enabled only if explicitly set in config under "BMS_TYPE"
-if "ANT" in utils.BMS_TYPE:
-    from bms.ant import ANT
-if "MNB" in utils.BMS_TYPE:
-    from bms.mnb import MNB
-if "Sinowealth" in utils.BMS_TYPE:
-    from bms.sinowealth import Sinowealth
-
+# the driver modules are imported only when they are tested, see detection.get_bms_class()
 supported_bms_types = [
-    {"bms": Daly, "baud": 9600, "address": b"\x40"},
-    {"bms": Daly, "baud": 9600, "address": b"\x80"},
-    {"bms": Ecs, "baud": 19200},
-    {"bms": EG4_Lifepower, "baud": 9600},
-    {"bms": EG4_LL, "baud": 9600, "address": b"\x7C"},
-    {"bms": HeltecModbus, "baud": 9600},
-    {"bms": HLPdataBMS4S, "baud": 9600},
-    {"bms": Jkbms, "baud": 115200},
-    {"bms": Jkbms_pb, "baud": 115200, "address": b"\x01"},
-    {"bms": LltJbd, "baud": 9600},
-    {"bms": Renogy, "baud": 9600, "address": b"\x30"},
-    {"bms": Renogy, "baud": 9600, "address": b"\xF7"},
-    {"bms": Seplos, "baud": 19200},
-    {"bms": Seplosv3, "baud": 19200},
+    {"bms": "Daly", "module": "bms.daly", "baud": 9600, "address": b"\x40"},
+    {"bms": "Daly", "module": "bms.daly", "baud": 9600, "address": b"\x80"},
+    {"bms": "Ecs", "module": "bms.ecs", "baud": 19200},
+    {"bms": "EG4_Lifepower", "module": "bms.eg4_lifepower", "baud": 9600},
+    {"bms": "EG4_LL", "module": "bms.eg4_ll", "baud": 9600, "address": b"\x7C"},
+    {"bms": "HeltecModbus", "module": "bms.heltecmodbus", "baud": 9600},
+    {"bms": "HLPdataBMS4S", "module": "bms.hlpdatabms4s", "baud": 9600},
+    {"bms": "Jkbms", "module": "bms.jkbms", "baud": 115200},
+    {"bms": "Jkbms_pb", "module": "bms.jkbms_pb", "baud": 115200, "address": b"\x01"},
+    {"bms": "LltJbd", "module": "bms.lltjbd", "baud": 9600},
+    {"bms": "Renogy", "module": "bms.renogy", "baud": 9600, "address": b"\x30"},
+    {"bms": "Renogy", "module": "bms.renogy", "baud": 9600, "address": b"\xF7"},
+    {"bms": "Seplos", "module": "bms.seplos", "baud": 19200},
+    {"bms": "Seplosv3", "module": "bms.seplosv3", "baud": 19200},
 ]
 
 # enabled only if explicitly set in config under "BMS_TYPE"
 if "ANT" in utils.BMS_TYPE:
-    supported_bms_types.append({"bms": ANT, "baud": 19200})
+    supported_bms_types.append({"bms": "ANT", "module": "bms.ant", "baud": 19200})
 if "MNB" in utils.BMS_TYPE:
-    supported_bms_types.append({"bms": MNB, "baud": 9600})
+    supported_bms_types.append({"bms": "MNB", "module": "bms.mnb", "baud": 9600})
 if "Sinowealth" in utils.BMS_TYPE:
-    supported_bms_types.append({"bms": Sinowealth, "baud": 9600})
+    supported_bms_types.append(
+        {"bms": "Sinowealth", "module": "bms.sinowealth", "baud": 9600}
+    )
 
 expected_bms_types = [
     battery_type
     for battery_type in supported_bms_types
-    if battery_type["bms"].__name__ in utils.BMS_TYPE or len(utils.BMS_TYPE) == 0
+    if battery_type["bms"] in utils.BMS_TYPE or len(utils.BMS_TYPE) == 0
 ]
 
 logger.info("")
@@ -87,61 +73,114 @@ def main():
         helper.publish_battery(loop)
         return True
 
-    def get_battery(_port) -> Union[Battery, None]:
-        # all the different batteries the driver support and need to test for
-        # try to establish communications with the battery 3 times, else exit
-        retry = 1
-        retries = 3
-        while retry <= retries:
+    def test_battery(_port, test) -> Union[Battery, None]:
+        # create a new battery object that can read the battery and run connection test
+        # noinspection PyBroadException
+        try:
             logger.info(
-                "-- Testing BMS: " + str(retry) + " of " + str(retries) + " rounds"
+                "Testing "
+                + test["bms"]
+                + (
+                    ' at address "' + utils.bytearray_to_string(test["address"]) + '"'
+                    if "address" in test
+                    else ""
+                )
             )
-            # create a new battery object that can read the battery and run connection test
-            for test in expected_bms_types:
-                # noinspection PyBroadException
-                try:
-                    logger.info(
-                        "Testing "
-                        + test["bms"].__name__
-                        + (
-                            ' at address "'
-                            + utils.bytearray_to_string(test["address"])
-                            + '"'
-                            if "address" in test
-                            else ""
-                        )
-                    )
-                    batteryClass = test["bms"]
-                    baud = test["baud"]
-                    battery: Battery = batteryClass(
-                        port=_port, baud=baud, address=test.get("address")
-                    )
-                    if battery.test_connection() and battery.validate_data():
-                        logger.info(
-                            "Connection established to " + battery.__class__.__name__
-                        )
+            batteryClass = detection.get_bms_class(test)
+            baud = test["baud"]
+            battery: Battery = batteryClass(
+                port=_port, baud=baud, address=test.get("address")
+            )
+            if battery.test_connection() and battery.validate_data():
+                logger.info("Connection established to " + battery.__class__.__name__)
+                return battery
+        except KeyboardInterrupt:
+            raise
+        except Exception:
+            (
+                exception_type,
+                exception_object,
+                exception_traceback,
+            ) = sys.exc_info()
+            file = exception_traceback.tb_frame.f_code.co_filename
+            line = exception_traceback.tb_lineno
+            logger.error(
+                "Non blocking exception occurred: "
+                + f"{repr(exception_object)} of type {exception_type} in {file} line #{line}"
+            )
+            # Ignore any malfunction test_function()
+            pass
+
+        return None
+
+    def get_battery(_port) -> Union[Battery, None]:
+        try:
+            # test the BMS type that was found on this port the last time first
+            test = detection.get_cached_bms_type(_port, expected_bms_types)
+            if test is not None:
+                battery = test_battery(_port, test)
+                if battery is not None:
+                    return battery
+
+            # send one fingerprint burst per baud rate and only test the BMS types that replied
+            for test in detection.probe_port(_port, expected_bms_types):
+                battery = test_battery(_port, test)
+                if battery is not None:
+                    detection.set_cached_bms_type(_port, test)
+                    return battery
+
+            # all the different batteries the driver support and need to test for
+            # try to establish communications with the battery 3 times, else exit
+            retry = 1
+            retries = 3
+            while retry <= retries:
+                logger.info(
+                    "-- Testing BMS: " + str(retry) + " of " + str(retries) + " rounds"
+                )
+                for test in expected_bms_types:
+                    battery = test_battery(_port, test)
+                    if battery is not None:
+                        detection.set_cached_bms_type(_port, test)
                         return battery
-                except KeyboardInterrupt:
-                    return None
-                except Exception:
-                    (
-                        exception_type,
-                        exception_object,
-                        exception_traceback,
-                    ) = sys.exc_info()
-                    file = exception_traceback.tb_frame.f_code.co_filename
-                    line = exception_traceback.tb_lineno
-                    logger.error(
-                        "Non blocking exception occurred: "
-                        + f"{repr(exception_object)} of type {exception_type} in {file} line #{line}"
-                    )
-                    # Ignore any malfunction test_function()
-                    pass
-            retry += 1
-            sleep(0.5)
+                retry += 1
+                sleep(0.5)
+        except KeyboardInterrupt:
+            return None
 
         return None
 
+    def get_batteries(_port) -> List[Tuple[bytes, Battery]]:
+        """
+        Test every address in BUS_ADDRESSES and return the address and the battery
+        for each BMS found. All BMS on the bus have to be of the same type.
+        """
+        batteries = []
+        tests = [
+            test
+            for test in expected_bms_types
+            if detection.get_bms_class(test).BUS_ADDRESSABLE
+        ]
+        try:
+            for address in utils.BUS_ADDRESSES:
+                for test in tests:
+                    battery = test_battery(_port, dict(test, address=address))
+                    if battery is not None:
+                        batteries.append((address, battery))
+                        # test only the type of the first BMS found on the other addresses
+                        tests = [test]
+                        break
+                else:
+                    logger.warning(
+                        "No BMS found at address "
+                        + utils.bytearray_to_string(address)
+                        + " on "
+                        + _port
+                    )
+        except KeyboardInterrupt:
+            return []
+
+        return batteries
+
     def get_port() -> str:
         # Get the port we need to use from the argument
         if len(sys.argv) > 1:
@@ -173,6 +212,8 @@ def main():
 
     port = get_port()
     battery = None
+    # address and battery of each BMS, the address is None if there is only one BMS per port
+    batteries = []
 
     # wait some seconds to be sure that the serial connection is ready
     # else the error throw a lot of timeouts
@@ -199,32 +240,38 @@ def main():
 
     elif port.startswith("can"):
         """
-        Import CAN classes only, if it's a can port, else the driver won't start due to missing python modules
-        This prevent problems when using the driver only with a serial connection
+        Test CAN classes only, if it's a can port. They are imported when tested, else the driver won't start
+        due to missing python modules. This prevent problems when using the driver only with a serial connection
         """
-        from bms.daly_can import Daly_Can
-        from bms.jkbms_can import Jkbms_Can
-
         # only try CAN BMS on CAN port
         supported_bms_types = [
-            {"bms": Daly_Can, "baud": 250000},
-            {"bms": Jkbms_Can, "baud": 250000},
+            {"bms": "Daly_Can", "module": "bms.daly_can", "baud": 250000},
+            {"bms": "Jkbms_Can", "module": "bms.jkbms_can", "baud": 250000},
         ]
 
         expected_bms_types = [
             battery_type
             for battery_type in supported_bms_types
-            if battery_type["bms"].__name__ in utils.BMS_TYPE
-            or len(utils.BMS_TYPE) == 0
+            if battery_type["bms"] in utils.BMS_TYPE or len(utils.BMS_TYPE) == 0
         ]
 
         battery = get_battery(port)
 
+    elif len(utils.BUS_ADDRESSES) > 0:
+        batteries = get_batteries(port)
+
+        # combine the BMS to one battery
+        if utils.BUS_AGGREGATE and len(batteries) > 0:
+            battery = AggregateBattery([battery for _, battery in batteries])
+
     else:
         battery = get_battery(port)
 
+    if battery is not None:
+        batteries = [(None, battery)]
+
     # exit if no battery could be found
-    if battery is None:
+    if len(batteries) == 0:
         logger.error("ERROR >>> No battery connection at " + port)
         sys.exit(1)
 
@@ -235,27 +282,44 @@ def main():
     mainloop = gobject.MainLoop()
 
     # Get the initial values for the battery used by setup_vedbus
-    helper = DbusHelper(battery)
+    # each BMS on a bus gets its own service
+    helpers = []
+    for address, battery in batteries:
+        helper = DbusHelper(battery, address)
 
-    if not helper.setup_vedbus():
-        logger.error("ERROR >>> Problem with battery set up at " + port)
-        sys.exit(1)
+        if not helper.setup_vedbus():
+            logger.error("ERROR >>> Problem with battery set up at " + port)
+            sys.exit(1)
+
+        helpers.append(helper)
 
     # try using active callback on this battery
-    if not battery.use_callback(lambda: poll_battery(mainloop)):
+    if len(helpers) > 1 or not battery.use_callback(lambda: poll_battery(mainloop)):
         # change poll interval if set in config
         if utils.POLL_INTERVAL is not None:
-            battery.poll_interval = utils.POLL_INTERVAL
+            for _, battery in batteries:
+                battery.poll_interval = utils.POLL_INTERVAL
         # if not possible, poll the battery every poll_interval milliseconds
-        gobject.timeout_add(battery.poll_interval, lambda: poll_battery(mainloop))
+        # or adapt the poll interval to the activity of the battery
+        PollScheduler(
+            helpers, mainloop, utils.POLL_IN_THREAD, utils.POLL_INTERVAL_ADAPTIVE
+        ).start()
+
+    # apply changes of the config files without restart
+    if utils.CONFIG_RELOAD:
+        ConfigWatcher(helpers).start()
 
-    # print log at this point, else not all data is correctly populated
-    battery.log_settings()
+    # check config, if there are any invalid values
+    config_valid = utils.validate_config_values()
 
-    # check config, if there are any invalid values trigger "settings incorrect" error
-    if not utils.validate_config_values():
-        battery.state = 10
-        battery.error_code = 31
+    for _, battery in batteries:
+        # print log at this point, else not all data is correctly populated
+        battery.log_settings()
+
+        # trigger "settings incorrect" error, if there are any invalid config values
+        if not config_valid:
+            battery.state = 10
+            battery.error_code = 31
 
     # use external current sensor if configured
     try:
@@ -263,6 +327,11 @@ def main():
             utils.EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE is not None
             and utils.EXTERNAL_CURRENT_SENSOR_DBUS_PATH is not None
         ):
+            # the external sensor measures the current of a single battery
+            if len(batteries) > 1:
+                raise ValueError(
+                    "EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE is not supported with BUS_ADDRESSES"
+                )
             battery.monitor_external_current()
     except Exception:
         # set to None to avoid crashing, fallback to battery current
@@ -280,12 +349,22 @@ def main():
             + f"{repr(exception_object)} of type {exception_type} in {file} line #{line}"
         )
 
+    # stop the main loop on SIGTERM, so that the queued settings are written before the driver exits
+    gobject.unix_signal_add(gobject.PRIORITY_DEFAULT, signal.SIGTERM, mainloop.quit)
+
     # Run the main loop
     try:
         mainloop.run()
     except KeyboardInterrupt:
         pass
 
+    # write the settings, which are still queued
+    for helper in helpers:
+        try:
+            helper.settings_writer.flush(blocking=True)
+        except Exception:
+            logger.exception("Settings could not be written on shutdown")
+
 
 if __name__ == "__main__":
     main()
@@ -4,7 +4,8 @@ import os
 import platform
 import dbus
 import traceback
-from time import sleep, time
+from time import monotonic, sleep, time
+from typing import NamedTuple
 from utils import logger, publish_config_variables
 import utils
 from xml.etree import ElementTree
@@ -23,18 +24,190 @@ from settingsdevice import (  # noqa: E402
 )
 
 
-def get_bus() -> dbus.bus.BusConnection:
+def get_bus(private: bool = False) -> dbus.bus.BusConnection:
+    """
+    :param private: open a new connection instead of the shared one, needed if
+        more than one service is published by the same process
+    """
     return (
-        dbus.SessionBus()
+        dbus.SessionBus(private=private)
         if "DBUS_SESSION_BUS_ADDRESS" in os.environ
-        else dbus.SystemBus()
+        else dbus.SystemBus(private=private)
     )
 
 
+class PollSample(NamedTuple):
+    """
+    Result of a single BMS poll
+    """
+
+    result: bool
+    """
+    Return value of the battery's refresh_data function
+    """
+    time_serial: float
+    """
+    Time spent in serial transactions in seconds
+    """
+    time_decode: float
+    """
+    Time spent in refresh_data without the serial transactions in seconds
+    """
+
+
+class SettingsWriter:
+    """
+    Writes settings to com.victronenergy.settings in the background.
+
+    Changed values are queued and sent with asynchronous dbus calls, so the poll loop never
+    waits for localsettings. Every setting has at most one value queued, newer values replace
+    older ones. SocCalc changes on almost every poll while current flows, it's only written
+    every SOC_CALC_SAVE_INTERVAL seconds or if it changed by SOC_CALC_SAVE_DELTA, which also
+    reduces the flash wear.
+    """
+
+    SOC_CALC_SAVE_INTERVAL = 60
+    """
+    Minimum time between two writes of SocCalc in seconds
+    """
+    SOC_CALC_SAVE_DELTA = 1.0
+    """
+    Change of SocCalc in %, which is written before the interval elapsed
+    """
+    RETRY_INTERVAL = 30
+    """
+    Time in seconds to wait after a failed write, before the settings are written again
+    """
+
+    def __init__(self, object_path: str, written: dict):
+        """
+        :param object_path: the settings path of the battery
+        :param written: the values stored in the settings by setting name
+        """
+        self.object_path = object_path
+        self.written = dict(written)
+        self.written_time = {}
+        self.pending = {}
+        self.in_flight = set()
+        self.retry_time = None
+        self.methods = {}
+
+    def set(self, setting_name: str, value) -> None:
+        """
+        Queue a value, it's written by the next flush, if it differs from the stored value
+
+        :param setting_name: the name of the setting below the object path
+        :param value: the new value
+        """
+        if value is None:
+            return
+        if (
+            value == self.written.get(setting_name)
+            and setting_name not in self.in_flight
+        ):
+            self.pending.pop(setting_name, None)
+        else:
+            self.pending[setting_name] = value
+
+    def is_due(self, setting_name: str, value, now: float) -> bool:
+        """
+        Check the rate limit of a setting
+
+        :return: True, if the value can be written now
+        """
+        if setting_name != "SocCalc" or setting_name not in self.written_time:
+            return True
+        if now - self.written_time[setting_name] >= self.SOC_CALC_SAVE_INTERVAL:
+            return True
+        written = self.written.get(setting_name)
+        return (
+            isinstance(value, (int, float))
+            and isinstance(written, (int, float))
+            and abs(value - written) >= self.SOC_CALC_SAVE_DELTA
+        )
+
+    def get_method(self, setting_name: str):
+        """
+        Get the SetValue method of a setting. The proxy is created once and without
+        introspection, which would be a blocking dbus call.
+        """
+        if setting_name not in self.methods:
+            obj = get_bus().get_object(
+                "com.victronenergy.settings",
+                self.object_path + "/" + setting_name,
+                introspect=False,
+            )
+            self.methods[setting_name] = dbus.Interface(
+                obj, "com.victronenergy.BusItem"
+            ).get_dbus_method("SetValue")
+        return self.methods[setting_name]
+
+    def flush(self, blocking: bool = False) -> None:
+        """
+        Write the queued values, which are due
+
+        :param blocking: wait for the writes and ignore the rate limits, used on shutdown when
+            the main loop is not running anymore
+        """
+        now = monotonic()
+        if not blocking and self.retry_time is not None and now < self.retry_time:
+            return
+
+        for setting_name, value in list(self.pending.items()):
+            if not blocking and (
+                setting_name in self.in_flight
+                or not self.is_due(setting_name, value, now)
+            ):
+                continue
+
+            del self.pending[setting_name]
+            try:
+                if blocking:
+                    self.get_method(setting_name)(value)
+                    self.on_written(setting_name, value)
+                else:
+                    self.in_flight.add(setting_name)
+                    self.get_method(setting_name)(
+                        value,
+                        reply_handler=lambda result, n=setting_name, v=value: (
+                            self.on_written(n, v)
+                        ),
+                        error_handler=lambda error, n=setting_name, v=value: (
+                            self.on_error(n, v, error)
+                        ),
+                    )
+            except dbus.exceptions.DBusException as error:
+                self.on_error(setting_name, value, error)
+
+    def on_written(self, setting_name: str, value) -> None:
+        self.in_flight.discard(setting_name)
+        logger.debug(
+            f"Saved {setting_name}. Before {self.written.get(setting_name)}, after {value}"
+        )
+        self.written[setting_name] = value
+        self.written_time[setting_name] = monotonic()
+        self.retry_time = None
+        # drop a queued value, which is the same as the written one
+        if self.pending.get(setting_name) == value:
+            del self.pending[setting_name]
+
+    def on_error(self, setting_name: str, value, error: Exception) -> None:
+        self.in_flight.discard(setting_name)
+        logger.error(f"Failed to set setting {setting_name}: {error}")
+        # write the value again later, if no newer value was queued
+        self.pending.setdefault(setting_name, value)
+        self.retry_time = monotonic() + self.RETRY_INTERVAL
+
+
 class DbusHelper:
     EMPTY_DICT = {}
 
-    def __init__(self, battery):
+    def __init__(self, battery, bus_address: bytes = None):
+        """
+        :param battery: the battery to publish
+        :param bus_address: the address of the BMS, if multiple BMS are polled on the same bus.
+            Each BMS gets its own service named after the port and the address
+        """
         self.battery = battery
         self.instance = 1
         self.settings = None
@@ -43,22 +216,30 @@ class DbusHelper:
         self._dbusname = (
             "com.victronenergy.battery."
             + self.battery.port[self.battery.port.rfind("/") + 1 :]
+            + (
+                "__" + utils.bytearray_to_string(bus_address).replace("\\", "0")
+                if bus_address is not None
+                else ""
+            )
+        )
+        self._dbusservice = VeDbusService(
+            self._dbusname, get_bus(private=bus_address is not None)
         )
-        self._dbusservice = VeDbusService(self._dbusname, get_bus())
         self.bms_id = "".join(
             # remove all non alphanumeric characters from the identifier
             c if c.isalnum() else "_"
             for c in self.battery.unique_identifier()
         )
         self.path_battery = None
-        self.save_charge_details_last = {
-            "allow_max_voltage": self.battery.allow_max_voltage,
-            "max_voltage_start_time": self.battery.max_voltage_start_time,
-            "soc_reset_last_reached": self.battery.soc_reset_last_reached,
-            "soc_calc": (
-                self.battery.soc_calc if self.battery.soc_calc is not None else ""
-            ),
+        # duration of the poll stages, published to "/Diagnostics/Timing/"
+        self.timing = {
+            "Serial": utils.TimingStatistics(),
+            "Decode": utils.TimingStatistics(),
+            "Control": utils.TimingStatistics(),
+            "Publish": utils.TimingStatistics(),
         }
+        # writes the charge details to the settings, created by setup_instance()
+        self.settings_writer: SettingsWriter = None
 
     def create_pid_file(self) -> None:
         """
@@ -460,6 +641,19 @@ class DbusHelper:
         self.settings.addSettings(settings)
         self.battery.role, self.instance = self.get_role_instance()
 
+        self.settings_writer = SettingsWriter(
+            self.path_battery,
+            {
+                name: settings[name][1]
+                for name in (
+                    "AllowMaxVoltage",
+                    "MaxVoltageStartTime",
+                    "SocCalc",
+                    "SocResetLastReached",
+                )
+            },
+        )
+
         # create pid file
         self.create_pid_file()
 
@@ -764,6 +958,26 @@ class DbusHelper:
         if utils.PUBLISH_CONFIG_VALUES:
             publish_config_variables(self._dbusservice)
 
+        if utils.CONFIG_RELOAD:
+            self._dbusservice.add_path("/Info/ConfigReload", None, writeable=True)
+
+        self._dbusservice.add_path(
+            "/Diagnostics/PollInterval",
+            None,
+            writeable=True,
+            gettextcallback=lambda p, v: "{:0.2f}s".format(v),
+        )
+
+        if utils.PUBLISH_TIMING_STATISTICS:
+            for stage in self.timing:
+                for value in ("Last", "Mean", "P95", "Max"):
+                    self._dbusservice.add_path(
+                        "/Diagnostics/Timing/" + stage + "/" + value,
+                        None,
+                        writeable=True,
+                        gettextcallback=lambda p, v: "{:0.1f}ms".format(v),
+                    )
+
         if self.battery.has_settings:
             self._dbusservice.add_path("/Settings/HasSettings", 1, writeable=False)
             self._dbusservice.add_path(
@@ -778,9 +992,51 @@ class DbusHelper:
     def publish_battery(self, loop):
         # This is called every battery.poll_interval milli second as set up per battery type to read and update the data
         try:
-            # Call the battery's refresh_data function
-            result = self.battery.refresh_data()
-            if result:
+            sample = self.refresh_battery()
+        except Exception:
+            traceback.print_exc()
+            loop.quit()
+            return
+
+        self.process_battery(loop, sample)
+
+    def refresh_battery(self) -> PollSample:
+        """
+        Read the data from the BMS by calling the battery's refresh_data function.
+        This does not access dbus and can therefore run outside of the main loop.
+
+        :return: the poll sample, which has to be passed to process_battery()
+        """
+        time_start = monotonic()
+        serial_time_start = utils.get_serial_statistics(self.battery.port)["time_total"]
+        # the cell values change, use the live values until the new statistics are calculated
+        self.battery.cell_stats = None
+        result = self.battery.refresh_data()
+        time_refresh = monotonic() - time_start
+        if not result:
+            # read all refresh groups again, the BMS could have been replaced or reset
+            self.battery.reset_refreshed()
+        time_serial = min(
+            utils.get_serial_statistics(self.battery.port)["time_total"]
+            - serial_time_start,
+            time_refresh,
+        )
+
+        return PollSample(result, time_serial, time_refresh - time_serial)
+
+    def process_battery(self, loop, sample: PollSample) -> None:
+        """
+        Handle the connection state, calculate the charge control values and publish
+        the data of a poll sample to dbus. Has to run in the main loop.
+
+        :param loop: the main loop, which is stopped if the battery failed
+        :param sample: the poll sample returned by refresh_battery()
+        """
+        try:
+            self.timing["Serial"].add(sample.time_serial)
+            self.timing["Decode"].add(sample.time_decode)
+
+            if sample.result:
                 # reset error variables
                 self.error["count"] = 0
                 self.battery.online = True
@@ -829,12 +1085,19 @@ class DbusHelper:
                 if time_since_first_error >= 60 * 20 and not utils.BLOCK_ON_DISCONNECT:
                     loop.quit()
 
+            time_start = monotonic()
+
+            # calculate the cell statistics once for the charge control and the publishing
+            self.battery.calculate_cell_statistics()
+
             # This is to mannage CVCL
             self.battery.manage_charge_voltage()
 
             # This is to mannage CCL\DCL
             self.battery.manage_charge_current()
 
+            self.timing["Control"].add(monotonic() - time_start)
+
             # Manage battery state, if not set to error (10)
             # change state from initializing to running, if there is no error
             if self.battery.state == 0:
@@ -856,46 +1119,94 @@ class DbusHelper:
                 self.battery.state = 9
 
             # publish all the data from the battery object to dbus
+            time_start = monotonic()
             self.publish_dbus()
+            self.timing["Publish"].add(monotonic() - time_start)
+
+            if utils.PUBLISH_TIMING_STATISTICS:
+                self.publish_timing()
 
         except Exception:
             traceback.print_exc()
             loop.quit()
 
+    def publish_poll_interval(self, poll_interval: float) -> None:
+        """
+        Publish the current poll interval in seconds to "/Diagnostics/PollInterval"
+
+        :param poll_interval: the poll interval in milliseconds
+        """
+        self.publish_values(
+            {"/Diagnostics/PollInterval": round(poll_interval / 1000, 2)}
+        )
+
+    def publish_config_reload(self, status: str, values: dict) -> None:
+        """
+        Publish the result of a config reload to "/Info/ConfigReload"
+
+        :param status: the applied and rejected settings
+        :param values: the applied config values by name
+        """
+        dbus_values = {"/Info/ConfigReload": status}
+        if utils.PUBLISH_CONFIG_VALUES:
+            # only the paths created by publish_config_variables() at startup exist
+            for variable, value in values.items():
+                if variable in utils.locals_copy and isinstance(
+                    value, (float, int, str, list)
+                ):
+                    dbus_values[f"/Info/Config/{variable}"] = value
+        self.publish_values(dbus_values)
+
+    def publish_timing(self):
+        """
+        Publish the duration of the poll stages in ms to "/Diagnostics/Timing/"
+        """
+        values = {}
+        for stage, timing in self.timing.items():
+            statistics = timing.get_statistics()
+            for key, value in statistics.items():
+                values["/Diagnostics/Timing/" + stage + "/" + key.capitalize()] = (
+                    round(value * 1000, 1) if value is not None else None
+                )
+        self.publish_values(values)
+
     def publish_dbus(self):
+        # collect all values first and publish only the changed ones at the end
+        values = {}
+
         # Update SOC, DC and System items
-        self._dbusservice["/System/NrOfCellsPerBattery"] = self.battery.cell_count
+        values["/System/NrOfCellsPerBattery"] = self.battery.cell_count
         if utils.SOC_CALCULATION:
-            self._dbusservice["/Soc"] = (
+            values["/Soc"] = (
                 round(self.battery.soc_calc, 2)
                 if self.battery.soc_calc is not None
                 else None
             )
             # add original SOC for comparing
-            self._dbusservice["/SocBms"] = (
+            values["/SocBms"] = (
                 round(self.battery.soc, 2) if self.battery.soc is not None else None
             )
         else:
-            self._dbusservice["/Soc"] = (
+            values["/Soc"] = (
                 round(self.battery.soc, 2) if self.battery.soc is not None else None
             )
-        self._dbusservice["/Dc/0/Voltage"] = (
+        values["/Dc/0/Voltage"] = (
             round(self.battery.voltage, 2) if self.battery.voltage is not None else None
         )
-        self._dbusservice["/Dc/0/Current"] = (
+        values["/Dc/0/Current"] = (
             round(self.battery.get_current(), 2)
             if self.battery.get_current() is not None
             else None
         )
-        self._dbusservice["/Dc/0/Power"] = (
+        values["/Dc/0/Power"] = (
             round(self.battery.voltage * self.battery.get_current(), 2)
             if self.battery.get_current() is not None
             and self.battery.get_current() is not None
             else None
         )
-        self._dbusservice["/Dc/0/Temperature"] = self.battery.get_temp()
-        self._dbusservice["/Capacity"] = self.battery.get_capacity_remain()
-        self._dbusservice["/ConsumedAmphours"] = (
+        values["/Dc/0/Temperature"] = self.battery.get_temp()
+        values["/Capacity"] = self.battery.get_capacity_remain()
+        values["/ConsumedAmphours"] = (
             None
             if self.battery.capacity is None
             or self.battery.get_capacity_remain() is None
@@ -904,98 +1215,72 @@ class DbusHelper:
 
         midpoint, deviation = self.battery.get_midvoltage()
         if midpoint is not None:
-            self._dbusservice["/Dc/0/MidVoltage"] = midpoint
-            self._dbusservice["/Dc/0/MidVoltageDeviation"] = deviation
+            values["/Dc/0/MidVoltage"] = midpoint
+            values["/Dc/0/MidVoltageDeviation"] = deviation
 
         # Update battery extras
-        self._dbusservice["/State"] = self.battery.state
-        self._dbusservice["/ErrorCode"] = self.battery.error_code
-        self._dbusservice["/History/ChargeCycles"] = self.battery.cycles
-        self._dbusservice["/History/TotalAhDrawn"] = self.battery.total_ah_drawn
-        self._dbusservice["/Io/AllowToCharge"] = (
-            1 if self.battery.get_allow_to_charge() else 0
-        )
-        self._dbusservice["/Io/AllowToDischarge"] = (
+        values["/State"] = self.battery.state
+        values["/ErrorCode"] = self.battery.error_code
+        values["/History/ChargeCycles"] = self.battery.cycles
+        values["/History/TotalAhDrawn"] = self.battery.total_ah_drawn
+        values["/Io/AllowToCharge"] = 1 if self.battery.get_allow_to_charge() else 0
+        values["/Io/AllowToDischarge"] = (
             1 if self.battery.get_allow_to_discharge() else 0
         )
-        self._dbusservice["/Io/AllowToBalance"] = (
-            1 if self.battery.get_allow_to_balance() else 0
-        )
-        self._dbusservice["/System/NrOfModulesBlockingCharge"] = (
+        values["/Io/AllowToBalance"] = 1 if self.battery.get_allow_to_balance() else 0
+        values["/System/NrOfModulesBlockingCharge"] = (
             0 if self.battery.get_allow_to_charge() else 1
         )
-        self._dbusservice["/System/NrOfModulesBlockingDischarge"] = (
+        values["/System/NrOfModulesBlockingDischarge"] = (
             0 if self.battery.get_allow_to_discharge() else 1
         )
-        self._dbusservice["/System/NrOfModulesOnline"] = 1 if self.battery.online else 0
-        self._dbusservice["/System/NrOfModulesOffline"] = (
-            0 if self.battery.online else 1
-        )
-        self._dbusservice["/System/MinCellTemperature"] = self.battery.get_min_temp()
-        self._dbusservice["/System/MinTemperatureCellId"] = (
-            self.battery.get_min_temp_id()
-        )
-        self._dbusservice["/System/MaxCellTemperature"] = self.battery.get_max_temp()
-        self._dbusservice["/System/MaxTemperatureCellId"] = (
-            self.battery.get_max_temp_id()
-        )
-        self._dbusservice["/System/MOSTemperature"] = self.battery.get_mos_temp()
-        self._dbusservice["/System/Temperature1"] = self.battery.temp1
-        self._dbusservice["/System/Temperature1Name"] = utils.TEMP_1_NAME
-        self._dbusservice["/System/Temperature2"] = self.battery.temp2
-        self._dbusservice["/System/Temperature2Name"] = utils.TEMP_2_NAME
-        self._dbusservice["/System/Temperature3"] = self.battery.temp3
-        self._dbusservice["/System/Temperature3Name"] = utils.TEMP_3_NAME
-        self._dbusservice["/System/Temperature4"] = self.battery.temp4
-        self._dbusservice["/System/Temperature4Name"] = utils.TEMP_4_NAME
+        values["/System/NrOfModulesOnline"] = 1 if self.battery.online else 0
+        values["/System/NrOfModulesOffline"] = 0 if self.battery.online else 1
+        values["/System/MinCellTemperature"] = self.battery.get_min_temp()
+        values["/System/MinTemperatureCellId"] = self.battery.get_min_temp_id()
+        values["/System/MaxCellTemperature"] = self.battery.get_max_temp()
+        values["/System/MaxTemperatureCellId"] = self.battery.get_max_temp_id()
+        values["/System/MOSTemperature"] = self.battery.get_mos_temp()
+        values["/System/Temperature1"] = self.battery.temp1
+        values["/System/Temperature1Name"] = utils.TEMP_1_NAME
+        values["/System/Temperature2"] = self.battery.temp2
+        values["/System/Temperature2Name"] = utils.TEMP_2_NAME
+        values["/System/Temperature3"] = self.battery.temp3
+        values["/System/Temperature3Name"] = utils.TEMP_3_NAME
+        values["/System/Temperature4"] = self.battery.temp4
+        values["/System/Temperature4Name"] = utils.TEMP_4_NAME
 
         # Voltage control
-        self._dbusservice["/Info/MaxChargeVoltage"] = (
+        values["/Info/MaxChargeVoltage"] = (
             round(self.battery.control_voltage + utils.VOLTAGE_DROP, 2)
             if self.battery.control_voltage is not None
             else None
         )
 
         # Charge control
-        self._dbusservice["/Info/MaxChargeCurrent"] = (
-            self.battery.control_charge_current
-        )
-        self._dbusservice["/Info/MaxDischargeCurrent"] = (
-            self.battery.control_discharge_current
-        )
+        values["/Info/MaxChargeCurrent"] = self.battery.control_charge_current
+        values["/Info/MaxDischargeCurrent"] = self.battery.control_discharge_current
 
         # Voltage and charge control info (custom dbus paths)
-        self._dbusservice["/Info/ChargeMode"] = self.battery.charge_mode
-        self._dbusservice["/Info/ChargeModeDebug"] = self.battery.charge_mode_debug
-        self._dbusservice["/Info/ChargeModeDebugFloat"] = (
-            self.battery.charge_mode_debug_float
-        )
-        self._dbusservice["/Info/ChargeModeDebugBulk"] = (
-            self.battery.charge_mode_debug_bulk
-        )
-        self._dbusservice["/Info/ChargeLimitation"] = self.battery.charge_limitation
-        self._dbusservice["/Info/DischargeLimitation"] = (
-            self.battery.discharge_limitation
-        )
+        values["/Info/ChargeMode"] = self.battery.charge_mode
+        values["/Info/ChargeModeDebug"] = self.battery.charge_mode_debug
+        values["/Info/ChargeModeDebugFloat"] = self.battery.charge_mode_debug_float
+        values["/Info/ChargeModeDebugBulk"] = self.battery.charge_mode_debug_bulk
+        values["/Info/ChargeLimitation"] = self.battery.charge_limitation
+        values["/Info/DischargeLimitation"] = self.battery.discharge_limitation
 
         # Updates from cells
-        self._dbusservice["/System/MinVoltageCellId"] = self.battery.get_min_cell_desc()
-        self._dbusservice["/System/MaxVoltageCellId"] = self.battery.get_max_cell_desc()
-        self._dbusservice["/System/MinCellVoltage"] = (
-            self.battery.get_min_cell_voltage()
-        )
-        self._dbusservice["/System/MaxCellVoltage"] = (
-            self.battery.get_max_cell_voltage()
-        )
-        self._dbusservice["/Balancing"] = self.battery.get_balancing()
+        values["/System/MinVoltageCellId"] = self.battery.get_min_cell_desc()
+        values["/System/MaxVoltageCellId"] = self.battery.get_max_cell_desc()
+        values["/System/MinCellVoltage"] = self.battery.get_min_cell_voltage()
+        values["/System/MaxCellVoltage"] = self.battery.get_max_cell_voltage()
+        values["/Balancing"] = self.battery.get_balancing()
 
         # Update the alarms
-        self._dbusservice["/Alarms/LowVoltage"] = self.battery.protection.voltage_low
-        self._dbusservice["/Alarms/LowCellVoltage"] = (
-            self.battery.protection.voltage_cell_low
-        )
+        values["/Alarms/LowVoltage"] = self.battery.protection.voltage_low
+        values["/Alarms/LowCellVoltage"] = self.battery.protection.voltage_cell_low
         # disable high voltage warning temporarly, if loading to bulk voltage and bulk voltage reached is 30 minutes ago
-        self._dbusservice["/Alarms/HighVoltage"] = (
+        values["/Alarms/HighVoltage"] = (
             self.battery.protection.voltage_high
             if (
                 self.battery.soc_reset_requested is False
@@ -1003,42 +1288,25 @@ class DbusHelper:
             )
             else 0
         )
-        self._dbusservice["/Alarms/LowSoc"] = self.battery.protection.soc_low
-        self._dbusservice["/Alarms/HighChargeCurrent"] = (
-            self.battery.protection.current_over
-        )
-        self._dbusservice["/Alarms/HighDischargeCurrent"] = (
-            self.battery.protection.current_under
-        )
-        self._dbusservice["/Alarms/CellImbalance"] = (
-            self.battery.protection.cell_imbalance
-        )
-        self._dbusservice["/Alarms/InternalFailure"] = (
-            self.battery.protection.internal_failure
-        )
-        self._dbusservice["/Alarms/HighChargeTemperature"] = (
+        values["/Alarms/LowSoc"] = self.battery.protection.soc_low
+        values["/Alarms/HighChargeCurrent"] = self.battery.protection.current_over
+        values["/Alarms/HighDischargeCurrent"] = self.battery.protection.current_under
+        values["/Alarms/CellImbalance"] = self.battery.protection.cell_imbalance
+        values["/Alarms/InternalFailure"] = self.battery.protection.internal_failure
+        values["/Alarms/HighChargeTemperature"] = (
             self.battery.protection.temp_high_charge
         )
-        self._dbusservice["/Alarms/LowChargeTemperature"] = (
-            self.battery.protection.temp_low_charge
-        )
-        self._dbusservice["/Alarms/HighTemperature"] = (
-            self.battery.protection.temp_high_discharge
-        )
-        self._dbusservice["/Alarms/LowTemperature"] = (
-            self.battery.protection.temp_low_discharge
-        )
-        self._dbusservice["/Alarms/BmsCable"] = (
-            2 if self.battery.block_because_disconnect else 0
-        )
-        self._dbusservice["/Alarms/HighInternalTemperature"] = (
+        values["/Alarms/LowChargeTemperature"] = self.battery.protection.temp_low_charge
+        values["/Alarms/HighTemperature"] = self.battery.protection.temp_high_discharge
+        values["/Alarms/LowTemperature"] = self.battery.protection.temp_low_discharge
+        values["/Alarms/BmsCable"] = 2 if self.battery.block_because_disconnect else 0
+        values["/Alarms/HighInternalTemperature"] = (
             self.battery.protection.temp_high_internal
         )
 
         # cell voltages
         if utils.BATTERY_CELL_DATA_FORMAT > 0:
             try:
-                voltage_sum = 0
                 for i in range(self.battery.cell_count):
                     voltage = self.battery.get_cell_voltage(i)
                     cellpath = (
@@ -1046,18 +1314,18 @@ class DbusHelper:
                         if (utils.BATTERY_CELL_DATA_FORMAT & 2)
                         else "/Voltages/Cell%s"
                     )
-                    self._dbusservice[cellpath % (str(i + 1))] = voltage
+                    values[cellpath % (str(i + 1))] = voltage
                     if utils.BATTERY_CELL_DATA_FORMAT & 1:
-                        self._dbusservice["/Balances/Cell%s" % (str(i + 1))] = (
+                        values["/Balances/Cell%s" % (str(i + 1))] = (
                             self.battery.get_cell_balancing(i)
                         )
-                    if voltage:
-                        voltage_sum += voltage
                 pathbase = (
                     "Cell" if (utils.BATTERY_CELL_DATA_FORMAT & 2) else "Voltages"
                 )
-                self._dbusservice["/%s/Sum" % pathbase] = round(voltage_sum, 2)
-                self._dbusservice["/%s/Diff" % pathbase] = round(
+                values["/%s/Sum" % pathbase] = round(
+                    self.battery.get_cell_voltage_sum(), 2
+                )
+                values["/%s/Diff" % pathbase] = round(
                     self.battery.get_max_cell_voltage()
                     - self.battery.get_min_cell_voltage(),
                     3,
@@ -1103,7 +1371,7 @@ class DbusHelper:
                     2,
                 )
 
-                self._dbusservice["/CurrentAvg"] = self.battery.current_avg
+                values["/CurrentAvg"] = self.battery.current_avg
 
                 percent_per_seconds = (
                     abs(self.battery.current_avg / (self.battery.capacity / 100)) / 3600
@@ -1124,7 +1392,7 @@ class DbusHelper:
                     )
 
                     # Check that time_to_go is not None and current is not near zero
-                    self._dbusservice["/TimeToGo"] = (
+                    values["/TimeToGo"] = (
                         abs(int(time_to_go))
                         if time_to_go is not None
                         and abs(self.battery.current_avg) > 0.1
@@ -1134,7 +1402,7 @@ class DbusHelper:
                 # Update TimeToSoc items
                 if len(utils.TIME_TO_SOC_POINTS) > 0:
                     for num in utils.TIME_TO_SOC_POINTS:
-                        self._dbusservice["/TimeToSoC/" + str(num)] = (
+                        values["/TimeToSoC/" + str(num)] = (
                             self.battery.get_timeToSoc(num, percent_per_seconds)
                             if self.battery.current_avg
                             else None
@@ -1153,16 +1421,41 @@ class DbusHelper:
                 + f"{repr(exception_object)} of type {exception_type} in {file} line #{line}"
             )
 
-        # save settings every 15 seconds to dbus
-        if int(time()) % 15:
-            self.saveCurrentBatteryState()
+        # queue the changed charge details, they are written in the background
+        self.saveCurrentBatteryState()
 
         if self.battery.soc is not None:
             logger.debug("logged to dbus [%s]" % str(round(self.battery.soc, 2)))
             self.battery.log_cell_data()
 
         if self.battery.has_settings:
-            self._dbusservice["/Settings/ResetSoc"] = self.battery.reset_soc
+            values["/Settings/ResetSoc"] = self.battery.reset_soc
+
+        self.publish_values(values)
+
+    def publish_values(self, values: dict) -> None:
+        """
+        Publish only the values that differ from the ones on dbus.
+        If supported by velib, all changes are sent in one ItemsChanged signal instead of
+        one signal per path.
+
+        :param values: dict with the dbus path as key and the value to publish
+        """
+        changed = {
+            path: value
+            for path, value in values.items()
+            if self._dbusservice[path] != value
+        }
+        if len(changed) == 0:
+            return
+
+        if hasattr(self._dbusservice, "__enter__"):
+            with self._dbusservice as service:
+                for path, value in changed.items():
+                    service[path] = value
+        else:
+            for path, value in changed.items():
+                self._dbusservice[path] = value
 
     def getSettingsWithValues(
         self, bus, service: str, object_path: str, recursive: bool = True
@@ -1284,79 +1577,24 @@ class DbusHelper:
         return value if result else None
 
     # save current battery states to dbus
-    def saveCurrentBatteryState(self) -> bool:
-        result = True
-
-        if (
-            self.battery.allow_max_voltage
-            != self.save_charge_details_last["allow_max_voltage"]
-        ):
-            result = result + self.setSetting(
-                get_bus(),
-                "com.victronenergy.settings",
-                self.path_battery,
-                "AllowMaxVoltage",
-                1 if self.battery.allow_max_voltage else 0,
-            )
-            logger.debug(
-                f"Saved AllowMaxVoltage. Before {self.save_charge_details_last['allow_max_voltage']}, "
-                + f"after {self.battery.allow_max_voltage}"
-            )
-            self.save_charge_details_last["allow_max_voltage"] = (
-                self.battery.allow_max_voltage
-            )
-
-        if (
-            self.battery.max_voltage_start_time
-            != self.save_charge_details_last["max_voltage_start_time"]
-        ):
-            result = result and self.setSetting(
-                get_bus(),
-                "com.victronenergy.settings",
-                self.path_battery,
-                "MaxVoltageStartTime",
-                (
-                    self.battery.max_voltage_start_time
-                    if self.battery.max_voltage_start_time is not None
-                    else ""
-                ),
-            )
-            logger.debug(
-                f"Saved MaxVoltageStartTime. Before {self.save_charge_details_last['max_voltage_start_time']}, "
-                + f"after {self.battery.max_voltage_start_time}"
-            )
-            self.save_charge_details_last["max_voltage_start_time"] = (
+    def saveCurrentBatteryState(self) -> None:
+        """
+        Queue the charge details, which have to survive a restart of the driver.
+        The values are written asynchronously and rate limited by the SettingsWriter.
+        """
+        self.settings_writer.set(
+            "AllowMaxVoltage", 1 if self.battery.allow_max_voltage else 0
+        )
+        self.settings_writer.set(
+            "MaxVoltageStartTime",
+            (
                 self.battery.max_voltage_start_time
-            )
-
-        if self.battery.soc_calc != self.save_charge_details_last["soc_calc"]:
-            result = result and self.setSetting(
-                get_bus(),
-                "com.victronenergy.settings",
-                self.path_battery,
-                "SocCalc",
-                self.battery.soc_calc,
-            )
-            logger.debug(f"soc_calc written to dbus: {self.battery.soc_calc}")
-            self.save_charge_details_last["soc_calc"] = self.battery.soc_calc
-
-        if (
-            self.battery.soc_reset_last_reached
-            != self.save_charge_details_last["soc_reset_last_reached"]
-        ):
-            result = result and self.setSetting(
-                get_bus(),
-                "com.victronenergy.settings",
-                self.path_battery,
-                "SocResetLastReached",
-                self.battery.soc_reset_last_reached,
-            )
-            logger.debug(
-                f"Saved SocResetLastReached. Before {self.save_charge_details_last['soc_reset_last_reached']}, "
-                + f"after {self.battery.soc_reset_last_reached}",
-            )
-            self.save_charge_details_last["soc_reset_last_reached"] = (
-                self.battery.soc_reset_last_reached
-            )
-
-        return result
+                if self.battery.max_voltage_start_time is not None
+                else ""
+            ),
+        )
+        self.settings_writer.set("SocCalc", self.battery.soc_calc)
+        self.settings_writer.set(
+            "SocResetLastReached", self.battery.soc_reset_last_reached
+        )
+        self.settings_writer.flush()
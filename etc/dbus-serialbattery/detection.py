@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+Fast BMS auto detection
+
+Instead of creating every driver and waiting for each test_connection() to time out, one burst
+of fingerprint requests is sent per baud rate. The reply stream is then matched against the reply
+signatures of all protocols at once. Only the drivers that matched are created and verified with
+their regular test_connection().
+
+The BMS type found on a port is stored in a cache file together with the USB serial number and
+VID:PID of the adapter. On the next start it's tested first and the probing is skipped.
+"""
+from typing import Dict, List, Tuple, Union
+from time import time
+import importlib
+import json
+import os
+import re
+import struct
+
+import serial
+from serial.tools import list_ports
+
+from utils import logger
+import utils
+
+
+# time to listen after each fingerprint request before the next one is sent. This separates the
+# frames (Modbus RTU needs at least 3.5 character times of silence, the Daly about 20 ms) and lets
+# a BMS reply without colliding with the next request on half duplex RS485 lines
+PROBE_FRAME_GAP = 0.050
+# maximum time to wait for replies after the last request was sent
+PROBE_REPLY_TIMEOUT = 0.3
+# stop listening, if nothing was received for this time after the last received byte
+PROBE_QUIET_TIME = 0.020
+
+# the cache file is stored next to the config file, so it survives reboots
+PATH_DETECTION_CACHE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "detection_cache.json"
+)
+
+
+def modbus_crc(data: bytes) -> bytes:
+    """
+    Calculate the Modbus RTU CRC16 of a frame
+
+    :param data: the frame without CRC
+    :return: the CRC as 2 bytes in little endian
+    """
+    crc = 0xFFFF
+    for pos in data:
+        crc ^= pos
+        for _ in range(8):
+            if (crc & 1) != 0:
+                crc >>= 1
+                crc ^= 0xA001
+            else:
+                crc >>= 1
+    return struct.pack("<H", crc)
+
+
+def modbus_request(address: int, function: int, register: int, count: int) -> bytes:
+    """
+    Build a Modbus RTU read request
+
+    :return: the request including CRC
+    """
+    frame = struct.pack(">BBHH", address, function, register, count)
+    return frame + modbus_crc(frame)
+
+
+def modbus_reply(address: int, function: int, count: int) -> "re.Pattern":
+    """
+    Build the signature of a Modbus RTU read reply
+
+    :return: compiled regex matching the reply header
+    """
+    return re.compile(re.escape(bytes([address, function, count * 2])))
+
+
+def daly_request(address: int, command: int) -> bytes:
+    """
+    Build a Daly read request like Daly.generate_command() does
+
+    :return: the request including checksum
+    """
+    frame = bytearray(b"\xA5\x00\x00\x08\xAA\xAA\xAA\xAA\xAA\xAA\xAA\xAA\x00")
+    frame[1] = address
+    frame[2] = command
+    frame[12] = sum(frame[:12]) & 0xFF
+    return bytes(frame)
+
+
+# fingerprint of each protocol, keyed by driver name and address (like in supported_bms_types)
+# - request: a request that only this protocol answers, a read request except for the JK PB
+# - reply: a regex that matches the start of the reply of this protocol
+FINGERPRINTS: Dict[Tuple[str, Union[bytes, int, None]], dict] = {
+    # Daly answers with A5 01 <command> 08 independent of the request address
+    ("Daly", b"\x40"): {
+        "request": daly_request(0x40, 0x90),
+        "reply": re.compile(rb"\xA5\x01\x90\x08"),
+    },
+    ("Daly", b"\x80"): {
+        "request": daly_request(0x80, 0x90),
+        "reply": re.compile(rb"\xA5\x01\x90\x08"),
+    },
+    ("EG4_Lifepower", None): {
+        "request": b"\x7E\x01\x01\x00\xFE\x0D",
+        "reply": re.compile(rb"\x7E\x01\x01"),
+    },
+    # EG4 LL always uses address 0x01
+    ("EG4_LL", b"\x7C"): {
+        "request": modbus_request(0x01, 0x03, 0x0069, 0x23),
+        "reply": modbus_reply(0x01, 0x03, 0x23),
+    },
+    ("Jkbms", None): {
+        "request": b"\x4E\x57\x00\x13\x00\x00\x00\x00\x06\x03\x00\x00\x00\x00\x00\x00\x68\x00\x00\x01\x29",
+        "reply": re.compile(rb"\x4E\x57"),
+    },
+    # the JK PB has no read request, it sends its data after a Modbus write (function 0x10) of
+    # 0 to a trigger register. 0x161C triggers the device info frame, the same request the driver
+    # sends in get_settings(), and changes no setting. It's only sent at 115200 baud to address 1
+    ("Jkbms_pb", b"\x01"): {
+        "request": b"\x01\x10\x16\x1C\x00\x01\x02\x00\x00\xD3\xCD",
+        "reply": re.compile(rb"\x55\xAA\xEB\x90"),
+    },
+    ("LltJbd", None): {
+        "request": b"\xDD\xA5\x03\x00\xFF\xFD\x77",
+        "reply": re.compile(rb"\xDD\x03\x00"),
+    },
+    ("Renogy", b"\x30"): {
+        "request": modbus_request(0x30, 0x03, 0x1388, 1),
+        "reply": modbus_reply(0x30, 0x03, 1),
+    },
+    ("Renogy", b"\xF7"): {
+        "request": modbus_request(0xF7, 0x03, 0x1388, 1),
+        "reply": modbus_reply(0xF7, 0x03, 1),
+    },
+    # Seplos v2 answers in ASCII with CID1 0x46 and return code 00
+    ("Seplos", None): {
+        "request": b"~20004642E00201FD36\r",
+        "reply": re.compile(rb"~[0-9A-F]{4}4600"),
+    },
+}
+
+# the Heltec BMS can be on any of the configured Modbus addresses
+for _address in utils.HELTEC_MODBUS_ADDR:
+    FINGERPRINTS[("HeltecModbus", _address)] = {
+        "request": modbus_request(_address, 0x03, 7, 13),
+        "reply": modbus_reply(_address, 0x03, 13),
+    }
+
+# the Seplos v3 driver scans the same Modbus addresses
+for _address in range(16):
+    FINGERPRINTS[("Seplosv3", _address)] = {
+        "request": modbus_request(_address, 0x04, 0x1700, 10),
+        "reply": modbus_reply(_address, 0x04, 10),
+    }
+
+
+def get_bms_class(bms_type: dict) -> type:
+    """
+    Get the driver class of an entry of supported_bms_types
+
+    The driver module is imported on the first call. This way only the drivers that are tested on
+    this port are loaded, together with their dependencies like minimalmodbus.
+
+    :param bms_type: the entry of supported_bms_types
+    :return: the driver class
+    """
+    return getattr(importlib.import_module(bms_type["module"]), bms_type["bms"])
+
+
+def get_fingerprints(bms_type: dict) -> List[dict]:
+    """
+    Get the fingerprints of an entry of supported_bms_types
+
+    :param bms_type: the entry of supported_bms_types
+    :return: list of fingerprints, empty if the protocol can't be probed
+    """
+    name = bms_type["bms"]
+    # the drivers scan multiple addresses, all of them are probed
+    if name in ("HeltecModbus", "Seplosv3"):
+        return [
+            fingerprint
+            for (fingerprint_name, _), fingerprint in FINGERPRINTS.items()
+            if fingerprint_name == name
+        ]
+
+    fingerprint = FINGERPRINTS.get((name, bms_type.get("address")))
+    return [fingerprint] if fingerprint is not None else []
+
+
+def read_probe_replies(ser: serial.Serial, data: bytearray, timeout: float) -> None:
+    """
+    Collect the bytes received after a fingerprint request
+
+    Listens for at least `timeout` seconds. If a reply is still arriving then, it's read until the
+    line was quiet for PROBE_QUIET_TIME, so that the next request does not collide with it.
+
+    :param ser: the opened serial port
+    :param data: the buffer the received bytes are appended to
+    :param timeout: the minimum time to listen
+    """
+    deadline = time() + timeout
+    last_data = None
+    while True:
+        now = time()
+        if now >= deadline and (
+            last_data is None or now - last_data >= PROBE_QUIET_TIME
+        ):
+            return
+
+        # block until at least one byte arrived or the timeout is reached
+        ser.timeout = max(deadline - now, PROBE_QUIET_TIME)
+        chunk = ser.read(max(1, ser.in_waiting))
+        if chunk:
+            data.extend(chunk)
+            last_data = time()
+
+
+def probe_port(port: str, bms_types: List[dict]) -> List[dict]:
+    """
+    Send the fingerprint requests of all given BMS types and return the ones that replied
+
+    The requests are sent in one burst for each baud rate. The replies are matched against the
+    signatures of all protocols with the same baud rate at once. Probing stops at the first baud
+    rate that returned a match, since only one BMS type can be connected to a port.
+
+    :param port: the serial port to probe
+    :param bms_types: entries of supported_bms_types to probe for
+    :return: the entries of bms_types that matched, in the order of bms_types
+    """
+    # group the BMS types with a fingerprint by baud rate, keep the configured order
+    bauds: Dict[int, List[dict]] = {}
+    for bms_type in bms_types:
+        if len(get_fingerprints(bms_type)) > 0:
+            bauds.setdefault(bms_type["baud"], []).append(bms_type)
+
+    if len(bauds) == 0:
+        return []
+
+    for baud, candidates in bauds.items():
+        logger.info(
+            f"Probing {port} at {baud} baud for "
+            + ", ".join(sorted(set(candidate["bms"] for candidate in candidates)))
+        )
+        time_start = time()
+
+        # use the shared serial port, so that the drivers don't have to open it again
+        with utils.get_serial_port_lock(port):
+            try:
+                ser = utils.get_serial_port(port, baud)
+                ser.reset_input_buffer()
+
+                # send every request only once, even if it's shared by multiple entries
+                requests = []
+                for candidate in candidates:
+                    for fingerprint in get_fingerprints(candidate):
+                        if fingerprint["request"] not in requests:
+                            requests.append(fingerprint["request"])
+
+                data = bytearray()
+                for request in requests:
+                    ser.write(request)
+                    ser.flush()
+                    read_probe_replies(ser, data, PROBE_FRAME_GAP)
+
+                read_probe_replies(ser, data, PROBE_REPLY_TIMEOUT)
+
+            except serial.SerialException as e:
+                logger.error(e)
+                utils.close_serial_port(port)
+                return []
+
+        matched = [
+            candidate
+            for candidate in candidates
+            if any(
+                fingerprint["reply"].search(data)
+                for fingerprint in get_fingerprints(candidate)
+            )
+        ]
+
+        logger.debug(
+            f"Probe at {baud} baud took {time() - time_start:.3f}s, "
+            + f"received: {utils.bytearray_to_string(data)}"
+        )
+
+        if len(matched) > 0:
+            logger.info(
+                "Probe matched "
+                + ", ".join(
+                    candidate["bms"]
+                    + (
+                        ' at address "'
+                        + utils.bytearray_to_string(candidate["address"])
+                        + '"'
+                        if "address" in candidate
+                        else ""
+                    )
+                    for candidate in matched
+                )
+            )
+            return matched
+
+    logger.info("Probe did not match any BMS")
+    return []
+
+
+def get_port_id(port: str) -> Union[str, None]:
+    """
+    Get an id of the USB adapter behind a serial port
+
+    :param port: the serial port
+    :return: "VID:PID:serial number" or None, if it's not an USB adapter
+    """
+    device = os.path.realpath(port)
+    try:
+        for port_info in list_ports.comports():
+            if port_info.device in (port, device) and port_info.vid is not None:
+                return (
+                    f"{port_info.vid:04X}:{port_info.pid:04X}:"
+                    + f"{port_info.serial_number or ''}"
+                )
+    except Exception as e:
+        logger.debug(f"Could not get the USB id of {port}: {e}")
+
+    return None
+
+
+def read_detection_cache() -> dict:
+    """
+    Read the detection cache file
+
+    :return: the cache entries keyed by port, empty if the file does not exist or is invalid
+    """
+    try:
+        with open(PATH_DETECTION_CACHE, "r") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read detection cache: {e}")
+        return {}
+
+
+def get_cached_bms_type(port: str, bms_types: List[dict]) -> Union[dict, None]:
+    """
+    Get the BMS type that was found on this port the last time
+
+    The entry is only used, if the same USB adapter is still connected to the port.
+
+    :param port: the serial port
+    :param bms_types: entries of supported_bms_types that are allowed
+    :return: the matching entry of bms_types or None
+    """
+    entry = read_detection_cache().get(port)
+    if not isinstance(entry, dict):
+        return None
+
+    if entry.get("id") != get_port_id(port):
+        logger.info(f"Detection cache of {port} ignored, since the adapter changed")
+        return None
+
+    address = (
+        bytes.fromhex(entry["address"]) if entry.get("address") is not None else None
+    )
+    for bms_type in bms_types:
+        if (
+            bms_type["bms"] == entry.get("bms")
+            and bms_type["baud"] == entry.get("baud")
+            and bms_type.get("address") == address
+        ):
+            logger.info(f"Found {entry['bms']} in detection cache of {port}")
+            return bms_type
+
+    return None
+
+
+def set_cached_bms_type(port: str, bms_type: dict) -> None:
+    """
+    Store the BMS type found on this port in the detection cache
+
+    The file is only written, if the entry changed, to save flash write cycles.
+
+    :param port: the serial port
+    :param bms_type: the entry of supported_bms_types that was found
+    """
+    cache = read_detection_cache()
+    entry = {
+        "id": get_port_id(port),
+        "bms": bms_type["bms"],
+        "baud": bms_type["baud"],
+        "address": (
+            bms_type["address"].hex() if bms_type.get("address") is not None else None
+        ),
+    }
+    if cache.get(port) == entry:
+        return
+
+    cache[port] = entry
+    try:
+        # write to a temporary file first, so that a power loss can't corrupt the cache
+        with open(PATH_DETECTION_CACHE + ".tmp", "w") as f:
+            json.dump(cache, f, indent=4)
+        os.replace(PATH_DETECTION_CACHE + ".tmp", PATH_DETECTION_CACHE)
+    except OSError as e:
+        logger.warning(f"Could not write detection cache: {e}")
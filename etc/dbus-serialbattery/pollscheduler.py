@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+import threading
+import traceback
+from time import monotonic
+from typing import Callable, List, Union
+
+from gi.repository import GLib as gobject
+
+from battery import Battery, Protection
+from dbushelper import DbusHelper, PollSample
+from utils import logger
+import utils
+
+
+class AdaptivePollInterval:
+    """
+    Calculates the poll interval from the activity of the battery.
+
+    The minimum interval is used as soon as the battery is active, while it's idle the
+    interval is increased step by step up to the maximum interval.
+    """
+
+    CURRENT_RATE_ACTIVE = 1.0
+    """
+    Change of the current in A/s, above which the battery is active
+    """
+    CELL_VOLTAGE_RATE_ACTIVE = 0.002
+    """
+    Change of the min or max cell voltage in V/s, above which the battery is active
+    """
+    CELL_VOLTAGE_MARGIN = 0.05
+    """
+    Distance to MIN_CELL_VOLTAGE and MAX_CELL_VOLTAGE in V, below which the battery is
+    active while discharging or charging
+    """
+    INTERVAL_INCREASE = 1.25
+    """
+    Factor by which the interval is increased on every poll while the battery is idle
+    """
+
+    def __init__(self, interval_min: float, interval_max: float):
+        """
+        :param interval_min: minimum poll interval in milliseconds
+        :param interval_max: maximum poll interval in milliseconds
+        """
+        self.interval_min = interval_min
+        self.interval_max = max(interval_max, interval_min)
+        self.interval = interval_min
+        self.last_time = None
+        self.last_current = None
+        self.last_min_cell_voltage = None
+        self.last_max_cell_voltage = None
+        self.last_charge_mode = None
+
+    def update(self, battery: Battery, result: bool, now: float) -> float:
+        """
+        Calculate the next poll interval from the newest battery data
+
+        :param battery: the battery, with the cell statistics of the newest poll
+        :param result: result of the newest poll, the battery is polled fast, if it failed
+        :param now: monotonic time of the newest poll in seconds
+        :return: the next poll interval in milliseconds
+        """
+        current = battery.get_current()
+        min_cell_voltage = battery.get_min_cell_voltage()
+        max_cell_voltage = battery.get_max_cell_voltage()
+        elapsed = now - self.last_time if self.last_time is not None else 0
+
+        active = (
+            not result
+            or not battery.online
+            or self.is_alarm(battery)
+            or self.is_changing(
+                current, self.last_current, elapsed, self.CURRENT_RATE_ACTIVE
+            )
+            or self.is_changing(
+                min_cell_voltage,
+                self.last_min_cell_voltage,
+                elapsed,
+                self.CELL_VOLTAGE_RATE_ACTIVE,
+            )
+            or self.is_changing(
+                max_cell_voltage,
+                self.last_max_cell_voltage,
+                elapsed,
+                self.CELL_VOLTAGE_RATE_ACTIVE,
+            )
+            or battery.charge_mode != self.last_charge_mode
+            or (battery.charge_mode is not None and "Transition" in battery.charge_mode)
+            or (
+                current is not None
+                and current > 0
+                and max_cell_voltage is not None
+                and max_cell_voltage
+                >= utils.MAX_CELL_VOLTAGE - self.CELL_VOLTAGE_MARGIN
+            )
+            or (
+                current is not None
+                and current < 0
+                and min_cell_voltage is not None
+                and min_cell_voltage
+                <= utils.MIN_CELL_VOLTAGE + self.CELL_VOLTAGE_MARGIN
+            )
+        )
+
+        self.last_time = now
+        self.last_current = current
+        self.last_min_cell_voltage = min_cell_voltage
+        self.last_max_cell_voltage = max_cell_voltage
+        self.last_charge_mode = battery.charge_mode
+
+        if active:
+            self.interval = self.interval_min
+        else:
+            self.interval = min(
+                self.interval * self.INTERVAL_INCREASE, self.interval_max
+            )
+
+        return self.interval
+
+    @staticmethod
+    def is_alarm(battery: Battery) -> bool:
+        """
+        Check if any alarm of the battery is active
+        """
+        return any(
+            value == Protection.ALARM for value in vars(battery.protection).values()
+        )
+
+    @staticmethod
+    def is_changing(
+        value: Union[float, None],
+        last_value: Union[float, None],
+        elapsed: float,
+        rate: float,
+    ) -> bool:
+        """
+        Check if the value changed faster than rate per second since the last poll
+        """
+        if value is None or last_value is None or elapsed <= 0:
+            return False
+        return abs(value - last_value) / elapsed > rate
+
+
+class PollScheduler:
+    """
+    Polls the batteries every poll interval milliseconds.
+
+    If multiple batteries are connected to the same bus, they are polled one after the
+    other. The port lock is held while a battery is polled, so that the requests of the
+    batteries can't interfere.
+
+    If threaded, the BMS communication runs in a separate thread, so that the main loop
+    stays responsive to dbus while waiting for the BMS. The completed poll samples are
+    handed to the main loop, which handles the charge control and publishes the data.
+
+    The battery object is used by the poll thread while refresh_data() is running and
+    by the main loop while the sample is processed. The next poll is started only after
+    all samples were processed, so the poll and the processing never run at the same time.
+    The dbus callbacks of the GUI, e.g. to disable charging, run in the main loop at any
+    time, also while the BMS is polled. They request their values with
+    Battery.set_callback_value() and the poll thread takes them with
+    Battery.take_callback_value(), so that a request is never lost.
+    """
+
+    def __init__(
+        self,
+        helpers: List[DbusHelper],
+        loop,
+        threaded: bool = True,
+        adaptive: bool = False,
+    ):
+        """
+        :param helpers: the DbusHelpers of the batteries, all connected to the same port
+        :param loop: the main loop, which is stopped if a battery failed
+        :param threaded: poll the BMS in a separate thread
+        :param adaptive: adapt the poll interval to the activity of the batteries,
+            else battery.poll_interval is used
+        """
+        self.helpers = helpers
+        self.loop = loop
+        self.poll_interval = helpers[0].battery.poll_interval
+        self.adaptive = None
+        if adaptive:
+            self.adaptive = [
+                AdaptivePollInterval(
+                    (
+                        utils.POLL_INTERVAL_MIN
+                        if utils.POLL_INTERVAL_MIN is not None
+                        else self.poll_interval
+                    ),
+                    utils.POLL_INTERVAL_MAX,
+                )
+                for _ in helpers
+            ]
+            self.poll_interval = self.adaptive[0].interval
+        self.time_poll_start = None
+        self.poll_requested = threading.Event()
+        self.thread = (
+            threading.Thread(
+                target=self.poll_thread,
+                name="poll_" + helpers[0].battery.port,
+                daemon=True,
+            )
+            if threaded
+            else None
+        )
+
+    def start(self) -> None:
+        """
+        Start the poll thread and schedule the first poll
+        """
+        if self.thread is not None:
+            logger.debug("Polling the BMS in a separate thread")
+            self.thread.start()
+        for helper in self.helpers:
+            helper.publish_poll_interval(self.poll_interval)
+        gobject.timeout_add(int(self.poll_interval), self.start_poll)
+
+    def start_poll(self) -> bool:
+        """
+        Start a poll. Runs in the main loop.
+
+        :return: False, the next poll is scheduled when the samples were processed
+        """
+        self.time_poll_start = monotonic()
+
+        if self.thread is not None:
+            self.poll_requested.set()
+        else:
+            self.poll_batteries()
+
+        return False
+
+    def poll_thread(self) -> None:
+        """
+        Poll the batteries each time a poll is requested
+        """
+        while True:
+            self.poll_requested.wait()
+            self.poll_requested.clear()
+
+            if not self.poll_batteries():
+                return
+
+    def poll_batteries(self) -> bool:
+        """
+        Read the BMS one after the other and hand the samples to the main loop
+
+        :return: False, if reading a BMS raised an exception and the main loop is stopped
+        """
+        for index, helper in enumerate(self.helpers):
+            try:
+                with helper.battery.get_serial_port_lock():
+                    sample = helper.refresh_battery()
+            except Exception:
+                traceback.print_exc()
+                self.run_in_main_loop(self.loop.quit)
+                return False
+
+            self.run_in_main_loop(self.process_sample, index, sample)
+
+        self.run_in_main_loop(self.schedule_poll)
+        return True
+
+    def run_in_main_loop(self, callback: Callable, *args) -> None:
+        """
+        Call the callback in the main loop, directly if not threaded
+        """
+        if self.thread is not None:
+            gobject.idle_add(callback, *args)
+        else:
+            callback(*args)
+
+    def process_sample(self, index: int, sample: PollSample) -> bool:
+        """
+        Process the sample of a battery. Runs in the main loop.
+
+        :param index: index of the battery in the helpers
+        :param sample: the poll sample read from the BMS
+        :return: False, to run only once
+        """
+        helper = self.helpers[index]
+        helper.process_battery(self.loop, sample)
+
+        if self.adaptive is not None:
+            self.adaptive[index].update(
+                helper.battery, sample.result, self.time_poll_start
+            )
+
+        return False
+
+    def schedule_poll(self) -> bool:
+        """
+        Schedule the next poll, after all samples were processed. Runs in the main loop.
+
+        :return: False, to run only once
+        """
+        if self.adaptive is not None:
+            # the batteries are polled together, use the interval of the most active one
+            poll_interval = min(adaptive.interval for adaptive in self.adaptive)
+            if poll_interval != self.poll_interval:
+                logger.debug(f"Poll interval changed to {poll_interval:.0f} ms")
+                self.poll_interval = poll_interval
+                for helper in self.helpers:
+                    helper.publish_poll_interval(poll_interval)
+
+        # keep the interval from poll start to poll start like gobject.timeout_add()
+        time_elapsed = (monotonic() - self.time_poll_start) * 1000
+        gobject.timeout_add(
+            max(int(self.poll_interval - time_elapsed), 0),
+            self.start_poll,
+        )
+        return False
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Capture and replay of the serial traffic between the driver and the BMS
+
+With SERIAL_CAPTURE enabled the shared serial ports record every request and reply to
+"capture_<port>.bin" next to this file. The file can then be replayed without hardware
+by using the port "replay:<path to the file>", e.g. to reproduce a problem or to test a driver:
+
+    battery = Daly("replay:/tmp/capture_ttyUSB0.bin", 9600, b"\\x40")
+    battery.test_connection() and battery.refresh_data()
+
+Every request is answered with the recorded reply of the same request. The requests are
+searched from the last replayed one, so a capture of multiple polls is replayed in order
+and starts over at the end.
+
+File format: CAPTURE_MAGIC followed by records of a CAPTURE_RECORD header
+(timestamp in seconds, direction, length) and the frame bytes.
+
+Run "python serialcapture.py <file>" to print a capture.
+"""
+import logging
+import os
+import struct
+import sys
+import threading
+from time import sleep, time
+from typing import List, Tuple
+
+import serial
+
+logger = logging.getLogger("SerialBattery")
+
+CAPTURE_MAGIC = b"DSBCAP1\n"
+CAPTURE_RECORD = struct.Struct("<dBI")
+
+DIRECTION_REQUEST = 0
+DIRECTION_REPLY = 1
+
+REPLAY_PREFIX = "replay:"
+
+
+def get_capture_path(port: str) -> str:
+    """
+    Get the path of the capture file of a port
+
+    :param port: the serial port
+    :return: the path of the capture file
+    """
+    return os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "capture_" + port[port.rfind("/") + 1 :] + ".bin",
+    )
+
+
+class CaptureWriter:
+    """
+    Appends the frames to a capture file. Consecutive reads are merged into one reply.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new_file:
+            self.file.write(CAPTURE_MAGIC)
+        self.reply = bytearray()
+        self.reply_time = None
+
+    def add_request(self, data: bytes) -> None:
+        with self.lock:
+            self.write_reply()
+            self.write_record(time(), DIRECTION_REQUEST, data)
+
+    def add_reply(self, data: bytes) -> None:
+        if len(data) == 0:
+            return
+        with self.lock:
+            if self.reply_time is None:
+                self.reply_time = time()
+            self.reply += data
+
+    def write_reply(self) -> None:
+        if self.reply_time is not None:
+            self.write_record(self.reply_time, DIRECTION_REPLY, self.reply)
+            self.reply = bytearray()
+            self.reply_time = None
+
+    def write_record(self, timestamp: float, direction: int, data: bytes) -> None:
+        self.file.write(CAPTURE_RECORD.pack(timestamp, direction, len(data)))
+        self.file.write(data)
+        self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.write_reply()
+            self.file.close()
+
+
+def read_capture(path: str) -> List[Tuple[float, int, bytes]]:
+    """
+    Read the frames of a capture file
+
+    :param path: the capture file
+    :return: list of (timestamp, direction, data)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not data.startswith(CAPTURE_MAGIC):
+        raise ValueError(path + " is not a serial capture file")
+
+    frames = []
+    offset = len(CAPTURE_MAGIC)
+    while offset + CAPTURE_RECORD.size <= len(data):
+        timestamp, direction, length = CAPTURE_RECORD.unpack_from(data, offset)
+        offset += CAPTURE_RECORD.size
+        frames.append((timestamp, direction, bytes(data[offset : offset + length])))
+        offset += length
+
+    return frames
+
+
+class RecordingSerial(serial.Serial):
+    """
+    Serial port, which records all written and read bytes to a capture file
+    """
+
+    def __init__(self, *args, capture: CaptureWriter, **kwargs):
+        self.capture = capture
+        super(RecordingSerial, self).__init__(*args, **kwargs)
+
+    def write(self, data) -> int:
+        self.capture.add_request(bytes(data))
+        return super(RecordingSerial, self).write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data = super(RecordingSerial, self).read(size)
+        self.capture.add_reply(data)
+        return data
+
+    def close(self) -> None:
+        super(RecordingSerial, self).close()
+        self.capture.close()
+
+
+class ReplaySerial(serial.SerialBase):
+    """
+    Serial port, which answers the requests with the replies of a capture file.
+    The port is "replay:<path to the capture file>".
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.exchanges: List[Tuple[bytes, bytes]] = []
+        self.position = 0
+        self.buffer = bytearray()
+        super(ReplaySerial, self).__init__(*args, **kwargs)
+
+    def open(self) -> None:
+        if self._port is None:
+            raise serial.SerialException(
+                "Port must be configured before it can be used"
+            )
+        if self.is_open:
+            raise serial.SerialException("Port is already open")
+
+        path = self._port[len(REPLAY_PREFIX) :]
+        try:
+            frames = read_capture(path)
+        except (OSError, ValueError) as e:
+            raise serial.SerialException(f"Could not open replay {path}: {e}")
+
+        # pair each request with the reply following it
+        self.exchanges = []
+        for index, (_, direction, data) in enumerate(frames):
+            if direction != DIRECTION_REQUEST:
+                continue
+            reply = b""
+            if index + 1 < len(frames) and frames[index + 1][1] == DIRECTION_REPLY:
+                reply = frames[index + 1][2]
+            self.exchanges.append((data, reply))
+
+        logger.debug(f"Replaying {len(self.exchanges)} requests from {path}")
+        self.position = 0
+        self.buffer = bytearray()
+        self.is_open = True
+
+    def close(self) -> None:
+        self.is_open = False
+
+    def _reconfigure_port(self) -> None:
+        pass
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.buffer)
+
+    def write(self, data) -> int:
+        if not self.is_open:
+            raise serial.SerialException("Port not open")
+        data = bytes(data)
+        count = len(self.exchanges)
+        # search from the last replayed request and start over at the end
+        for offset in range(count):
+            index = (self.position + offset) % count
+            if self.exchanges[index][0] == data:
+                self.buffer += self.exchanges[index][1]
+                self.position = index + 1
+                break
+        else:
+            logger.debug(f"No reply recorded for request {data.hex(' ')}")
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        if not self.is_open:
+            raise serial.SerialException("Port not open")
+        if len(self.buffer) == 0:
+            # like a real port, wait for the timeout, if there is no reply
+            if self._timeout:
+                sleep(self._timeout)
+            return b""
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def reset_input_buffer(self) -> None:
+        self.buffer.clear()
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+def create_serial_port(port: str, capture: bool = False, **kwargs) -> serial.SerialBase:
+    """
+    Open a serial port, a replay of a capture file or a port recording a capture file
+
+    :param port: the serial port or "replay:<path to the capture file>"
+    :param capture: record the traffic to the capture file of the port
+    :param kwargs: the settings passed to serial.Serial
+    :return: the opened port
+    """
+    if port.startswith(REPLAY_PREFIX):
+        return ReplaySerial(port, **kwargs)
+    if capture:
+        path = get_capture_path(port)
+        logger.info(f"Recording the serial traffic of {port} to {path}")
+        return RecordingSerial(port, capture=CaptureWriter(path), **kwargs)
+    return serial.Serial(port, **kwargs)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python serialcapture.py <capture file>")
+        sys.exit(1)
+
+    frames = read_capture(sys.argv[1])
+    start = frames[0][0] if len(frames) > 0 else 0
+    for timestamp, direction, data in frames:
+        print(
+            f"{timestamp - start:10.3f} "
+            + (">>" if direction == DIRECTION_REQUEST else "<<")
+            + " "
+            + data.hex(" ")
+        )
@@ -0,0 +1,980 @@
+# -*- coding: utf-8 -*-
+"""
+Config values of the driver
+
+Parses config.default.ini and config.ini into a typed Config and checks it for the most common
+misconfigurations. utils.load_config() caches the Config and copies the values to utils.
+Use them from there, e.g. utils.MAX_CELL_VOLTAGE.
+
+This module must not import utils, since utils imports it.
+"""
+
+import bisect
+import configparser
+from typing import Any, Callable, List, NamedTuple, Tuple, Union
+
+
+class PiecewiseCurve:
+    """
+    Relationship between two config lists, e.g. CELL_VOLTAGES_WHILE_CHARGING and MAX_CHARGE_CURRENT_CV.
+
+    The points are validated, sorted and the slopes are calculated once, when the config is loaded.
+    A lookup only bisects the points and returns the same values as calcLinearRelationship()
+    and calcStepRelationship().
+    """
+
+    def __init__(
+        self,
+        in_name: str,
+        in_values: List[float],
+        out_name: str,
+        out_values: List[float],
+    ):
+        """
+        :param in_name: name of the input list, used in the error messages
+        :param in_values: input values, sorted ascending or descending
+        :param out_name: name of the output list, used in the error messages
+        :param out_values: output values for each input value
+        :raises ValueError: if the lists are empty, have a different length or the input values are not sorted
+        """
+        if len(in_values) == 0 or len(in_values) != len(out_values):
+            raise ValueError(
+                f"{in_name} ({len(in_values)} values) and {out_name} ({len(out_values)} values) "
+                + "need to have the same number of values"
+            )
+
+        # change compare-direction
+        if in_values[0] > in_values[-1]:
+            in_sorted = in_values[::-1]
+            out_values = out_values[::-1]
+        else:
+            in_sorted = in_values
+
+        for idx in range(1, len(in_sorted)):
+            if in_sorted[idx] < in_sorted[idx - 1]:
+                raise ValueError(
+                    f"{in_name} ({', '.join(map(str, in_values))}) needs to be sorted ascending or descending"
+                )
+
+        self.in_values = tuple(in_sorted)
+        self.out_values = tuple(out_values)
+        self.in_min = self.in_values[0]
+        self.in_max = self.in_values[-1]
+
+        # slope and output range of the segment ending at each index,
+        # since bisect returns the index of the upper point
+        slopes = [0.0]
+        out_min = [self.out_values[0]]
+        out_max = [self.out_values[0]]
+        for idx in range(1, len(self.in_values)):
+            width = self.in_values[idx] - self.in_values[idx - 1]
+            slopes.append(
+                (self.out_values[idx] - self.out_values[idx - 1]) / width
+                if width != 0
+                else 0.0
+            )
+            out_min.append(min(self.out_values[idx], self.out_values[idx - 1]))
+            out_max.append(max(self.out_values[idx], self.out_values[idx - 1]))
+        self.slopes = tuple(slopes)
+        self.out_min = tuple(out_min)
+        self.out_max = tuple(out_max)
+
+    def linear(self, value: float) -> float:
+        """
+        Interpolate linear between the points
+
+        :param value: the input value
+        :return: the output value, the first or last output value if the input is out of bounds
+        """
+        # handle out of bounds
+        if value <= self.in_min:
+            return self.out_values[0]
+        if value >= self.in_max:
+            return self.out_values[-1]
+
+        idx = bisect.bisect(self.in_values, value)
+        result = self.out_values[idx] + (value - self.in_values[idx]) * self.slopes[idx]
+        return min(self.out_max[idx], max(self.out_min[idx], result))
+
+    def step(self, value: float, return_lower: bool) -> float:
+        """
+        Get the output value of the step the input value is in
+
+        :param value: the input value
+        :param return_lower: return the output value of the upper (True) or lower (False) input value of the step
+        :return: the output value, the first or last output value if the input is out of bounds
+        """
+        # handle out of bounds
+        if value <= self.in_min:
+            return self.out_values[0]
+        if value >= self.in_max:
+            return self.out_values[-1]
+
+        idx = bisect.bisect(self.in_values, value)
+        return self.out_values[idx] if return_lower else self.out_values[idx - 1]
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, PiecewiseCurve)
+            and self.in_values == other.in_values
+            and self.out_values == other.out_values
+        )
+
+
+class ConfigIssue(NamedTuple):
+    """
+    Issue found while checking the config values
+    """
+
+    option: str
+    """
+    Name of the config option that caused the issue
+    """
+    message: str
+    """
+    Description of the issue and how it was handled
+    """
+
+
+class Config(NamedTuple):
+    """
+    Typed values of the config files
+    """
+
+    LOGGING: str
+    """
+    Logging level: ERROR, WARNING, DEBUG or INFO
+    """
+
+    # --------- Battery Current limits ---------
+    MAX_BATTERY_CHARGE_CURRENT: float
+    """
+    Defines the maximum charge current that the battery can accept.
+    """
+    MAX_BATTERY_DISCHARGE_CURRENT: float
+    """
+    Defines the maximum discharge current that the battery can deliver.
+    """
+
+    # --------- Cell Voltages ---------
+    MIN_CELL_VOLTAGE: float
+    """
+    Defines the minimum cell voltage that the battery can have.
+    Used for:
+    - Limit CVL range
+    - SoC calculation (if enabled)
+    """
+    MAX_CELL_VOLTAGE: float
+    """
+    Defines the maximum cell voltage that the battery can have.
+    Used for:
+    - Limit CVL range
+    - SoC calculation (if enabled)
+    """
+    FLOAT_CELL_VOLTAGE: float
+    """
+    Defines the cell voltage that the battery should have when it is fully charged.
+    """
+    SOC_RESET_VOLTAGE: float
+    SOC_RESET_AFTER_DAYS: Union[int, bool]
+
+    # --------- BMS disconnect behaviour ---------
+    BLOCK_ON_DISCONNECT: bool
+
+    # --------- Charge mode ---------
+    LINEAR_LIMITATION_ENABLE: bool
+    LINEAR_RECALCULATION_EVERY: int
+    LINEAR_RECALCULATION_ON_PERC_CHANGE: int
+
+    # --------- External current sensor ---------
+    EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE: Union[str, None]
+    EXTERNAL_CURRENT_SENSOR_DBUS_PATH: Union[str, None]
+
+    # --------- Charge Voltage limitation (affecting CVL) ---------
+    CVCM_ENABLE: bool
+    """
+    Charge voltage control management
+
+    Limits max charging voltage (CVL). Switch from max to float voltage and back.
+    """
+    CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL: float
+    CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART: float
+    CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT: float
+    MAX_VOLTAGE_TIME_SEC: int
+    SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT: int
+    CCCM_CV_ENABLE: bool
+    """
+    Charge current control management referring to cell-voltage
+    """
+    DCCM_CV_ENABLE: bool
+    """
+    Discharge current control management referring to cell-voltage
+    """
+    CELL_VOLTAGES_WHILE_CHARGING: List[float]
+    MAX_CHARGE_CURRENT_CV: List[float]
+    MAX_CHARGE_CURRENT_CV_CURVE: PiecewiseCurve
+    CELL_VOLTAGES_WHILE_DISCHARGING: List[float]
+    MAX_DISCHARGE_CURRENT_CV: List[float]
+    MAX_DISCHARGE_CURRENT_CV_CURVE: PiecewiseCurve
+
+    # --------- Cell Voltage limitation (affecting CVL) ---------
+    CVL_ICONTROLLER_MODE: bool
+    CVL_ICONTROLLER_FACTOR: float
+
+    # --------- Temperature limitation (affecting CCL/DCL) ---------
+    CCCM_T_ENABLE: bool
+    """
+    Charge current control management referring to temperature
+    """
+    DCCM_T_ENABLE: bool
+    """
+    Discharge current control management referring to temperature
+    """
+    TEMPERATURES_WHILE_CHARGING: List[float]
+    MAX_CHARGE_CURRENT_T: List[float]
+    MAX_CHARGE_CURRENT_T_CURVE: PiecewiseCurve
+    TEMPERATURES_WHILE_DISCHARGING: List[float]
+    MAX_DISCHARGE_CURRENT_T: List[float]
+    MAX_DISCHARGE_CURRENT_T_CURVE: PiecewiseCurve
+
+    # --------- SOC limitation (affecting CCL/DCL) ---------
+    CCCM_SOC_ENABLE: bool
+    """
+    Charge current control management referring to SoC
+    """
+    DCCM_SOC_ENABLE: bool
+    """
+    Discharge current control management referring to SoC
+    """
+    SOC_WHILE_CHARGING: List[float]
+    MAX_CHARGE_CURRENT_SOC: List[float]
+    MAX_CHARGE_CURRENT_SOC_CURVE: PiecewiseCurve
+    SOC_WHILE_DISCHARGING: List[float]
+    MAX_DISCHARGE_CURRENT_SOC: List[float]
+    MAX_DISCHARGE_CURRENT_SOC_CURVE: PiecewiseCurve
+
+    # --------- Time-To-Go ---------
+    TIME_TO_GO_ENABLE: bool
+
+    # --------- Time-To-Soc ---------
+    TIME_TO_SOC_POINTS: List[int]
+    TIME_TO_SOC_VALUE_TYPE: int
+    TIME_TO_SOC_RECALCULATE_EVERY: int
+    TIME_TO_SOC_INC_FROM: bool
+
+    # --------- SOC calculation ---------
+    SOC_CALCULATION: bool
+    SOC_RESET_CURRENT: float
+    SOC_RESET_TIME: int
+    SOC_CALC_CURRENT_REPORTED_BY_BMS: List[float]
+    SOC_CALC_CURRENT_MEASURED_BY_USER: List[float]
+    SOC_CALC_CURRENT: bool
+    SOC_CALC_CURRENT_CURVE: Union[PiecewiseCurve, None]
+
+    # --------- Additional settings ---------
+    BMS_TYPE: List[str]
+    EXCLUDED_DEVICES: List[str]
+
+    # Poll multiple BMS connected to the same RS485 bus with one driver
+    BUS_ADDRESSES: List[bytes]
+
+    # Combine the BMS found on BUS_ADDRESSES to one battery on dbus
+    BUS_AGGREGATE: bool
+    POLL_INTERVAL: Union[float, None]
+    """
+    Poll interval in milliseconds
+    """
+
+    # Poll the BMS in a separate thread
+    POLL_IN_THREAD: bool
+
+    # Adapt the poll interval to the activity of the battery
+    POLL_INTERVAL_ADAPTIVE: bool
+    POLL_INTERVAL_MIN: Union[float, None]
+    """
+    Minimum poll interval in milliseconds
+    """
+    POLL_INTERVAL_MAX: float
+    """
+    Maximum poll interval in milliseconds
+    """
+
+    # Read the data, which changes slowly, less often than the telemetry
+    REFRESH_PERIOD_MEDIUM: float
+    """
+    Period in seconds to read the temperatures, balancing, FET states and alarms
+    """
+    REFRESH_PERIOD_SLOW: float
+    """
+    Period in seconds to read the capacity, cycles, identity and settings of the BMS
+    """
+
+    # Auto reset SoC
+    AUTO_RESET_SOC: bool
+
+    # Publish the config settings to the dbus path "/Info/Config/"
+    PUBLISH_CONFIG_VALUES: bool
+
+    # Record the serial traffic to "capture_<port>.bin"
+    SERIAL_CAPTURE: bool
+
+    # Reload the config.ini while the driver is running
+    CONFIG_RELOAD: bool
+
+    # Publish the duration of the poll stages to the dbus path "/Diagnostics/Timing/"
+    PUBLISH_TIMING_STATISTICS: bool
+    BATTERY_CELL_DATA_FORMAT: int
+    MIDPOINT_ENABLE: bool
+    TEMP_BATTERY: int
+    TEMP_1_NAME: str
+    TEMP_2_NAME: str
+    TEMP_3_NAME: str
+    TEMP_4_NAME: str
+    GUI_PARAMETERS_SHOW_ADDITIONAL_INFO: bool
+
+    # --------- BMS specific settings ---------
+    # -- Unique ID settings
+    USE_PORT_AS_UNIQUE_ID: bool
+
+    # -- LltJbd settings
+    SOC_LOW_WARNING: float
+    SOC_LOW_ALARM: float
+
+    # -- Daly settings
+    BATTERY_CAPACITY: float
+    INVERT_CURRENT_MEASUREMENT: int
+
+    # -- JK BMS settings
+    JKBMS_CAN_CELL_COUNT: int
+
+    # -- ESC GreenMeter and Lipro device settings
+    GREENMETER_ADDRESS: int
+    LIPRO_START_ADDRESS: int
+    LIPRO_END_ADDRESS: int
+    LIPRO_CELL_COUNT: int
+
+    # -- HeltecModbus device settings
+    HELTEC_MODBUS_ADDR: List[int]
+
+    # -- Seplos V3 settings
+    SEPLOS_USE_BMS_VALUES: bool
+
+    # --------- Voltage drop ---------
+    VOLTAGE_DROP: float
+
+
+def _get_list_from_config(
+    config: configparser.ConfigParser,
+    group: str,
+    option: str,
+    mapper: Callable[[Any], Any] = lambda v: v,
+) -> List[Any]:
+    rawList = config[group][option].split(",")
+    return list(
+        map(
+            mapper,
+            [item.strip() for item in rawList if item != "" and item is not None],
+        )
+    )
+
+
+def _get_curve_from_config(
+    errors: List[ConfigIssue],
+    in_name: str,
+    in_values: List[float],
+    out_name: str,
+    out_values: List[float],
+    default: Union[float, None],
+) -> Union[PiecewiseCurve, None]:
+    """
+    Create the curve of two config lists and add an error to errors, if they are invalid
+
+    :param default: value the curve returns for all input values, if the lists are invalid.
+        If None, None is returned instead of a curve
+    """
+    try:
+        return PiecewiseCurve(in_name, in_values, out_name, out_values)
+    except ValueError as error:
+        errors.append(ConfigIssue(in_name, f"{error}. Please check the configuration."))
+        if default is None:
+            return None
+        return PiecewiseCurve(in_name, [0], out_name, [default])
+
+
+def parse_config(file_paths: List[str]) -> Tuple[Config, List[ConfigIssue]]:
+    """
+    Parse the config files into typed values and check them
+
+    :param file_paths: the config files, later files override the values of earlier ones
+    :return: the config values and the issues found while checking them
+    """
+    config = configparser.ConfigParser()
+    config.read(file_paths)
+
+    # list to store config errors
+    errors: List[ConfigIssue] = []
+
+    LOGGING = config["DEFAULT"]["LOGGING"].upper()
+
+    # --------- Battery Current limits ---------
+    MAX_BATTERY_CHARGE_CURRENT = float(config["DEFAULT"]["MAX_BATTERY_CHARGE_CURRENT"])
+    MAX_BATTERY_DISCHARGE_CURRENT = float(
+        config["DEFAULT"]["MAX_BATTERY_DISCHARGE_CURRENT"]
+    )
+
+    # --------- Cell Voltages ---------
+    MIN_CELL_VOLTAGE = float(config["DEFAULT"]["MIN_CELL_VOLTAGE"])
+    MAX_CELL_VOLTAGE = float(config["DEFAULT"]["MAX_CELL_VOLTAGE"])
+
+    FLOAT_CELL_VOLTAGE = float(config["DEFAULT"]["FLOAT_CELL_VOLTAGE"])
+    # make some checks for most common missconfigurations
+    if FLOAT_CELL_VOLTAGE > MAX_CELL_VOLTAGE:
+        errors.append(
+            ConfigIssue(
+                "FLOAT_CELL_VOLTAGE",
+                f"FLOAT_CELL_VOLTAGE ({FLOAT_CELL_VOLTAGE} V) is greater than MAX_CELL_VOLTAGE ({MAX_CELL_VOLTAGE} V). "
+                + "To ensure that the driver still works correctly, FLOAT_CELL_VOLTAGE was set to MAX_CELL_VOLTAGE. Please check the configuration.",
+            )
+        )
+        FLOAT_CELL_VOLTAGE = MAX_CELL_VOLTAGE
+    # make some checks for most common missconfigurations
+    if FLOAT_CELL_VOLTAGE < MIN_CELL_VOLTAGE:
+        errors.append(
+            ConfigIssue(
+                "FLOAT_CELL_VOLTAGE",
+                f"FLOAT_CELL_VOLTAGE ({FLOAT_CELL_VOLTAGE} V) is less than MIN_CELL_VOLTAGE ({MIN_CELL_VOLTAGE} V). "
+                + "To ensure that the driver still works correctly, FLOAT_CELL_VOLTAGE was set to MIN_CELL_VOLTAGE. Please check the configuration.",
+            )
+        )
+        FLOAT_CELL_VOLTAGE = MIN_CELL_VOLTAGE
+
+    SOC_RESET_VOLTAGE = float(config["DEFAULT"]["SOC_RESET_VOLTAGE"])
+    # make some checks for most common missconfigurations
+    if SOC_RESET_VOLTAGE < MAX_CELL_VOLTAGE:
+        errors.append(
+            ConfigIssue(
+                "SOC_RESET_VOLTAGE",
+                f"SOC_RESET_VOLTAGE ({SOC_RESET_VOLTAGE} V) is less than MAX_CELL_VOLTAGE ({MAX_CELL_VOLTAGE} V). "
+                + "To ensure that the driver still works correctly, SOC_RESET_VOLTAGE was set to MAX_CELL_VOLTAGE. Please check the configuration.",
+            )
+        )
+        SOC_RESET_VOLTAGE = MAX_CELL_VOLTAGE
+    SOC_RESET_AFTER_DAYS = (
+        int(config["DEFAULT"]["SOC_RESET_AFTER_DAYS"])
+        if config["DEFAULT"]["SOC_RESET_AFTER_DAYS"] != ""
+        else False
+    )
+
+    # --------- BMS disconnect behaviour ---------
+    BLOCK_ON_DISCONNECT = "True" == config["DEFAULT"]["BLOCK_ON_DISCONNECT"]
+
+    # --------- Charge mode ---------
+    LINEAR_LIMITATION_ENABLE = "True" == config["DEFAULT"]["LINEAR_LIMITATION_ENABLE"]
+    LINEAR_RECALCULATION_EVERY = int(config["DEFAULT"]["LINEAR_RECALCULATION_EVERY"])
+    LINEAR_RECALCULATION_ON_PERC_CHANGE = int(
+        config["DEFAULT"]["LINEAR_RECALCULATION_ON_PERC_CHANGE"]
+    )
+
+    # --------- External current sensor ---------
+    EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE = (
+        config["DEFAULT"]["EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE"]
+        if config["DEFAULT"]["EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE"] != ""
+        else None
+    )
+    EXTERNAL_CURRENT_SENSOR_DBUS_PATH = (
+        config["DEFAULT"]["EXTERNAL_CURRENT_SENSOR_DBUS_PATH"]
+        if config["DEFAULT"]["EXTERNAL_CURRENT_SENSOR_DBUS_PATH"] != ""
+        else None
+    )
+
+    # --------- Charge Voltage limitation (affecting CVL) ---------
+    CVCM_ENABLE = "True" == config["DEFAULT"]["CVCM_ENABLE"]
+
+    CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL = float(
+        config["DEFAULT"]["CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL"]
+    )
+    CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART = float(
+        config["DEFAULT"]["CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART"]
+    )
+    CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT = float(
+        config["DEFAULT"]["CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT"]
+    )
+
+    MAX_VOLTAGE_TIME_SEC = int(config["DEFAULT"]["MAX_VOLTAGE_TIME_SEC"])
+    SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT = int(
+        config["DEFAULT"]["SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT"]
+    )
+
+    CCCM_CV_ENABLE = "True" == config["DEFAULT"]["CCCM_CV_ENABLE"]
+
+    DCCM_CV_ENABLE = "True" == config["DEFAULT"]["DCCM_CV_ENABLE"]
+
+    CELL_VOLTAGES_WHILE_CHARGING = _get_list_from_config(
+        config, "DEFAULT", "CELL_VOLTAGES_WHILE_CHARGING", lambda v: float(v)
+    )
+    MAX_CHARGE_CURRENT_CV = _get_list_from_config(
+        config,
+        "DEFAULT",
+        "MAX_CHARGE_CURRENT_CV_FRACTION",
+        lambda v: MAX_BATTERY_CHARGE_CURRENT * float(v),
+    )
+    # make some checks for most common missconfigurations
+    if (
+        CELL_VOLTAGES_WHILE_CHARGING[0] < MAX_CELL_VOLTAGE
+        and MAX_CHARGE_CURRENT_CV[0] == 0
+    ):
+        errors.append(
+            ConfigIssue(
+                "CELL_VOLTAGES_WHILE_CHARGING",
+                f"Maximum value of CELL_VOLTAGES_WHILE_CHARGING ({CELL_VOLTAGES_WHILE_CHARGING[0]} V) "
+                + f"is lower than MAX_CELL_VOLTAGE ({MAX_CELL_VOLTAGE} V). MAX_CELL_VOLTAGE will never be reached this way "
+                + "and battery will not change to float. Please check the configuration.",
+            )
+        )
+    # make some checks for most common missconfigurations
+    if (
+        SOC_RESET_AFTER_DAYS is not False
+        and CELL_VOLTAGES_WHILE_CHARGING[0] < SOC_RESET_VOLTAGE
+        and MAX_CHARGE_CURRENT_CV[0] == 0
+    ):
+        errors.append(
+            ConfigIssue(
+                "CELL_VOLTAGES_WHILE_CHARGING",
+                f"Maximum value of CELL_VOLTAGES_WHILE_CHARGING ({CELL_VOLTAGES_WHILE_CHARGING[0]} V) "
+                + f"is lower than SOC_RESET_VOLTAGE ({SOC_RESET_VOLTAGE} V). SOC_RESET_VOLTAGE will never be reached this way "
+                + "and battery will not change to float. Please check the configuration.",
+            )
+        )
+    # make some checks for most common missconfigurations
+    if MAX_BATTERY_CHARGE_CURRENT not in MAX_CHARGE_CURRENT_CV:
+        errors.append(
+            ConfigIssue(
+                "MAX_CHARGE_CURRENT_CV_FRACTION",
+                f"In MAX_CHARGE_CURRENT_CV_FRACTION ({', '.join(map(str, _get_list_from_config(config, 'DEFAULT', 'MAX_CHARGE_CURRENT_CV_FRACTION', lambda v: float(v))))}) "
+                + "there is no value set to 1. This means that the battery will never use the maximum charge current. Please check the configuration.",
+            )
+        )
+    MAX_CHARGE_CURRENT_CV_CURVE = _get_curve_from_config(
+        errors,
+        "CELL_VOLTAGES_WHILE_CHARGING",
+        CELL_VOLTAGES_WHILE_CHARGING,
+        "MAX_CHARGE_CURRENT_CV_FRACTION",
+        MAX_CHARGE_CURRENT_CV,
+        MAX_BATTERY_CHARGE_CURRENT,
+    )
+
+    CELL_VOLTAGES_WHILE_DISCHARGING = _get_list_from_config(
+        config, "DEFAULT", "CELL_VOLTAGES_WHILE_DISCHARGING", lambda v: float(v)
+    )
+    MAX_DISCHARGE_CURRENT_CV = _get_list_from_config(
+        config,
+        "DEFAULT",
+        "MAX_DISCHARGE_CURRENT_CV_FRACTION",
+        lambda v: MAX_BATTERY_DISCHARGE_CURRENT * float(v),
+    )
+    # make some checks for most common missconfigurations
+    if (
+        CELL_VOLTAGES_WHILE_DISCHARGING[0] > MIN_CELL_VOLTAGE
+        and MAX_DISCHARGE_CURRENT_CV[0] == 0
+    ):
+        errors.append(
+            ConfigIssue(
+                "CELL_VOLTAGES_WHILE_DISCHARGING",
+                f"Minimum value of CELL_VOLTAGES_WHILE_DISCHARGING ({CELL_VOLTAGES_WHILE_DISCHARGING[0]} V) "
+                + f"is higher than MIN_CELL_VOLTAGE ({MIN_CELL_VOLTAGE} V). MIN_CELL_VOLTAGE will never be reached this way. "
+                + "Please check the configuration.",
+            )
+        )
+    # make some checks for most common missconfigurations
+    if MAX_BATTERY_DISCHARGE_CURRENT not in MAX_DISCHARGE_CURRENT_CV:
+        errors.append(
+            ConfigIssue(
+                "MAX_DISCHARGE_CURRENT_CV_FRACTION",
+                f"In MAX_DISCHARGE_CURRENT_CV_FRACTION ({', '.join(map(str, _get_list_from_config(config, 'DEFAULT', 'MAX_DISCHARGE_CURRENT_CV_FRACTION', lambda v: float(v))))}) "
+                + "there is no value set to 1. This means that the battery will never use the maximum discharge current. Please check the configuration.",
+            )
+        )
+    MAX_DISCHARGE_CURRENT_CV_CURVE = _get_curve_from_config(
+        errors,
+        "CELL_VOLTAGES_WHILE_DISCHARGING",
+        CELL_VOLTAGES_WHILE_DISCHARGING,
+        "MAX_DISCHARGE_CURRENT_CV_FRACTION",
+        MAX_DISCHARGE_CURRENT_CV,
+        MAX_BATTERY_DISCHARGE_CURRENT,
+    )
+
+    # --------- Cell Voltage limitation (affecting CVL) ---------
+
+    CVL_ICONTROLLER_MODE = "True" == config["DEFAULT"]["CVL_ICONTROLLER_MODE"]
+    CVL_ICONTROLLER_FACTOR = float(config["DEFAULT"]["CVL_ICONTROLLER_FACTOR"])
+
+    # --------- Temperature limitation (affecting CCL/DCL) ---------
+    CCCM_T_ENABLE = "True" == config["DEFAULT"]["CCCM_T_ENABLE"]
+
+    DCCM_T_ENABLE = "True" == config["DEFAULT"]["DCCM_T_ENABLE"]
+
+    TEMPERATURES_WHILE_CHARGING = _get_list_from_config(
+        config, "DEFAULT", "TEMPERATURES_WHILE_CHARGING", lambda v: float(v)
+    )
+    MAX_CHARGE_CURRENT_T = _get_list_from_config(
+        config,
+        "DEFAULT",
+        "MAX_CHARGE_CURRENT_T_FRACTION",
+        lambda v: MAX_BATTERY_CHARGE_CURRENT * float(v),
+    )
+    # make some checks for most common missconfigurations
+    if MAX_BATTERY_CHARGE_CURRENT not in MAX_CHARGE_CURRENT_T:
+        errors.append(
+            ConfigIssue(
+                "MAX_CHARGE_CURRENT_T_FRACTION",
+                f"In MAX_CHARGE_CURRENT_T_FRACTION ({', '.join(map(str, _get_list_from_config(config, 'DEFAULT', 'MAX_CHARGE_CURRENT_T_FRACTION', lambda v: float(v))))}) "
+                + "there is no value set to 1. This means that the battery will never use the maximum discharge current. Please check the configuration.",
+            )
+        )
+    MAX_CHARGE_CURRENT_T_CURVE = _get_curve_from_config(
+        errors,
+        "TEMPERATURES_WHILE_CHARGING",
+        TEMPERATURES_WHILE_CHARGING,
+        "MAX_CHARGE_CURRENT_T_FRACTION",
+        MAX_CHARGE_CURRENT_T,
+        MAX_BATTERY_CHARGE_CURRENT,
+    )
+
+    TEMPERATURES_WHILE_DISCHARGING = _get_list_from_config(
+        config, "DEFAULT", "TEMPERATURES_WHILE_DISCHARGING", lambda v: float(v)
+    )
+    MAX_DISCHARGE_CURRENT_T = _get_list_from_config(
+        config,
+        "DEFAULT",
+        "MAX_DISCHARGE_CURRENT_T_FRACTION",
+        lambda v: MAX_BATTERY_DISCHARGE_CURRENT * float(v),
+    )
+    # make some checks for most common missconfigurations
+    if MAX_BATTERY_DISCHARGE_CURRENT not in MAX_DISCHARGE_CURRENT_T:
+        errors.append(
+            ConfigIssue(
+                "MAX_DISCHARGE_CURRENT_T_FRACTION",
+                f"In MAX_DISCHARGE_CURRENT_T_FRACTION ({', '.join(map(str, _get_list_from_config(config, 'DEFAULT', 'MAX_DISCHARGE_CURRENT_T_FRACTION', lambda v: float(v))))}) "
+                + "there is no value set to 1. This means that the battery will never use the maximum discharge current. Please check the configuration.",
+            )
+        )
+    MAX_DISCHARGE_CURRENT_T_CURVE = _get_curve_from_config(
+        errors,
+        "TEMPERATURES_WHILE_DISCHARGING",
+        TEMPERATURES_WHILE_DISCHARGING,
+        "MAX_DISCHARGE_CURRENT_T_FRACTION",
+        MAX_DISCHARGE_CURRENT_T,
+        MAX_BATTERY_DISCHARGE_CURRENT,
+    )
+
+    # --------- SOC limitation (affecting CCL/DCL) ---------
+    CCCM_SOC_ENABLE = "True" == config["DEFAULT"]["CCCM_SOC_ENABLE"]
+
+    DCCM_SOC_ENABLE = "True" == config["DEFAULT"]["DCCM_SOC_ENABLE"]
+
+    SOC_WHILE_CHARGING = _get_list_from_config(
+        config, "DEFAULT", "SOC_WHILE_CHARGING", lambda v: float(v)
+    )
+    MAX_CHARGE_CURRENT_SOC = _get_list_from_config(
+        config,
+        "DEFAULT",
+        "MAX_CHARGE_CURRENT_SOC_FRACTION",
+        lambda v: MAX_BATTERY_CHARGE_CURRENT * float(v),
+    )
+    # make some checks for most common missconfigurations
+    if MAX_BATTERY_CHARGE_CURRENT not in MAX_CHARGE_CURRENT_SOC:
+        errors.append(
+            ConfigIssue(
+                "MAX_CHARGE_CURRENT_SOC_FRACTION",
+                f"In MAX_CHARGE_CURRENT_SOC_FRACTION ({', '.join(map(str, _get_list_from_config(config, 'DEFAULT', 'MAX_CHARGE_CURRENT_SOC_FRACTION', lambda v: float(v))))}) "
+                + "there is no value set to 1. This means that the battery will never use the maximum charge current. Please check the configuration.",
+            )
+        )
+    MAX_CHARGE_CURRENT_SOC_CURVE = _get_curve_from_config(
+        errors,
+        "SOC_WHILE_CHARGING",
+        SOC_WHILE_CHARGING,
+        "MAX_CHARGE_CURRENT_SOC_FRACTION",
+        MAX_CHARGE_CURRENT_SOC,
+        MAX_BATTERY_CHARGE_CURRENT,
+    )
+
+    SOC_WHILE_DISCHARGING = _get_list_from_config(
+        config, "DEFAULT", "SOC_WHILE_DISCHARGING", lambda v: float(v)
+    )
+    MAX_DISCHARGE_CURRENT_SOC = _get_list_from_config(
+        config,
+        "DEFAULT",
+        "MAX_DISCHARGE_CURRENT_SOC_FRACTION",
+        lambda v: MAX_BATTERY_DISCHARGE_CURRENT * float(v),
+    )
+    # make some checks for most common missconfigurations
+    if MAX_BATTERY_DISCHARGE_CURRENT not in MAX_DISCHARGE_CURRENT_SOC:
+        errors.append(
+            ConfigIssue(
+                "MAX_DISCHARGE_CURRENT_SOC_FRACTION",
+                f"In MAX_DISCHARGE_CURRENT_SOC_FRACTION ({', '.join(map(str, _get_list_from_config(config, 'DEFAULT', 'MAX_DISCHARGE_CURRENT_SOC_FRACTION', lambda v: float(v))))}) "
+                + "there is no value set to 1. This means that the battery will never use the maximum discharge current. Please check the configuration.",
+            )
+        )
+    MAX_DISCHARGE_CURRENT_SOC_CURVE = _get_curve_from_config(
+        errors,
+        "SOC_WHILE_DISCHARGING",
+        SOC_WHILE_DISCHARGING,
+        "MAX_DISCHARGE_CURRENT_SOC_FRACTION",
+        MAX_DISCHARGE_CURRENT_SOC,
+        MAX_BATTERY_DISCHARGE_CURRENT,
+    )
+
+    # --------- Time-To-Go ---------
+    TIME_TO_GO_ENABLE = "True" == config["DEFAULT"]["TIME_TO_GO_ENABLE"]
+
+    # --------- Time-To-Soc ---------
+    TIME_TO_SOC_POINTS = _get_list_from_config(
+        config, "DEFAULT", "TIME_TO_SOC_POINTS", lambda v: int(v)
+    )
+    TIME_TO_SOC_VALUE_TYPE = int(config["DEFAULT"]["TIME_TO_SOC_VALUE_TYPE"])
+    TIME_TO_SOC_RECALCULATE_EVERY = (
+        int(config["DEFAULT"]["TIME_TO_SOC_RECALCULATE_EVERY"])
+        if int(config["DEFAULT"]["TIME_TO_SOC_RECALCULATE_EVERY"]) > 5
+        else 5
+    )
+    TIME_TO_SOC_INC_FROM = "True" == config["DEFAULT"]["TIME_TO_SOC_INC_FROM"]
+
+    # --------- SOC calculation ---------
+    SOC_CALCULATION = "True" == config["DEFAULT"]["SOC_CALCULATION"]
+    SOC_RESET_CURRENT = float(config["DEFAULT"]["SOC_RESET_CURRENT"])
+    SOC_RESET_TIME = int(config["DEFAULT"]["SOC_RESET_TIME"])
+    SOC_CALC_CURRENT_REPORTED_BY_BMS = _get_list_from_config(
+        config, "DEFAULT", "SOC_CALC_CURRENT_REPORTED_BY_BMS", lambda v: float(v)
+    )
+    SOC_CALC_CURRENT_MEASURED_BY_USER = _get_list_from_config(
+        config, "DEFAULT", "SOC_CALC_CURRENT_MEASURED_BY_USER", lambda v: float(v)
+    )
+    # check if lists are different
+    # this allows to calculate linear relationship between the two lists only if needed
+    if SOC_CALC_CURRENT_REPORTED_BY_BMS == SOC_CALC_CURRENT_MEASURED_BY_USER:
+        SOC_CALC_CURRENT = False
+        SOC_CALC_CURRENT_CURVE = None
+    else:
+        # use the current as it is, if the lists are invalid
+        SOC_CALC_CURRENT_CURVE = _get_curve_from_config(
+            errors,
+            "SOC_CALC_CURRENT_REPORTED_BY_BMS",
+            SOC_CALC_CURRENT_REPORTED_BY_BMS,
+            "SOC_CALC_CURRENT_MEASURED_BY_USER",
+            SOC_CALC_CURRENT_MEASURED_BY_USER,
+            None,
+        )
+        SOC_CALC_CURRENT = SOC_CALC_CURRENT_CURVE is not None
+
+    # --------- Additional settings ---------
+    BMS_TYPE = _get_list_from_config(config, "DEFAULT", "BMS_TYPE", lambda v: str(v))
+
+    EXCLUDED_DEVICES = _get_list_from_config(
+        config, "DEFAULT", "EXCLUDED_DEVICES", lambda v: str(v)
+    )
+
+    # Poll multiple BMS connected to the same RS485 bus with one driver
+    BUS_ADDRESSES = _get_list_from_config(
+        config, "DEFAULT", "BUS_ADDRESSES", lambda v: bytes([int(v, 0)])
+    )
+
+    # Combine the BMS found on BUS_ADDRESSES to one battery on dbus
+    BUS_AGGREGATE = "True" == config["DEFAULT"]["BUS_AGGREGATE"]
+
+    POLL_INTERVAL = (
+        float(config["DEFAULT"]["POLL_INTERVAL"]) * 1000
+        if config["DEFAULT"]["POLL_INTERVAL"] != ""
+        else None
+    )
+
+    # Poll the BMS in a separate thread
+    POLL_IN_THREAD = "True" == config["DEFAULT"]["POLL_IN_THREAD"]
+
+    # Adapt the poll interval to the activity of the battery
+    POLL_INTERVAL_ADAPTIVE = "True" == config["DEFAULT"]["POLL_INTERVAL_ADAPTIVE"]
+    POLL_INTERVAL_MIN = (
+        float(config["DEFAULT"]["POLL_INTERVAL_MIN"]) * 1000
+        if config["DEFAULT"]["POLL_INTERVAL_MIN"] != ""
+        else None
+    )
+    POLL_INTERVAL_MAX = float(config["DEFAULT"]["POLL_INTERVAL_MAX"]) * 1000
+    # make some checks for most common missconfigurations
+    if POLL_INTERVAL_MIN is not None and POLL_INTERVAL_MIN > POLL_INTERVAL_MAX:
+        errors.append(
+            ConfigIssue(
+                "POLL_INTERVAL_MIN",
+                f"POLL_INTERVAL_MIN ({POLL_INTERVAL_MIN / 1000} s) is greater than "
+                + f"POLL_INTERVAL_MAX ({POLL_INTERVAL_MAX / 1000} s). "
+                + "To ensure that the driver still works correctly, POLL_INTERVAL_MAX was set to POLL_INTERVAL_MIN. "
+                + "Please check the configuration.",
+            )
+        )
+        POLL_INTERVAL_MAX = POLL_INTERVAL_MIN
+
+    # Read the data, which changes slowly, less often than the telemetry
+    REFRESH_PERIOD_MEDIUM = float(config["DEFAULT"]["REFRESH_PERIOD_MEDIUM"])
+    REFRESH_PERIOD_SLOW = float(config["DEFAULT"]["REFRESH_PERIOD_SLOW"])
+
+    # Auto reset SoC
+    AUTO_RESET_SOC = "True" == config["DEFAULT"]["AUTO_RESET_SOC"]
+
+    # Publish the config settings to the dbus path "/Info/Config/"
+    PUBLISH_CONFIG_VALUES = "True" == config["DEFAULT"]["PUBLISH_CONFIG_VALUES"]
+
+    # Record the serial traffic to "capture_<port>.bin"
+    SERIAL_CAPTURE = "True" == config["DEFAULT"]["SERIAL_CAPTURE"]
+
+    # Reload the config.ini while the driver is running
+    CONFIG_RELOAD = "True" == config["DEFAULT"]["CONFIG_RELOAD"]
+
+    # Publish the duration of the poll stages to the dbus path "/Diagnostics/Timing/"
+    PUBLISH_TIMING_STATISTICS = "True" == config["DEFAULT"]["PUBLISH_TIMING_STATISTICS"]
+
+    BATTERY_CELL_DATA_FORMAT = int(config["DEFAULT"]["BATTERY_CELL_DATA_FORMAT"])
+
+    MIDPOINT_ENABLE = "True" == config["DEFAULT"]["MIDPOINT_ENABLE"]
+
+    TEMP_BATTERY = int(config["DEFAULT"]["TEMP_BATTERY"])
+
+    TEMP_1_NAME = config["DEFAULT"]["TEMP_1_NAME"]
+    TEMP_2_NAME = config["DEFAULT"]["TEMP_2_NAME"]
+    TEMP_3_NAME = config["DEFAULT"]["TEMP_3_NAME"]
+    TEMP_4_NAME = config["DEFAULT"]["TEMP_4_NAME"]
+
+    GUI_PARAMETERS_SHOW_ADDITIONAL_INFO = (
+        "True" == config["DEFAULT"]["GUI_PARAMETERS_SHOW_ADDITIONAL_INFO"]
+    )
+    # --------- BMS specific settings ---------
+
+    # -- Unique ID settings
+    USE_PORT_AS_UNIQUE_ID = "True" == config["DEFAULT"]["USE_PORT_AS_UNIQUE_ID"]
+
+    # -- LltJbd settings
+    SOC_LOW_WARNING = float(config["DEFAULT"]["SOC_LOW_WARNING"])
+    SOC_LOW_ALARM = float(config["DEFAULT"]["SOC_LOW_ALARM"])
+
+    # -- Daly settings
+    BATTERY_CAPACITY = float(config["DEFAULT"]["BATTERY_CAPACITY"])
+    INVERT_CURRENT_MEASUREMENT = int(config["DEFAULT"]["INVERT_CURRENT_MEASUREMENT"])
+
+    # -- JK BMS settings
+    JKBMS_CAN_CELL_COUNT = int(config["DEFAULT"]["JKBMS_CAN_CELL_COUNT"])
+
+    # -- ESC GreenMeter and Lipro device settings
+    GREENMETER_ADDRESS = int(config["DEFAULT"]["GREENMETER_ADDRESS"])
+    LIPRO_START_ADDRESS = int(config["DEFAULT"]["LIPRO_START_ADDRESS"])
+    LIPRO_END_ADDRESS = int(config["DEFAULT"]["LIPRO_END_ADDRESS"])
+    LIPRO_CELL_COUNT = int(config["DEFAULT"]["LIPRO_CELL_COUNT"])
+
+    # -- HeltecModbus device settings
+    HELTEC_MODBUS_ADDR = _get_list_from_config(
+        config, "DEFAULT", "HELTEC_MODBUS_ADDR", lambda v: int(v)
+    )
+
+    # -- Seplos V3 settings
+    SEPLOS_USE_BMS_VALUES = "True" == config["DEFAULT"]["SEPLOS_USE_BMS_VALUES"]
+
+    # --------- Voltage drop ---------
+    VOLTAGE_DROP = float(config["DEFAULT"]["VOLTAGE_DROP"])
+
+    config_values = Config(
+        LOGGING=LOGGING,
+        MAX_BATTERY_CHARGE_CURRENT=MAX_BATTERY_CHARGE_CURRENT,
+        MAX_BATTERY_DISCHARGE_CURRENT=MAX_BATTERY_DISCHARGE_CURRENT,
+        MIN_CELL_VOLTAGE=MIN_CELL_VOLTAGE,
+        MAX_CELL_VOLTAGE=MAX_CELL_VOLTAGE,
+        FLOAT_CELL_VOLTAGE=FLOAT_CELL_VOLTAGE,
+        SOC_RESET_VOLTAGE=SOC_RESET_VOLTAGE,
+        SOC_RESET_AFTER_DAYS=SOC_RESET_AFTER_DAYS,
+        BLOCK_ON_DISCONNECT=BLOCK_ON_DISCONNECT,
+        LINEAR_LIMITATION_ENABLE=LINEAR_LIMITATION_ENABLE,
+        LINEAR_RECALCULATION_EVERY=LINEAR_RECALCULATION_EVERY,
+        LINEAR_RECALCULATION_ON_PERC_CHANGE=LINEAR_RECALCULATION_ON_PERC_CHANGE,
+        EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE=EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE,
+        EXTERNAL_CURRENT_SENSOR_DBUS_PATH=EXTERNAL_CURRENT_SENSOR_DBUS_PATH,
+        CVCM_ENABLE=CVCM_ENABLE,
+        CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL=CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL,
+        CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART=CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART,
+        CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT=CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT,
+        MAX_VOLTAGE_TIME_SEC=MAX_VOLTAGE_TIME_SEC,
+        SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT=SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT,
+        CCCM_CV_ENABLE=CCCM_CV_ENABLE,
+        DCCM_CV_ENABLE=DCCM_CV_ENABLE,
+        CELL_VOLTAGES_WHILE_CHARGING=CELL_VOLTAGES_WHILE_CHARGING,
+        MAX_CHARGE_CURRENT_CV=MAX_CHARGE_CURRENT_CV,
+        MAX_CHARGE_CURRENT_CV_CURVE=MAX_CHARGE_CURRENT_CV_CURVE,
+        CELL_VOLTAGES_WHILE_DISCHARGING=CELL_VOLTAGES_WHILE_DISCHARGING,
+        MAX_DISCHARGE_CURRENT_CV=MAX_DISCHARGE_CURRENT_CV,
+        MAX_DISCHARGE_CURRENT_CV_CURVE=MAX_DISCHARGE_CURRENT_CV_CURVE,
+        CVL_ICONTROLLER_MODE=CVL_ICONTROLLER_MODE,
+        CVL_ICONTROLLER_FACTOR=CVL_ICONTROLLER_FACTOR,
+        CCCM_T_ENABLE=CCCM_T_ENABLE,
+        DCCM_T_ENABLE=DCCM_T_ENABLE,
+        TEMPERATURES_WHILE_CHARGING=TEMPERATURES_WHILE_CHARGING,
+        MAX_CHARGE_CURRENT_T=MAX_CHARGE_CURRENT_T,
+        MAX_CHARGE_CURRENT_T_CURVE=MAX_CHARGE_CURRENT_T_CURVE,
+        TEMPERATURES_WHILE_DISCHARGING=TEMPERATURES_WHILE_DISCHARGING,
+        MAX_DISCHARGE_CURRENT_T=MAX_DISCHARGE_CURRENT_T,
+        MAX_DISCHARGE_CURRENT_T_CURVE=MAX_DISCHARGE_CURRENT_T_CURVE,
+        CCCM_SOC_ENABLE=CCCM_SOC_ENABLE,
+        DCCM_SOC_ENABLE=DCCM_SOC_ENABLE,
+        SOC_WHILE_CHARGING=SOC_WHILE_CHARGING,
+        MAX_CHARGE_CURRENT_SOC=MAX_CHARGE_CURRENT_SOC,
+        MAX_CHARGE_CURRENT_SOC_CURVE=MAX_CHARGE_CURRENT_SOC_CURVE,
+        SOC_WHILE_DISCHARGING=SOC_WHILE_DISCHARGING,
+        MAX_DISCHARGE_CURRENT_SOC=MAX_DISCHARGE_CURRENT_SOC,
+        MAX_DISCHARGE_CURRENT_SOC_CURVE=MAX_DISCHARGE_CURRENT_SOC_CURVE,
+        TIME_TO_GO_ENABLE=TIME_TO_GO_ENABLE,
+        TIME_TO_SOC_POINTS=TIME_TO_SOC_POINTS,
+        TIME_TO_SOC_VALUE_TYPE=TIME_TO_SOC_VALUE_TYPE,
+        TIME_TO_SOC_RECALCULATE_EVERY=TIME_TO_SOC_RECALCULATE_EVERY,
+        TIME_TO_SOC_INC_FROM=TIME_TO_SOC_INC_FROM,
+        SOC_CALCULATION=SOC_CALCULATION,
+        SOC_RESET_CURRENT=SOC_RESET_CURRENT,
+        SOC_RESET_TIME=SOC_RESET_TIME,
+        SOC_CALC_CURRENT_REPORTED_BY_BMS=SOC_CALC_CURRENT_REPORTED_BY_BMS,
+        SOC_CALC_CURRENT_MEASURED_BY_USER=SOC_CALC_CURRENT_MEASURED_BY_USER,
+        SOC_CALC_CURRENT=SOC_CALC_CURRENT,
+        SOC_CALC_CURRENT_CURVE=SOC_CALC_CURRENT_CURVE,
+        BMS_TYPE=BMS_TYPE,
+        EXCLUDED_DEVICES=EXCLUDED_DEVICES,
+        BUS_ADDRESSES=BUS_ADDRESSES,
+        BUS_AGGREGATE=BUS_AGGREGATE,
+        POLL_INTERVAL=POLL_INTERVAL,
+        POLL_IN_THREAD=POLL_IN_THREAD,
+        POLL_INTERVAL_ADAPTIVE=POLL_INTERVAL_ADAPTIVE,
+        POLL_INTERVAL_MIN=POLL_INTERVAL_MIN,
+        POLL_INTERVAL_MAX=POLL_INTERVAL_MAX,
+        REFRESH_PERIOD_MEDIUM=REFRESH_PERIOD_MEDIUM,
+        REFRESH_PERIOD_SLOW=REFRESH_PERIOD_SLOW,
+        AUTO_RESET_SOC=AUTO_RESET_SOC,
+        PUBLISH_CONFIG_VALUES=PUBLISH_CONFIG_VALUES,
+        SERIAL_CAPTURE=SERIAL_CAPTURE,
+        CONFIG_RELOAD=CONFIG_RELOAD,
+        PUBLISH_TIMING_STATISTICS=PUBLISH_TIMING_STATISTICS,
+        BATTERY_CELL_DATA_FORMAT=BATTERY_CELL_DATA_FORMAT,
+        MIDPOINT_ENABLE=MIDPOINT_ENABLE,
+        TEMP_BATTERY=TEMP_BATTERY,
+        TEMP_1_NAME=TEMP_1_NAME,
+        TEMP_2_NAME=TEMP_2_NAME,
+        TEMP_3_NAME=TEMP_3_NAME,
+        TEMP_4_NAME=TEMP_4_NAME,
+        GUI_PARAMETERS_SHOW_ADDITIONAL_INFO=GUI_PARAMETERS_SHOW_ADDITIONAL_INFO,
+        USE_PORT_AS_UNIQUE_ID=USE_PORT_AS_UNIQUE_ID,
+        SOC_LOW_WARNING=SOC_LOW_WARNING,
+        SOC_LOW_ALARM=SOC_LOW_ALARM,
+        BATTERY_CAPACITY=BATTERY_CAPACITY,
+        INVERT_CURRENT_MEASUREMENT=INVERT_CURRENT_MEASUREMENT,
+        JKBMS_CAN_CELL_COUNT=JKBMS_CAN_CELL_COUNT,
+        GREENMETER_ADDRESS=GREENMETER_ADDRESS,
+        LIPRO_START_ADDRESS=LIPRO_START_ADDRESS,
+        LIPRO_END_ADDRESS=LIPRO_END_ADDRESS,
+        LIPRO_CELL_COUNT=LIPRO_CELL_COUNT,
+        HELTEC_MODBUS_ADDR=HELTEC_MODBUS_ADDR,
+        SEPLOS_USE_BMS_VALUES=SEPLOS_USE_BMS_VALUES,
+        VOLTAGE_DROP=VOLTAGE_DROP,
+    )
+
+    return config_values, errors
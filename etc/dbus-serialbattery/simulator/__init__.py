@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+BMS simulator on a pseudo terminal
+
+Speaks the wire protocol of a BMS family on a pty, so that the drivers can be run and
+measured without hardware. The replies can be delayed and get corrupted checksums or lost
+bytes to test the error handling.
+
+    python -m simulator daly --cells 16 --latency 0.02 --jitter 0.01 --corrupt 0.01
+
+prints the pty, e.g. /dev/pts/3, which is then passed to the driver:
+
+    python dbus-serialbattery.py /dev/pts/3
+
+The simulator doesn't use the driver code, the protocols are implemented from the BMS
+documentation, so that it also finds decoding errors of the drivers.
+"""
+
+from typing import Dict, Type
+
+from .daly import DalyProtocol
+from .endpoint import PtyEndpoint
+from .jbd import JbdProtocol
+from .jk import JkProtocol
+from .model import BmsModel
+from .modbus import Eg4LlProtocol, RenogyProtocol, Seplosv3Protocol
+from .protocol import Protocol
+from .seplos import SeplosProtocol
+
+PROTOCOLS: Dict[str, Type[Protocol]] = {
+    protocol.NAME: protocol
+    for protocol in (
+        DalyProtocol,
+        JbdProtocol,
+        JkProtocol,
+        SeplosProtocol,
+        Seplosv3Protocol,
+        RenogyProtocol,
+        Eg4LlProtocol,
+    )
+}
+
+__all__ = ["BmsModel", "Protocol", "PtyEndpoint", "PROTOCOLS"]
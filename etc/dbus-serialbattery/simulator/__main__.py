@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import sys
+
+from . import PROTOCOLS, BmsModel, PtyEndpoint
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m simulator",
+        description="Simulate a BMS on a pseudo terminal",
+    )
+    parser.add_argument("protocol", choices=sorted(PROTOCOLS), help="BMS family")
+    parser.add_argument(
+        "--address",
+        action="append",
+        type=lambda value: int(value, 0),
+        help="address of a simulated battery, repeat it to simulate multiple batteries"
+        + " on one bus (default: the default address of the BMS)",
+    )
+    parser.add_argument("--cells", type=int, default=16, help="number of cells")
+    parser.add_argument("--capacity", type=float, default=280.0, help="capacity in Ah")
+    parser.add_argument("--soc", type=float, default=80.0, help="SoC at the start")
+    parser.add_argument(
+        "--current", type=float, default=0.0, help="current in A, positive is charging"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="delay of the replies in seconds"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="random additional delay of the replies up to this value in seconds",
+    )
+    parser.add_argument(
+        "--corrupt",
+        type=float,
+        default=0.0,
+        help="probability of a reply with an invalid checksum (0 to 1)",
+    )
+    parser.add_argument(
+        "--drop",
+        type=float,
+        default=0.0,
+        help="probability of a reply, where a byte is lost (0 to 1)",
+    )
+    parser.add_argument("--seed", type=int, help="seed of the random faults")
+    parser.add_argument(
+        "--duration", type=float, help="stop after this time in seconds"
+    )
+    parser.add_argument(
+        "--link", help="create a symlink to the pty, e.g. /tmp/ttyBMS, for a fixed port"
+    )
+    args = parser.parse_args()
+
+    protocol_class = PROTOCOLS[args.protocol]
+    addresses = args.address or [protocol_class.DEFAULT_ADDRESS]
+    models = {
+        address: BmsModel(
+            cell_count=args.cells,
+            capacity=args.capacity,
+            soc=args.soc,
+            current=args.current,
+            serial_number="SIM" + str(index + 1).rjust(7, "0"),
+        )
+        for index, address in enumerate(addresses)
+    }
+
+    endpoint = PtyEndpoint(
+        protocol_class(models),
+        latency=args.latency,
+        jitter=args.jitter,
+        corrupt=args.corrupt,
+        drop=args.drop,
+        seed=args.seed,
+    )
+    if args.link:
+        if os.path.islink(args.link):
+            os.remove(args.link)
+        os.symlink(endpoint.name, args.link)
+
+    print(
+        f"Simulating {args.protocol} ({protocol_class.BAUD} baud) with {args.cells} cells"
+        + f" on {endpoint.name}",
+        flush=True,
+    )
+
+    try:
+        endpoint.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        endpoint.close()
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+        print(
+            ", ".join(f"{key}: {value}" for key, value in endpoint.statistics.items()),
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
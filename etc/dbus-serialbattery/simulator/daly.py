@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import struct
+from typing import List, Tuple, Union
+
+from .model import BmsModel
+from .protocol import Protocol
+
+
+class DalyProtocol(Protocol):
+    """
+    Daly UART/RS485 protocol
+
+    Request: A5 <address 40/80> <command> 08 <8 bytes> <checksum>
+    Reply: one or more 13 byte sentences A5 01 <command> 08 <8 bytes> <checksum>
+    """
+
+    NAME = "daly"
+    BAUD = 9600
+    DEFAULT_ADDRESS = 0x40
+
+    FRAME_LENGTH = 13
+    CURRENT_ZERO_CONSTANT = 30000
+    TEMP_ZERO_CONSTANT = 40
+
+    def parse(self, buffer: bytes) -> Tuple[int, Union[bytes, None]]:
+        start = buffer.find(b"\xA5")
+        if start < 0:
+            return len(buffer), None
+        if start > 0:
+            return start, None
+        if len(buffer) < self.FRAME_LENGTH:
+            return 0, None
+        if sum(buffer[:12]) & 0xFF != buffer[12]:
+            return 1, None
+
+        model = self.get_model(buffer[1])
+        if model is None:
+            return self.FRAME_LENGTH, None
+
+        sentences = self.get_sentences(model, buffer[2], bytes(buffer[4:12]))
+        if sentences is None:
+            return self.FRAME_LENGTH, None
+
+        reply = bytearray()
+        for data in sentences:
+            sentence = bytes([0xA5, 0x01, buffer[2], 0x08]) + data.ljust(8, b"\x00")
+            reply += sentence + bytes([sum(sentence) & 0xFF])
+        return self.FRAME_LENGTH, bytes(reply)
+
+    def get_sentences(
+        self, model: BmsModel, command: int, data: bytes
+    ) -> Union[List[bytes], None]:
+        """
+        Encode the data sections of the reply sentences
+
+        :return: list of data sections or None, if the command is not supported
+        """
+        cells = model.cell_voltages
+        if command == 0x90:
+            return [
+                struct.pack(
+                    ">hhhh",
+                    round(model.voltage * 10),
+                    round(model.voltage * 10),
+                    round(self.CURRENT_ZERO_CONSTANT - model.current * 10),
+                    round(model.soc * 10),
+                )
+            ]
+        if command == 0x91:
+            cell_max = model.get_cell_max()
+            cell_min = model.get_cell_min()
+            return [
+                struct.pack(
+                    ">hbhb",
+                    round(cells[cell_max] * 1000),
+                    cell_max + 1,
+                    round(cells[cell_min] * 1000),
+                    cell_min + 1,
+                )
+            ]
+        if command == 0x92:
+            temperatures = model.temperatures
+            return [
+                struct.pack(
+                    ">bbbb",
+                    round(max(temperatures)) + self.TEMP_ZERO_CONSTANT,
+                    temperatures.index(max(temperatures)) + 1,
+                    round(min(temperatures)) + self.TEMP_ZERO_CONSTANT,
+                    temperatures.index(min(temperatures)) + 1,
+                )
+            ]
+        if command == 0x93:
+            return [
+                struct.pack(
+                    ">b??BL",
+                    1 if model.current > 0 else 2 if model.current < 0 else 0,
+                    model.charge_fet,
+                    model.discharge_fet,
+                    model.cycles & 0xFF,
+                    round(model.capacity_remain * 1000),
+                )
+            ]
+        if command == 0x94:
+            return [
+                struct.pack(
+                    ">bb??bh",
+                    model.cell_count,
+                    len(model.temperatures),
+                    model.current > 0,
+                    model.current < 0,
+                    0,
+                    model.cycles,
+                )
+            ]
+        if command == 0x95:
+            # 3 cells per sentence, the sentences are numbered from 1
+            sentences = []
+            for frame in range((model.cell_count + 2) // 3):
+                voltages = [round(v * 1000) for v in cells[frame * 3 : frame * 3 + 3]]
+                sentences.append(
+                    struct.pack(">B", frame + 1)
+                    + struct.pack(">" + str(len(voltages)) + "h", *voltages)
+                )
+            return sentences
+        if command == 0x96:
+            # 7 temperatures per sentence
+            return [
+                struct.pack(">B", 1)
+                + bytes(
+                    round(t) + self.TEMP_ZERO_CONSTANT for t in model.temperatures[:7]
+                )
+            ]
+        if command == 0x97:
+            # bit n is cell n + 1
+            bits = 0
+            if model.balancing:
+                bits = 1 << model.get_cell_max()
+            return [bits.to_bytes(8, "little")]
+        if command == 0x98:
+            return [bytes(8)]
+        if command == 0x50:
+            return [
+                struct.pack(">LL", round(model.capacity * 1000), round(cells[0] * 1000))
+            ]
+        if command == 0x53:
+            return [struct.pack(">BBBBB", 0, 0, 24, 1, 1)]
+        if command == 0x57:
+            code = model.serial_number.encode("ascii").ljust(35)[:35]
+            return [
+                struct.pack(">B7s", i + 1, code[i * 7 : i * 7 + 7]) for i in range(5)
+            ]
+        if command in (0xD9, 0xDA):
+            # switch the discharge/charge FET and echo the state
+            if command == 0xD9:
+                model.discharge_fet = data[0] == 1
+            else:
+                model.charge_fet = data[0] == 1
+            return [data[:1]]
+        return None
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+import select
+import tty
+from time import monotonic, sleep
+from typing import Union
+
+from .protocol import Protocol
+
+
+class PtyEndpoint:
+    """
+    Serves a protocol on a pseudo terminal. The driver opens the slave side like a serial port.
+
+    The replies can be delayed, get corrupted checksums or lose bytes to test the error
+    handling of the drivers.
+    """
+
+    FRAME_GAP = 0.1
+    """
+    Incomplete requests are discarded, if nothing was received for this time in seconds
+    """
+
+    def __init__(
+        self,
+        protocol: Protocol,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        corrupt: float = 0.0,
+        drop: float = 0.0,
+        seed: Union[int, None] = None,
+    ):
+        """
+        :param protocol: the protocol answering the requests
+        :param latency: delay of the replies in seconds
+        :param jitter: random additional delay of the replies up to this value in seconds
+        :param corrupt: probability of a reply with an invalid checksum
+        :param drop: probability of a reply, where a random byte is lost
+        :param seed: seed of the random faults, to make a run reproducible
+        """
+        self.protocol = protocol
+        self.latency = latency
+        self.jitter = jitter
+        self.corrupt = corrupt
+        self.drop = drop
+        self.random = random.Random(seed)
+        self.statistics = {
+            "replies": 0,
+            "corrupted": 0,
+            "dropped": 0,
+            "discarded_bytes": 0,
+        }
+
+        self.master, self.slave = os.openpty()
+        # no echo and no translation of line endings, the driver configures the same
+        tty.setraw(self.slave)
+        # the slave stays open, so that the master can be read while the driver reconnects
+        self.name = os.ttyname(self.slave)
+
+    def close(self) -> None:
+        os.close(self.master)
+        os.close(self.slave)
+
+    def run(self, duration: Union[float, None] = None) -> None:
+        """
+        Answer the requests until the duration is over
+
+        :param duration: time to run in seconds, None to run forever
+        """
+        buffer = bytearray()
+        time_end = monotonic() + duration if duration is not None else None
+
+        while time_end is None or monotonic() < time_end:
+            readable, _, _ = select.select([self.master], [], [], self.FRAME_GAP)
+            if not readable:
+                # frame gap, a real BMS resets its receiver
+                self.statistics["discarded_bytes"] += len(buffer)
+                buffer.clear()
+                continue
+
+            buffer += os.read(self.master, 4096)
+            while len(buffer) > 0:
+                consumed, reply = self.protocol.parse(bytes(buffer))
+                if consumed == 0:
+                    break
+                del buffer[:consumed]
+                if reply is None:
+                    # garbage, invalid requests and requests for other addresses
+                    self.statistics["discarded_bytes"] += consumed
+                    continue
+                self.send(reply)
+
+    def send(self, reply: bytes) -> None:
+        """
+        Send a reply after the latency and apply the faults
+        """
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            sleep(delay)
+
+        if len(reply) > 0 and self.random.random() < self.corrupt:
+            reply = self.protocol.corrupt(reply)
+            self.statistics["corrupted"] += 1
+        if len(reply) > 0 and self.random.random() < self.drop:
+            index = self.random.randrange(len(reply))
+            reply = reply[:index] + reply[index + 1 :]
+            self.statistics["dropped"] += 1
+
+        os.write(self.master, reply)
+        self.statistics["replies"] += 1
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import struct
+from typing import Tuple, Union
+
+from .model import BmsModel
+from .protocol import Protocol
+
+
+def checksum(payload: bytes) -> int:
+    return (0x10000 - sum(payload)) % 0x10000
+
+
+class JbdProtocol(Protocol):
+    """
+    LLT/JBD protocol
+
+    Request: DD <A5 read/5A write> <register> <length> <data> <checksum 2 bytes> 77
+    Reply: DD <register> <status> <length> <data> <checksum 2 bytes> 77
+    """
+
+    NAME = "jbd"
+    BAUD = 9600
+
+    REG_GENERAL = 0x03
+    REG_CELL = 0x04
+    REG_HARDWARE = 0x05
+    REG_CHGOC = 0x28
+    REG_DSGOC = 0x29
+    REG_FUNC_CONFIG = 0x2D
+    FUNC_BALANCE_EN = 0x0004
+
+    def __init__(self, models):
+        super(JbdProtocol, self).__init__(models)
+        self.func_config = self.FUNC_BALANCE_EN
+
+    def parse(self, buffer: bytes) -> Tuple[int, Union[bytes, None]]:
+        start = buffer.find(b"\xDD")
+        if start < 0:
+            return len(buffer), None
+        if start > 0:
+            return start, None
+        if len(buffer) < 4:
+            return 0, None
+        length = 7 + buffer[3]
+        if len(buffer) < length:
+            return 0, None
+        request = bytes(buffer[:length])
+        if request[-1] != 0x77 or struct.unpack_from(">H", request, length - 3)[
+            0
+        ] != checksum(request[2:-3]):
+            return 1, None
+
+        model = self.get_model(None)
+        data = self.get_data(model, request[1], request[2], request[4:-3])
+        if data is None:
+            return length, self.frame(request[2], 0x80, b"")
+        return length, self.frame(request[2], 0x00, data)
+
+    def corrupt(self, reply: bytes) -> bytes:
+        # the last byte is the end byte, corrupt the checksum before it
+        return reply[:-2] + bytes([reply[-2] ^ 0xFF]) + reply[-1:]
+
+    @staticmethod
+    def frame(register: int, status: int, data: bytes) -> bytes:
+        payload = bytes([status, len(data)]) + data
+        return (
+            bytes([0xDD, register])
+            + payload
+            + struct.pack(">HB", checksum(payload), 0x77)
+        )
+
+    def get_data(
+        self, model: BmsModel, operation: int, register: int, data: bytes
+    ) -> Union[bytes, None]:
+        """
+        Encode the data of a register
+
+        :return: the data or None, if the register is not supported
+        """
+        if operation == 0x5A:
+            # writes, like entering and exiting the factory mode, are acknowledged
+            if register == self.REG_FUNC_CONFIG and len(data) == 2:
+                self.func_config = struct.unpack(">H", data)[0]
+            return b""
+
+        if register == self.REG_GENERAL:
+            balance = 0
+            if model.balancing:
+                balance = 1 << model.get_cell_max()
+            fet = (1 if model.charge_fet else 0) | (2 if model.discharge_fet else 0)
+            temperatures = [model.temp_mos] + model.temperatures
+            return struct.pack(
+                ">HhHHHHHHHBBBBB",
+                round(model.voltage * 100),
+                round(model.current * 100),
+                round(model.capacity_remain * 100),
+                round(model.capacity * 100),
+                model.cycles,
+                # production date 2024-01-01: (year - 2000) << 9 | month << 5 | day
+                24 << 9 | 1 << 5 | 1,
+                balance & 0xFFFF,
+                balance >> 16,
+                0,
+                0x10,
+                round(model.soc),
+                fet,
+                model.cell_count,
+                len(temperatures),
+            ) + b"".join(
+                struct.pack(">H", round((t + 273.1) * 10)) for t in temperatures
+            )
+        if register == self.REG_CELL:
+            return b"".join(
+                struct.pack(">H", round(v * 1000)) for v in model.cell_voltages
+            )
+        if register == self.REG_HARDWARE:
+            return ("SIM-JBD-" + model.serial_number).encode("ascii")
+        if register == self.REG_CHGOC:
+            return struct.pack(">h", 10000)
+        if register == self.REG_DSGOC:
+            return struct.pack(">h", -20000)
+        if register == self.REG_FUNC_CONFIG:
+            return struct.pack(">H", self.func_config)
+        if register >= 0x10:
+            # other EEPROM registers
+            return bytes(2)
+        return None
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import struct
+from typing import Tuple, Union
+
+from .model import BmsModel
+from .protocol import Protocol
+
+
+class JkProtocol(Protocol):
+    """
+    JK BMS RS485 protocol
+
+    Request and reply: 4E 57 <length 2 bytes> <terminal 4 bytes> <command> <source>
+    <transport type> <data> <record number 4 bytes> 68 <checksum 4 bytes>
+
+    The length counts from the length field to the end, the checksum is the sum of all bytes
+    before it. The data of a reply is a list of fields, each an id byte followed by the value.
+    """
+
+    NAME = "jk"
+    BAUD = 115200
+
+    COMMAND_READ_ALL = 0x06
+    CURRENT_ZERO_CONSTANT = 32768
+
+    # id and size of the fields following the cell voltages, in the order sent by the BMS
+    FIELDS = (
+        (0x80, 2),
+        (0x81, 2),
+        (0x82, 2),
+        (0x83, 2),
+        (0x84, 2),
+        (0x85, 1),
+        (0x86, 1),
+        (0x87, 2),
+        (0x89, 4),
+        (0x8A, 2),
+        (0x8B, 2),
+        (0x8C, 2),
+        (0x8E, 2),
+        (0x8F, 2),
+        (0x90, 2),
+        (0x91, 2),
+        (0x92, 2),
+        (0x93, 2),
+        (0x94, 2),
+        (0x95, 2),
+        (0x96, 2),
+        (0x97, 2),
+        (0x98, 2),
+        (0x99, 2),
+        (0x9A, 2),
+        (0x9B, 2),
+        (0x9C, 2),
+        (0x9D, 1),
+        (0x9E, 2),
+        (0x9F, 2),
+        (0xA0, 2),
+        (0xA1, 2),
+        (0xA2, 2),
+        (0xA3, 2),
+        (0xA4, 2),
+        (0xA5, 2),
+        (0xA6, 2),
+        (0xA7, 2),
+        (0xA8, 2),
+        (0xA9, 1),
+        (0xAA, 4),
+        (0xAB, 1),
+        (0xAC, 1),
+        (0xAD, 2),
+        (0xAE, 1),
+        (0xAF, 1),
+        (0xB0, 2),
+        (0xB1, 1),
+        (0xB2, 10),
+        (0xB3, 1),
+        (0xB4, 8),
+        (0xB5, 4),
+        (0xB6, 4),
+        (0xB7, 15),
+        (0xB8, 1),
+        (0xB9, 4),
+        (0xBA, 24),
+        (0xC0, 1),
+    )
+
+    def parse(self, buffer: bytes) -> Tuple[int, Union[bytes, None]]:
+        start = buffer.find(b"\x4E\x57")
+        if start < 0:
+            # keep a trailing 4E, it may be the start of a request
+            return max(len(buffer) - 1, 0), None
+        if start > 0:
+            return start, None
+        if len(buffer) < 4:
+            return 0, None
+        length = struct.unpack_from(">H", buffer, 2)[0] + 2
+        if len(buffer) < length:
+            return 0, None
+        request = bytes(buffer[:length])
+        checksum = struct.unpack_from(">L", request, length - 4)[0]
+        if request[-5] != 0x68 or checksum != sum(request[:-4]):
+            return 1, None
+
+        if request[8] != self.COMMAND_READ_ALL:
+            return length, None
+
+        return length, self.frame(request[4:8], self.get_data(self.get_model(None)))
+
+    @staticmethod
+    def frame(terminal: bytes, data: bytes) -> bytes:
+        # length field, terminal, command, source, transport type, data, record number,
+        # end byte and checksum
+        length = 2 + 4 + 3 + len(data) + 4 + 1 + 4
+        frame = (
+            b"\x4E\x57"
+            + struct.pack(">H", length)
+            + terminal
+            + bytes([JkProtocol.COMMAND_READ_ALL, 0x00, 0x01])
+            + data
+            + bytes(4)
+            + b"\x68"
+        )
+        return frame + struct.pack(">L", sum(frame))
+
+    def get_data(self, model: BmsModel) -> bytes:
+        """
+        Encode the fields of the read all command
+        """
+
+        def temperature(value: float) -> int:
+            # negative temperatures are sent as 100 + |value|
+            return round(value) if value >= 0 else 100 - round(value)
+
+        current = round(model.current * 100)
+        balancing = model.balancing and model.current > 0
+        values = {
+            0x80: temperature(model.temp_mos),
+            0x81: temperature(model.temperatures[0]),
+            0x82: temperature(model.temperatures[1]),
+            0x83: round(model.voltage * 100),
+            0x84: current + self.CURRENT_ZERO_CONSTANT if current >= 0 else -current,
+            0x85: round(model.soc),
+            0x86: 2,
+            0x87: model.cycles,
+            0x89: round(model.capacity * model.cycles),
+            0x8A: model.cell_count,
+            0x8B: 0,
+            0x8C: (
+                (1 if model.charge_fet else 0)
+                | (2 if model.discharge_fet else 0)
+                | (4 if balancing else 0)
+            ),
+            0x97: 200,
+            0x99: 100,
+            0x9D: 1,
+            0xAA: round(model.capacity),
+            0xB4: b"Input Us",
+            0xB5: b"2401",
+            0xB7: b"11.XW_S11.26___",
+            0xBA: ("SIM" + model.serial_number).encode("ascii"),
+        }
+
+        cells = b"".join(
+            struct.pack(">BH", c + 1, round(v * 1000))
+            for c, v in enumerate(model.cell_voltages)
+        )
+        data = bytearray(b"\x79" + bytes([len(cells)]) + cells)
+        for field, size in self.FIELDS:
+            value = values.get(field, 0)
+            data.append(field)
+            if isinstance(value, bytes):
+                data += value.ljust(size, b"\x00")[:size]
+            else:
+                data += value.to_bytes(size, "big")
+        return bytes(data)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+import struct
+from typing import Dict, Tuple, Union
+
+from .model import BmsModel
+from .protocol import Protocol, modbus_crc
+
+
+class ModbusProtocol(Protocol):
+    """
+    Modbus RTU slave, which answers the read functions 01, 03 and 04 from the register map
+    of the battery. Unknown registers read as 0.
+
+    Request: <address> <function> <register 2 bytes> <count 2 bytes> <CRC 2 bytes>
+    Reply: <address> <function> <byte count> <data> <CRC 2 bytes>
+    """
+
+    DEFAULT_ADDRESS = 0x01
+
+    READ_COILS = 0x01
+    READ_HOLDING_REGISTERS = 0x03
+    READ_INPUT_REGISTERS = 0x04
+    REQUEST_LENGTH = 8
+
+    def parse(self, buffer: bytes) -> Tuple[int, Union[bytes, None]]:
+        if len(buffer) < self.REQUEST_LENGTH:
+            return 0, None
+        request = bytes(buffer[: self.REQUEST_LENGTH])
+        if modbus_crc(request[:6]) != request[6:]:
+            # resynchronize on the next byte
+            return 1, None
+
+        address, function, register, count = struct.unpack_from(">BBHH", request)
+        model = self.get_model(address)
+        if model is None:
+            return self.REQUEST_LENGTH, None
+
+        if function == self.READ_COILS:
+            coils = self.get_coils(model)
+            bits = 0
+            for i in range(count):
+                if coils.get(register + i, 0):
+                    bits |= 1 << i
+            data = bits.to_bytes((count + 7) // 8, "little")
+        elif function in (self.READ_HOLDING_REGISTERS, self.READ_INPUT_REGISTERS):
+            registers = self.get_registers(model, function)
+            data = b"".join(
+                struct.pack(">H", registers.get(register + i, 0) & 0xFFFF)
+                for i in range(count)
+            )
+        else:
+            # exception 01: illegal function
+            return self.REQUEST_LENGTH, self.frame(
+                bytes([address, function | 0x80, 0x01])
+            )
+
+        return self.REQUEST_LENGTH, self.frame(
+            bytes([address, function, len(data)]) + data
+        )
+
+    @staticmethod
+    def frame(data: bytes) -> bytes:
+        return data + modbus_crc(data)
+
+    def get_registers(self, model: BmsModel, function: int) -> Dict[int, int]:
+        """
+        Get the register map of the battery
+
+        :param function: READ_HOLDING_REGISTERS or READ_INPUT_REGISTERS
+        :return: dict of register address and 16 bit value
+        """
+        return {}
+
+    def get_coils(self, model: BmsModel) -> Dict[int, int]:
+        """
+        Get the coils and discrete inputs of the battery
+
+        :return: dict of bit address and value
+        """
+        return {}
+
+    @staticmethod
+    def string_registers(register: int, text: str, count: int) -> Dict[int, int]:
+        """
+        Encode a string into registers, 2 characters per register in big endian
+
+        :param register: the first register
+        :param text: the string, it's padded with 0 to count registers
+        :param count: the number of registers
+        """
+        data = text.encode("ascii").ljust(count * 2, b"\x00")[: count * 2]
+        return {
+            register + i: struct.unpack_from(">H", data, i * 2)[0] for i in range(count)
+        }
+
+    @staticmethod
+    def long_registers(register: int, value: int) -> Dict[int, int]:
+        """
+        Encode a 32 bit value into two registers, high word first
+        """
+        return {register: (value >> 16) & 0xFFFF, register + 1: value & 0xFFFF}
+
+
+class Seplosv3Protocol(ModbusProtocol):
+    """
+    Seplos v3 Modbus RTU, the values are input registers and discrete inputs
+    """
+
+    NAME = "seplosv3"
+    BAUD = 19200
+    DEFAULT_ADDRESS = 0x00
+
+    KELVIN_ZERO = 2731
+
+    def get_registers(self, model: BmsModel, function: int) -> Dict[int, int]:
+        if function != self.READ_INPUT_REGISTERS:
+            return {}
+
+        registers = {}
+        # PIA: pack information
+        registers.update(
+            {
+                0x1000: round(model.voltage * 100),
+                0x1001: round(model.current * 100),
+                0x1002: round(model.capacity_remain * 100),
+                0x1003: round(model.capacity * 100),
+                0x1004: round(model.capacity * model.cycles / 10),
+                0x1005: round(model.soc * 10),
+                0x1006: 1000,
+                0x1007: model.cycles,
+                0x100F: 200,
+                0x1010: 100,
+            }
+        )
+        # PIB: cell voltages, 4 cell temperatures, environment and power temperature
+        for c, voltage in enumerate(model.cell_voltages[:16]):
+            registers[0x1100 + c] = round(voltage * 1000)
+        for t in range(4):
+            registers[0x1110 + t] = (
+                round(model.temperatures[t % 2] * 10) + self.KELVIN_ZERO
+            )
+        registers[0x1118] = round(model.temperatures[0] * 10) + self.KELVIN_ZERO
+        registers[0x1119] = round(model.temp_mos * 10) + self.KELVIN_ZERO
+        # SPA: system parameters
+        registers.update(
+            {
+                0x1300: 4,
+                0x1301: model.cell_count,
+                0x1305: round(model.cell_count * 3.65 * 100),
+                0x1311: round(model.cell_count * 2.8 * 100),
+                0x1359: round(model.capacity * 100),
+                0x1365: round(model.cell_count * 3.45 * 100),
+                0x1366: 100,
+                0x1367: 200,
+            }
+        )
+        # device information
+        registers.update(self.string_registers(0x1700, "XZH-ElecTech Co.,Ltd", 10))
+        registers.update(self.string_registers(0x170A, "SIM-SEPLOSV3", 10))
+        registers.update(self.string_registers(0x1714, "11", 1))
+        registers.update(self.string_registers(0x1715, model.serial_number, 15))
+        return registers
+
+    def get_coils(self, model: BmsModel) -> Dict[int, int]:
+        # PIC: system state, 1 is on
+        coils = {0x1200 + i: 0 for i in range(0x90)}
+        coils[0x1274] = 1
+        coils[0x1278] = 1 if model.discharge_fet else 0
+        coils[0x1279] = 1 if model.charge_fet else 0
+        coils[0x1280] = 1 if model.balancing else 0
+        # SFA: alarms, 0 is active and 1 is normal
+        coils.update({0x1400 + i: 1 for i in range(0x50)})
+        return coils
+
+
+class RenogyProtocol(ModbusProtocol):
+    """
+    Renogy smart battery Modbus RTU, the values are holding registers
+    """
+
+    NAME = "renogy"
+    BAUD = 9600
+    DEFAULT_ADDRESS = 0x30
+
+    def get_registers(self, model: BmsModel, function: int) -> Dict[int, int]:
+        if function != self.READ_HOLDING_REGISTERS:
+            return {}
+
+        registers = {5000: model.cell_count}
+        for c, voltage in enumerate(model.cell_voltages[:16]):
+            registers[5001 + c] = round(voltage * 10)
+        registers[5017] = model.cell_count
+        for c in range(model.cell_count):
+            registers[5018 + c] = round(model.temperatures[0] * 10)
+        registers[5035] = 2
+        registers[5037] = round(model.temp_mos * 10)
+        registers[5040] = round(model.temperatures[1] * 10)
+        registers[5042] = round(model.current * 100)
+        registers[5043] = round(model.voltage * 10)
+        registers.update(self.long_registers(5044, round(model.capacity_remain * 1000)))
+        registers.update(self.long_registers(5046, round(model.capacity * 1000)))
+        registers[5048] = model.cycles
+        registers.update(self.string_registers(5110, model.serial_number, 8))
+        registers.update(self.string_registers(5122, "RBT-SIM", 8))
+        registers.update(self.string_registers(5130, "0102", 2))
+        registers.update(self.string_registers(5132, "SIMULATOR", 8))
+        return registers
+
+
+class Eg4LlProtocol(ModbusProtocol):
+    """
+    EG4 LL Modbus RTU, the values are holding registers
+    """
+
+    NAME = "eg4_ll"
+    BAUD = 9600
+    DEFAULT_ADDRESS = 0x01
+
+    def get_registers(self, model: BmsModel, function: int) -> Dict[int, int]:
+        if function != self.READ_HOLDING_REGISTERS:
+            return {}
+
+        temperatures = model.temperatures
+        registers = {
+            0x00: round(model.voltage * 100),
+            0x01: round(model.current * 100),
+            0x12: round(temperatures[0]),
+            0x13: round(sum(temperatures) / len(temperatures)),
+            0x14: round(max(temperatures)),
+            0x15: round(model.capacity_remain),
+            0x16: 200,
+            0x17: 100,
+            0x18: round(model.soc),
+            # heater off and state standby, charging or discharging
+            0x19: 1 if model.current > 0 else 2 if model.current < 0 else 0,
+            # temperature 2 and MOSFET temperature, one byte each
+            0x21: (round(temperatures[1]) & 0xFF) << 8 | (round(model.temp_mos) & 0xFF),
+            0x24: model.cell_count,
+        }
+        for c, voltage in enumerate(model.cell_voltages[:16]):
+            registers[0x02 + c] = round(voltage * 1000)
+        registers.update(self.long_registers(0x1D, model.cycles))
+        registers.update(self.long_registers(0x1F, round(model.capacity * 3600000)))
+
+        # version: 24 characters model, 6 characters hardware version and serial number
+        version = "SIM-EG4-LL".ljust(24) + "V1.0".ljust(6) + model.serial_number
+        registers.update(self.string_registers(0x69, version, 0x23))
+        return registers
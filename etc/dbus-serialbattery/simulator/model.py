@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from time import monotonic
+from typing import List
+
+
+class BmsModel:
+    """
+    The simulated battery. The protocols encode its values in the replies.
+
+    The remaining capacity is integrated from the current, the cell voltages follow the SoC,
+    so that the driver sees a slowly changing battery.
+    """
+
+    CELL_VOLTAGE_EMPTY = 3.0
+    """
+    Cell voltage at 0% SoC in V
+    """
+    CELL_VOLTAGE_FULL = 3.45
+    """
+    Cell voltage at 100% SoC in V
+    """
+    CELL_VOLTAGE_SPREAD = 0.002
+    """
+    Voltage difference between neighbouring cells in V, so that the min and max cell differ
+    """
+
+    def __init__(
+        self,
+        cell_count: int = 16,
+        capacity: float = 280.0,
+        soc: float = 80.0,
+        current: float = 0.0,
+        temperature: float = 25.0,
+        cycles: int = 10,
+        serial_number: str = "SIM0000001",
+    ):
+        """
+        :param cell_count: number of cells in series
+        :param capacity: capacity in Ah
+        :param soc: SoC at the start in %
+        :param current: current in A, positive while charging
+        :param temperature: cell temperature in °C
+        :param cycles: charge cycles
+        :param serial_number: serial number reported by the BMS
+        """
+        self.cell_count = cell_count
+        self.capacity = capacity
+        self.capacity_remain = capacity * soc / 100
+        self.current = current
+        self.temperatures: List[float] = [temperature, temperature + 1.0]
+        self.temp_mos = temperature + 5.0
+        self.cycles = cycles
+        self.serial_number = serial_number
+        self.charge_fet = True
+        self.discharge_fet = True
+        self.balancing = False
+        self.cell_voltages: List[float] = []
+        self.last_update = None
+        self.update()
+
+    @property
+    def soc(self) -> float:
+        return 100 * self.capacity_remain / self.capacity
+
+    @property
+    def voltage(self) -> float:
+        return sum(self.cell_voltages)
+
+    def update(self) -> None:
+        """
+        Integrate the current since the last update and recalculate the cell voltages
+        """
+        now = monotonic()
+        if self.last_update is not None:
+            self.capacity_remain += self.current * (now - self.last_update) / 3600
+            self.capacity_remain = min(max(self.capacity_remain, 0.0), self.capacity)
+        self.last_update = now
+
+        cell_voltage = (
+            self.CELL_VOLTAGE_EMPTY
+            + (self.CELL_VOLTAGE_FULL - self.CELL_VOLTAGE_EMPTY) * self.soc / 100
+        )
+        self.cell_voltages = [
+            round(
+                cell_voltage + (c - self.cell_count / 2) * self.CELL_VOLTAGE_SPREAD, 3
+            )
+            for c in range(self.cell_count)
+        ]
+
+    def get_cell_min(self) -> int:
+        """
+        :return: index of the lowest cell
+        """
+        return self.cell_voltages.index(min(self.cell_voltages))
+
+    def get_cell_max(self) -> int:
+        """
+        :return: index of the highest cell
+        """
+        return self.cell_voltages.index(max(self.cell_voltages))
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from abc import ABC, abstractmethod
+from typing import Dict, Tuple, Union
+
+from .model import BmsModel
+
+
+class Protocol(ABC):
+    """
+    Wire protocol of a BMS family. Parses the requests of the driver and encodes the replies
+    from the simulated batteries.
+    """
+
+    NAME = ""
+    """
+    Name of the BMS family on the command line
+    """
+    BAUD = 9600
+    """
+    Baud rate the driver uses, only informational since a pty has no baud rate
+    """
+    DEFAULT_ADDRESS: Union[int, None] = None
+    """
+    Address the BMS answers on, None if the protocol has no address
+    """
+
+    def __init__(self, models: Dict[Union[int, None], BmsModel]):
+        """
+        :param models: the simulated batteries by their address
+        """
+        self.models = models
+
+    def get_model(self, address: Union[int, None]) -> Union[BmsModel, None]:
+        """
+        Get the battery answering on an address
+
+        :param address: the address of the request
+        :return: the battery or None, if no battery has this address
+        """
+        model = self.models.get(address)
+        if model is not None:
+            model.update()
+        return model
+
+    @abstractmethod
+    def parse(self, buffer: bytes) -> Tuple[int, Union[bytes, None]]:
+        """
+        Parse the next request from the received bytes
+
+        :param buffer: the received bytes, starting after the last parsed request
+        :return: (number of consumed bytes, reply or None). 0 consumed bytes mean the
+            request is not complete yet
+        """
+        # Each protocol must override this function to parse its requests
+        return 0, None
+
+    def corrupt(self, reply: bytes) -> bytes:
+        """
+        Corrupt the checksum of a reply
+
+        :param reply: a valid reply
+        :return: the reply with an invalid checksum
+        """
+        return reply[:-1] + bytes([reply[-1] ^ 0xFF])
+
+
+def modbus_crc(data: bytes) -> bytes:
+    """
+    Calculate the Modbus RTU CRC16 of a frame
+
+    :param data: the frame without CRC
+    :return: the CRC as 2 bytes in little endian
+    """
+    crc = 0xFFFF
+    for pos in data:
+        crc ^= pos
+        for _ in range(8):
+            if (crc & 1) != 0:
+                crc >>= 1
+                crc ^= 0xA001
+            else:
+                crc >>= 1
+    return crc.to_bytes(2, "little")
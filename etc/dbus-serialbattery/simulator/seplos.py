@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+from typing import Tuple, Union
+
+from .model import BmsModel
+from .protocol import Protocol
+
+
+def get_checksum(frame: bytes) -> int:
+    checksum = sum(frame) % 0xFFFF
+    return (checksum ^ 0xFFFF) + 1
+
+
+def get_info_length(info: bytes) -> int:
+    length = len(info)
+    if length == 0:
+        return 0
+    lchksum = ((length & 0xF) + ((length >> 4) & 0xF) + ((length >> 8) & 0xF)) % 16
+    return (((lchksum ^ 0xF) + 1) << 12) + length
+
+
+class SeplosProtocol(Protocol):
+    """
+    Seplos v2 ASCII protocol
+
+    Request: ~<version 20><address><CID1 46><CID2 command><length 4><info><checksum 4>\\r
+    Reply: the same frame with CID2 as return code 00. All fields are ASCII hex.
+    """
+
+    NAME = "seplos"
+    BAUD = 19200
+    DEFAULT_ADDRESS = 0x00
+
+    COMMAND_STATUS = 0x42
+    COMMAND_ALARM = 0x44
+    # the status reply has slots for 16 cells, unused slots are 0
+    CELL_SLOTS = 16
+    KELVIN_ZERO = 2731
+
+    def parse(self, buffer: bytes) -> Tuple[int, Union[bytes, None]]:
+        start = buffer.find(b"~")
+        if start < 0:
+            return len(buffer), None
+        if start > 0:
+            return start, None
+        end = buffer.find(b"\r")
+        if end < 0:
+            return 0, None
+        request = bytes(buffer[: end + 1])
+        try:
+            if len(request) < 18 or get_checksum(request[1:-5]) != int(
+                request[-5:-1], 16
+            ):
+                return len(request), None
+            address = int(request[3:5], 16)
+            command = int(request[7:9], 16)
+        except ValueError:
+            return len(request), None
+
+        model = self.get_model(address)
+        if model is None:
+            return len(request), None
+
+        if command == self.COMMAND_STATUS:
+            info = self.get_status(model)
+        elif command == self.COMMAND_ALARM:
+            info = self.get_alarm(model)
+        else:
+            # return code 04: command not supported
+            return len(request), self.frame(address, 0x04, b"")
+
+        return len(request), self.frame(address, 0x00, info)
+
+    def corrupt(self, reply: bytes) -> bytes:
+        # replace the last checksum digit, the last byte is the end byte
+        digit = b"1" if reply[-2:-1] == b"0" else b"0"
+        return reply[:-2] + digit + reply[-1:]
+
+    @staticmethod
+    def frame(address: int, return_code: int, info: bytes) -> bytes:
+        frame = (
+            "{:02X}{:02X}{:02X}{:02X}{:04X}".format(
+                0x20, address, 0x46, return_code, get_info_length(info)
+            ).encode()
+            + info
+        )
+        return b"~" + frame + "{:04X}".format(get_checksum(frame)).encode() + b"\r"
+
+    def get_status(self, model: BmsModel) -> bytes:
+        """
+        Encode the telemetry, 150 hex digits
+        """
+        voltages = [round(v * 1000) for v in model.cell_voltages[: self.CELL_SLOTS]]
+        voltages += [0] * (self.CELL_SLOTS - len(voltages))
+        # 4 cell temperatures, environment and power
+        temperatures = [
+            model.temperatures[0],
+            model.temperatures[1],
+            model.temperatures[0],
+            model.temperatures[1],
+            model.temperatures[0],
+            model.temp_mos,
+        ]
+        info = "0000{:02X}".format(min(model.cell_count, self.CELL_SLOTS))
+        info += "".join("{:04X}".format(v) for v in voltages)
+        info += "{:02X}".format(len(temperatures))
+        info += "".join(
+            "{:04X}".format(round(t * 10) + self.KELVIN_ZERO) for t in temperatures
+        )
+        info += "{:04X}".format(round(model.current * 100) & 0xFFFF)
+        info += "{:04X}".format(round(model.voltage * 100))
+        info += "{:04X}".format(round(model.capacity_remain * 100))
+        info += "0A"
+        info += "{:04X}".format(round(model.capacity * 100))
+        info += "{:04X}".format(round(model.soc * 10))
+        info += "{:04X}".format(round(model.capacity * 100))
+        info += "{:04X}".format(model.cycles)
+        # SoH, port voltage and reserved
+        info += "{:04X}".format(1000)
+        info += "{:04X}".format(round(model.voltage * 100))
+        info += "0" * 16
+        return info.encode()
+
+    def get_alarm(self, model: BmsModel) -> bytes:
+        """
+        Encode the alarms, 98 hex digits
+        """
+        data = bytearray(49)
+        data[35] = (1 if model.discharge_fet else 0) | (2 if model.charge_fet else 0)
+        return data.hex().upper().encode()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the AggregateBattery with two Renogy batteries on one simulated bus
+
+Run from the driver folder:
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+from aggregatebattery import AggregateBattery  # noqa: E402
+from bms.renogy import Renogy  # noqa: E402
+from simulator import BmsModel, PtyEndpoint, RenogyProtocol  # noqa: E402
+
+
+class FixedCellsModel(BmsModel):
+    """
+    Simulated battery with fixed cell voltages
+    """
+
+    def __init__(self, cell_voltages, **kwargs):
+        self.fixed_cell_voltages = cell_voltages
+        super(FixedCellsModel, self).__init__(cell_count=len(cell_voltages), **kwargs)
+
+    def update(self) -> None:
+        super(FixedCellsModel, self).update()
+        self.cell_voltages = list(self.fixed_cell_voltages)
+
+
+class TestAggregateBattery(unittest.TestCase):
+    def setUp(self):
+        # the highest cell of each index is in a different battery
+        self.models = {
+            0x30: FixedCellsModel([3.4, 3.2] * 8, soc=80.0, current=5.0),
+            0x31: FixedCellsModel([3.2, 3.4] * 8, soc=60.0, current=5.0),
+        }
+
+        self.endpoint = PtyEndpoint(RenogyProtocol(self.models))
+        threading.Thread(target=self.endpoint.run, daemon=True).start()
+
+        batteries = [
+            Renogy(self.endpoint.name, 9600, bytes([address]))
+            for address in self.models
+        ]
+        for battery in batteries:
+            self.assertTrue(battery.test_connection())
+        self.battery = AggregateBattery(batteries)
+
+    def tearDown(self):
+        utils.close_serial_port(self.endpoint.name)
+
+    def poll(self):
+        self.assertTrue(self.battery.refresh_data())
+        self.battery.calculate_cell_statistics()
+        self.battery.manage_charge_voltage()
+        self.battery.manage_charge_current()
+
+    def test_get_settings(self):
+        self.assertTrue(self.battery.get_settings())
+        self.assertIsNotNone(self.battery.max_battery_voltage)
+        self.assertIsNotNone(self.battery.min_battery_voltage)
+        self.assertIsNotNone(self.battery.max_battery_charge_current)
+
+        self.poll()
+        self.assertIsNotNone(self.battery.control_voltage)
+
+    def test_cell_voltage_sum(self):
+        self.assertTrue(self.battery.get_settings())
+        self.poll()
+
+        virtual_sum = sum(
+            self.battery.get_cell_voltage(c) for c in range(self.battery.cell_count)
+        )
+        battery_sums = [b.get_cell_voltage_sum() for b in self.battery.batteries]
+        self.assertGreater(virtual_sum, max(battery_sums))
+        self.assertAlmostEqual(self.battery.get_cell_voltage_sum(), min(battery_sums))
+
+    @mock.patch.object(utils, "DCCM_SOC_ENABLE", True)
+    @mock.patch.object(utils, "CCCM_SOC_ENABLE", True)
+    def test_soc_current_limits(self):
+        self.assertTrue(self.battery.get_settings())
+        self.poll()
+
+        for battery in self.battery.batteries:
+            self.assertEqual(battery.soc_calc, battery.soc)
+            self.assertNotEqual(battery.state, 10)
+            self.assertIsNotNone(battery.control_charge_current)
+            self.assertIsNotNone(battery.control_discharge_current)
+        self.assertIsNotNone(self.battery.control_charge_current)
+        self.assertIsNotNone(self.battery.control_discharge_current)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,21 @@
 # -*- coding: utf-8 -*-
 import logging
 
-import configparser
 from pathlib import Path
-from typing import List, Any, Callable
+from typing import Any, Dict, List, Tuple, Union
 
+import os
+import pickle
 import serial
-from time import sleep
+import threading
+from time import monotonic
 from struct import unpack_from
 import bisect
+import math
+from collections import deque
+
+import serialcapture
+from settings import Config, ConfigIssue, PiecewiseCurve, parse_config
 
 # Logging
 logging.basicConfig()
@@ -16,410 +23,236 @@ logger = logging.getLogger("SerialBattery")
 
 PATH_CONFIG_DEFAULT = "config.default.ini"
 PATH_CONFIG_USER = "config.ini"
+PATH_CONFIG_CACHE = "config_cache.pickle"
 
-config = configparser.ConfigParser()
 path = Path(__file__).parents[0]
 default_config_file_path = path.joinpath(PATH_CONFIG_DEFAULT).absolute().__str__()
 custom_config_file_path = path.joinpath(PATH_CONFIG_USER).absolute().__str__()
-config.read([default_config_file_path, custom_config_file_path])
-
-
-def _get_list_from_config(
-    group: str, option: str, mapper: Callable[[Any], Any] = lambda v: v
-) -> List[Any]:
-    rawList = config[group][option].split(",")
-    return list(
-        map(
-            mapper,
-            [item.strip() for item in rawList if item != "" and item is not None],
-        )
-    )
+config_cache_file_path = path.joinpath(PATH_CONFIG_CACHE).absolute().__str__()
+settings_file_path = path.joinpath("settings.py").absolute().__str__()
 
 
-# Constants
-DRIVER_VERSION = "1.4.20240629dev"
-zero_char = chr(48)
-degree_sign = "\N{DEGREE SIGN}"
-
-# get logging level from config file
-if config["DEFAULT"]["LOGGING"].upper() == "ERROR":
-    logger.setLevel(logging.ERROR)
-elif config["DEFAULT"]["LOGGING"].upper() == "WARNING":
-    logger.setLevel(logging.WARNING)
-elif config["DEFAULT"]["LOGGING"].upper() == "DEBUG":
-    logger.setLevel(logging.DEBUG)
-else:
-    logger.setLevel(logging.INFO)
-
-# list to store config errors
-# this is needed else the errors are not instantly visible
-errors_in_config = []
-
-# save config values to constants
-
-# --------- Battery Current limits ---------
-MAX_BATTERY_CHARGE_CURRENT: float = float(
-    config["DEFAULT"]["MAX_BATTERY_CHARGE_CURRENT"]
-)
-"""
-Defines the maximum charge current that the battery can accept.
-"""
-MAX_BATTERY_DISCHARGE_CURRENT = float(
-    config["DEFAULT"]["MAX_BATTERY_DISCHARGE_CURRENT"]
-)
-"""
-Defines the maximum discharge current that the battery can deliver.
-"""
-
-# --------- Cell Voltages ---------
-MIN_CELL_VOLTAGE: float = float(config["DEFAULT"]["MIN_CELL_VOLTAGE"])
-"""
-Defines the minimum cell voltage that the battery can have.
-Used for:
-- Limit CVL range
-- SoC calculation (if enabled)
-"""
-MAX_CELL_VOLTAGE: float = float(config["DEFAULT"]["MAX_CELL_VOLTAGE"])
-"""
-Defines the maximum cell voltage that the battery can have.
-Used for:
-- Limit CVL range
-- SoC calculation (if enabled)
-"""
-
-FLOAT_CELL_VOLTAGE: float = float(config["DEFAULT"]["FLOAT_CELL_VOLTAGE"])
-"""
-Defines the cell voltage that the battery should have when it is fully charged.
-"""
-# make some checks for most common missconfigurations
-if FLOAT_CELL_VOLTAGE > MAX_CELL_VOLTAGE:
-    FLOAT_CELL_VOLTAGE = MAX_CELL_VOLTAGE
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: FLOAT_CELL_VOLTAGE ({FLOAT_CELL_VOLTAGE} V) is greater than MAX_CELL_VOLTAGE ({MAX_CELL_VOLTAGE} V). "
-        + "To ensure that the driver still works correctly, FLOAT_CELL_VOLTAGE was set to MAX_CELL_VOLTAGE. Please check the configuration."
-    )
-# make some checks for most common missconfigurations
-if FLOAT_CELL_VOLTAGE < MIN_CELL_VOLTAGE:
-    FLOAT_CELL_VOLTAGE = MIN_CELL_VOLTAGE
-    errors_in_config.append(
-        "**CONFIG ISSUE**: FLOAT_CELL_VOLTAGE ({FLOAT_CELL_VOLTAGE} V) is less than MIN_CELL_VOLTAGE ({MIN_CELL_VOLTAGE} V). "
-        + "To ensure that the driver still works correctly, FLOAT_CELL_VOLTAGE was set to MIN_CELL_VOLTAGE. Please check the configuration."
-    )
-
-SOC_RESET_VOLTAGE: float = float(config["DEFAULT"]["SOC_RESET_VOLTAGE"])
-# make some checks for most common missconfigurations
-if SOC_RESET_VOLTAGE < MAX_CELL_VOLTAGE:
-    SOC_RESET_VOLTAGE = MAX_CELL_VOLTAGE
-    errors_in_config.append(
-        "**CONFIG ISSUE**: SOC_RESET_VOLTAGE ({SOC_RESET_VOLTAGE} V) is less than MAX_CELL_VOLTAGE ({MAX_CELL_VOLTAGE} V). "
-        + "To ensure that the driver still works correctly, SOC_RESET_VOLTAGE was set to MAX_CELL_VOLTAGE. Please check the configuration."
-    )
-SOC_RESET_AFTER_DAYS = (
-    int(config["DEFAULT"]["SOC_RESET_AFTER_DAYS"])
-    if config["DEFAULT"]["SOC_RESET_AFTER_DAYS"] != ""
-    else False
-)
-
-# --------- BMS disconnect behaviour ---------
-BLOCK_ON_DISCONNECT: bool = "True" == config["DEFAULT"]["BLOCK_ON_DISCONNECT"]
-
-# --------- Charge mode ---------
-LINEAR_LIMITATION_ENABLE: bool = "True" == config["DEFAULT"]["LINEAR_LIMITATION_ENABLE"]
-LINEAR_RECALCULATION_EVERY: int = int(config["DEFAULT"]["LINEAR_RECALCULATION_EVERY"])
-LINEAR_RECALCULATION_ON_PERC_CHANGE: int = int(
-    config["DEFAULT"]["LINEAR_RECALCULATION_ON_PERC_CHANGE"]
-)
-
-# --------- External current sensor ---------
-EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE: str = (
-    config["DEFAULT"]["EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE"]
-    if config["DEFAULT"]["EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE"] != ""
-    else None
-)
-EXTERNAL_CURRENT_SENSOR_DBUS_PATH: str = (
-    config["DEFAULT"]["EXTERNAL_CURRENT_SENSOR_DBUS_PATH"]
-    if config["DEFAULT"]["EXTERNAL_CURRENT_SENSOR_DBUS_PATH"] != ""
-    else None
-)
-
-# --------- Charge Voltage limitation (affecting CVL) ---------
-CVCM_ENABLE: bool = "True" == config["DEFAULT"]["CVCM_ENABLE"]
-"""
-Charge voltage control management
-
-Limits max charging voltage (CVL). Switch from max to float voltage and back.
-"""
-
-CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL: float = float(
-    config["DEFAULT"]["CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL"]
-)
-CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART: float = float(
-    config["DEFAULT"]["CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART"]
-)
-CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT: float = float(
-    config["DEFAULT"]["CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT"]
-)
+def get_file_stats(file_paths: Tuple[str, ...]) -> tuple:
+    """
+    Get the modification time and size of files to detect changes
 
-MAX_VOLTAGE_TIME_SEC: int = int(config["DEFAULT"]["MAX_VOLTAGE_TIME_SEC"])
-SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT: int = int(
-    config["DEFAULT"]["SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT"]
-)
+    :param file_paths: the files to check
+    :return: modification time and size of each file, None for a missing file
+    """
+    stats = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            stats.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stats.append(None)
+    return tuple(stats)
 
-CCCM_CV_ENABLE: bool = "True" == config["DEFAULT"]["CCCM_CV_ENABLE"]
-"""
-Charge current control management referring to cell-voltage
-"""
 
-DCCM_CV_ENABLE: bool = "True" == config["DEFAULT"]["DCCM_CV_ENABLE"]
-"""
-Discharge current control management referring to cell-voltage
-"""
+def get_config_cache_key() -> tuple:
+    """
+    Get the key of the config cache
 
-CELL_VOLTAGES_WHILE_CHARGING: list = _get_list_from_config(
-    "DEFAULT", "CELL_VOLTAGES_WHILE_CHARGING", lambda v: float(v)
-)
-MAX_CHARGE_CURRENT_CV: list = _get_list_from_config(
-    "DEFAULT",
-    "MAX_CHARGE_CURRENT_CV_FRACTION",
-    lambda v: MAX_BATTERY_CHARGE_CURRENT * float(v),
-)
-# make some checks for most common missconfigurations
-if CELL_VOLTAGES_WHILE_CHARGING[0] < MAX_CELL_VOLTAGE and MAX_CHARGE_CURRENT_CV[0] == 0:
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: Maximum value of CELL_VOLTAGES_WHILE_CHARGING ({CELL_VOLTAGES_WHILE_CHARGING[0]} V) "
-        + f"is lower than MAX_CELL_VOLTAGE ({MAX_CELL_VOLTAGE} V). MAX_CELL_VOLTAGE will never be reached this way "
-        + "and battery will not change to float. Please check the configuration."
-    )
-# make some checks for most common missconfigurations
-if (
-    SOC_RESET_AFTER_DAYS is not False
-    and CELL_VOLTAGES_WHILE_CHARGING[0] < SOC_RESET_VOLTAGE
-    and MAX_CHARGE_CURRENT_CV[0] == 0
-):
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: Maximum value of CELL_VOLTAGES_WHILE_CHARGING ({CELL_VOLTAGES_WHILE_CHARGING[0]} V) "
-        + f"is lower than SOC_RESET_VOLTAGE ({SOC_RESET_VOLTAGE} V). SOC_RESET_VOLTAGE will never be reached this way "
-        + "and battery will not change to float. Please check the configuration."
-    )
-# make some checks for most common missconfigurations
-if MAX_BATTERY_CHARGE_CURRENT not in MAX_CHARGE_CURRENT_CV:
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: In MAX_CHARGE_CURRENT_CV_FRACTION ({', '.join(map(str, _get_list_from_config('DEFAULT', 'MAX_CHARGE_CURRENT_CV_FRACTION', lambda v: float(v))))}) "
-        + "there is no value set to 1. This means that the battery will never use the maximum charge current. Please check the configuration."
-    )
+    The key changes, if one of the config files or the files parsing them change.
 
-CELL_VOLTAGES_WHILE_DISCHARGING: list = _get_list_from_config(
-    "DEFAULT", "CELL_VOLTAGES_WHILE_DISCHARGING", lambda v: float(v)
-)
-MAX_DISCHARGE_CURRENT_CV: list = _get_list_from_config(
-    "DEFAULT",
-    "MAX_DISCHARGE_CURRENT_CV_FRACTION",
-    lambda v: MAX_BATTERY_DISCHARGE_CURRENT * float(v),
-)
-# make some checks for most common missconfigurations
-if (
-    CELL_VOLTAGES_WHILE_DISCHARGING[0] > MIN_CELL_VOLTAGE
-    and MAX_DISCHARGE_CURRENT_CV[0] == 0
-):
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: Minimum value of CELL_VOLTAGES_WHILE_DISCHARGING ({CELL_VOLTAGES_WHILE_DISCHARGING[0]} V) "
-        + f"is higher than MIN_CELL_VOLTAGE ({MIN_CELL_VOLTAGE} V). MIN_CELL_VOLTAGE will never be reached this way. "
-        + "Please check the configuration."
-    )
-# make some checks for most common missconfigurations
-if MAX_BATTERY_DISCHARGE_CURRENT not in MAX_DISCHARGE_CURRENT_CV:
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: In MAX_DISCHARGE_CURRENT_CV_FRACTION ({', '.join(map(str, _get_list_from_config('DEFAULT', 'MAX_DISCHARGE_CURRENT_CV_FRACTION', lambda v: float(v))))}) "
-        + "there is no value set to 1. This means that the battery will never use the maximum discharge current. Please check the configuration."
+    :return: modification time and size of each file, None for a missing file
+    """
+    return get_file_stats(
+        (
+            default_config_file_path,
+            custom_config_file_path,
+            settings_file_path,
+            __file__,
+        )
     )
 
-# --------- Cell Voltage limitation (affecting CVL) ---------
 
-CVL_ICONTROLLER_MODE: bool = "True" == config["DEFAULT"]["CVL_ICONTROLLER_MODE"]
-CVL_ICONTROLLER_FACTOR: float = float(config["DEFAULT"]["CVL_ICONTROLLER_FACTOR"])
-
-# --------- Temperature limitation (affecting CCL/DCL) ---------
-CCCM_T_ENABLE: bool = "True" == config["DEFAULT"]["CCCM_T_ENABLE"]
-"""
-Charge current control management referring to temperature
-"""
+def load_config() -> Tuple[Config, List[ConfigIssue]]:
+    """
+    Load the config from the cache or parse it, if the config files changed
 
-DCCM_T_ENABLE: bool = "True" == config["DEFAULT"]["DCCM_T_ENABLE"]
-"""
-Discharge current control management referring to temperature
-"""
+    The cache is read with a single read and saves parsing and checking the config files
+    on every start of the driver.
 
-TEMPERATURES_WHILE_CHARGING: list = _get_list_from_config(
-    "DEFAULT", "TEMPERATURES_WHILE_CHARGING", lambda v: float(v)
-)
-MAX_CHARGE_CURRENT_T: list = _get_list_from_config(
-    "DEFAULT",
-    "MAX_CHARGE_CURRENT_T_FRACTION",
-    lambda v: MAX_BATTERY_CHARGE_CURRENT * float(v),
-)
-# make some checks for most common missconfigurations
-if MAX_BATTERY_CHARGE_CURRENT not in MAX_CHARGE_CURRENT_T:
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: In MAX_CHARGE_CURRENT_T_FRACTION ({', '.join(map(str, _get_list_from_config('DEFAULT', 'MAX_CHARGE_CURRENT_T_FRACTION', lambda v: float(v))))}) "
-        + "there is no value set to 1. This means that the battery will never use the maximum discharge current. Please check the configuration."
-    )
+    :return: the config values and the issues found while checking them
+    """
+    key = get_config_cache_key()
+    try:
+        with open(config_cache_file_path, "rb") as f:
+            cache = pickle.load(f)
+        if cache["key"] == key:
+            return cache["config"], cache["errors"]
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.debug(f"Could not read config cache: {e}")
 
-TEMPERATURES_WHILE_DISCHARGING: list = _get_list_from_config(
-    "DEFAULT", "TEMPERATURES_WHILE_DISCHARGING", lambda v: float(v)
-)
-MAX_DISCHARGE_CURRENT_T: list = _get_list_from_config(
-    "DEFAULT",
-    "MAX_DISCHARGE_CURRENT_T_FRACTION",
-    lambda v: MAX_BATTERY_DISCHARGE_CURRENT * float(v),
-)
-# make some checks for most common missconfigurations
-if MAX_BATTERY_DISCHARGE_CURRENT not in MAX_DISCHARGE_CURRENT_T:
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: In MAX_DISCHARGE_CURRENT_T_FRACTION ({', '.join(map(str, _get_list_from_config('DEFAULT', 'MAX_DISCHARGE_CURRENT_T_FRACTION', lambda v: float(v))))}) "
-        + "there is no value set to 1. This means that the battery will never use the maximum discharge current. Please check the configuration."
-    )
+    config, errors = parse_config([default_config_file_path, custom_config_file_path])
 
-# --------- SOC limitation (affecting CCL/DCL) ---------
-CCCM_SOC_ENABLE: bool = "True" == config["DEFAULT"]["CCCM_SOC_ENABLE"]
-"""
-Charge current control management referring to SoC
-"""
+    try:
+        # write to a temporary file first, so that a power loss can't corrupt the cache
+        with open(config_cache_file_path + ".tmp", "wb") as f:
+            pickle.dump({"key": key, "config": config, "errors": errors}, f)
+        os.replace(config_cache_file_path + ".tmp", config_cache_file_path)
+    except OSError as e:
+        logger.debug(f"Could not write config cache: {e}")
 
-DCCM_SOC_ENABLE: bool = "True" == config["DEFAULT"]["DCCM_SOC_ENABLE"]
-"""
-Discharge current control management referring to SoC
-"""
+    return config, errors
 
-SOC_WHILE_CHARGING: list = _get_list_from_config(
-    "DEFAULT", "SOC_WHILE_CHARGING", lambda v: float(v)
-)
-MAX_CHARGE_CURRENT_SOC: list = _get_list_from_config(
-    "DEFAULT",
-    "MAX_CHARGE_CURRENT_SOC_FRACTION",
-    lambda v: MAX_BATTERY_CHARGE_CURRENT * float(v),
-)
-# make some checks for most common missconfigurations
-if MAX_BATTERY_CHARGE_CURRENT not in MAX_CHARGE_CURRENT_SOC:
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: In MAX_CHARGE_CURRENT_SOC_FRACTION ({', '.join(map(str, _get_list_from_config('DEFAULT', 'MAX_CHARGE_CURRENT_SOC_FRACTION', lambda v: float(v))))}) "
-        + "there is no value set to 1. This means that the battery will never use the maximum charge current. Please check the configuration."
-    )
 
-SOC_WHILE_DISCHARGING: list = _get_list_from_config(
-    "DEFAULT", "SOC_WHILE_DISCHARGING", lambda v: float(v)
-)
-MAX_DISCHARGE_CURRENT_SOC: list = _get_list_from_config(
-    "DEFAULT",
-    "MAX_DISCHARGE_CURRENT_SOC_FRACTION",
-    lambda v: MAX_BATTERY_DISCHARGE_CURRENT * float(v),
-)
-# make some checks for most common missconfigurations
-if MAX_BATTERY_DISCHARGE_CURRENT not in MAX_DISCHARGE_CURRENT_SOC:
-    errors_in_config.append(
-        f"**CONFIG ISSUE**: In MAX_DISCHARGE_CURRENT_SOC_FRACTION ({', '.join(map(str, _get_list_from_config('DEFAULT', 'MAX_DISCHARGE_CURRENT_SOC_FRACTION', lambda v: float(v))))}) "
-        + "there is no value set to 1. This means that the battery will never use the maximum discharge current. Please check the configuration."
-    )
-
-# --------- Time-To-Go ---------
-TIME_TO_GO_ENABLE: bool = "True" == config["DEFAULT"]["TIME_TO_GO_ENABLE"]
+# Constants
+DRIVER_VERSION = "1.4.20240629dev"
+zero_char = chr(48)
+degree_sign = "\N{DEGREE SIGN}"
 
-# --------- Time-To-Soc ---------
-TIME_TO_SOC_POINTS: list = _get_list_from_config(
-    "DEFAULT", "TIME_TO_SOC_POINTS", lambda v: int(v)
+# save config values to constants, see settings.py
+config, errors_in_config = load_config()
+
+MAX_BATTERY_CHARGE_CURRENT: float = config.MAX_BATTERY_CHARGE_CURRENT
+MAX_BATTERY_DISCHARGE_CURRENT: float = config.MAX_BATTERY_DISCHARGE_CURRENT
+MIN_CELL_VOLTAGE: float = config.MIN_CELL_VOLTAGE
+MAX_CELL_VOLTAGE: float = config.MAX_CELL_VOLTAGE
+FLOAT_CELL_VOLTAGE: float = config.FLOAT_CELL_VOLTAGE
+SOC_RESET_VOLTAGE: float = config.SOC_RESET_VOLTAGE
+SOC_RESET_AFTER_DAYS: Union[int, bool] = config.SOC_RESET_AFTER_DAYS
+BLOCK_ON_DISCONNECT: bool = config.BLOCK_ON_DISCONNECT
+LINEAR_LIMITATION_ENABLE: bool = config.LINEAR_LIMITATION_ENABLE
+LINEAR_RECALCULATION_EVERY: int = config.LINEAR_RECALCULATION_EVERY
+LINEAR_RECALCULATION_ON_PERC_CHANGE: int = config.LINEAR_RECALCULATION_ON_PERC_CHANGE
+EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE: Union[str, None] = (
+    config.EXTERNAL_CURRENT_SENSOR_DBUS_DEVICE
 )
-TIME_TO_SOC_VALUE_TYPE: int = int(config["DEFAULT"]["TIME_TO_SOC_VALUE_TYPE"])
-TIME_TO_SOC_RECALCULATE_EVERY: int = (
-    int(config["DEFAULT"]["TIME_TO_SOC_RECALCULATE_EVERY"])
-    if int(config["DEFAULT"]["TIME_TO_SOC_RECALCULATE_EVERY"]) > 5
-    else 5
+EXTERNAL_CURRENT_SENSOR_DBUS_PATH: Union[str, None] = (
+    config.EXTERNAL_CURRENT_SENSOR_DBUS_PATH
 )
-TIME_TO_SOC_INC_FROM: bool = "True" == config["DEFAULT"]["TIME_TO_SOC_INC_FROM"]
-
-# --------- SOC calculation ---------
-SOC_CALCULATION: bool = "True" == config["DEFAULT"]["SOC_CALCULATION"]
-SOC_RESET_CURRENT: float = float(config["DEFAULT"]["SOC_RESET_CURRENT"])
-SOC_RESET_TIME: int = int(config["DEFAULT"]["SOC_RESET_TIME"])
-SOC_CALC_CURRENT_REPORTED_BY_BMS: list = _get_list_from_config(
-    "DEFAULT", "SOC_CALC_CURRENT_REPORTED_BY_BMS", lambda v: float(v)
+CVCM_ENABLE: bool = config.CVCM_ENABLE
+CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL: float = (
+    config.CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_UNTIL
 )
-SOC_CALC_CURRENT_MEASURED_BY_USER: list = _get_list_from_config(
-    "DEFAULT", "SOC_CALC_CURRENT_MEASURED_BY_USER", lambda v: float(v)
+CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART: float = (
+    config.CELL_VOLTAGE_DIFF_KEEP_MAX_VOLTAGE_TIME_RESTART
 )
-# check if lists are different
-# this allows to calculate linear relationship between the two lists only if needed
-if SOC_CALC_CURRENT_REPORTED_BY_BMS == SOC_CALC_CURRENT_MEASURED_BY_USER:
-    SOC_CALC_CURRENT: bool = False
-else:
-    SOC_CALC_CURRENT: bool = True
-
-# --------- Additional settings ---------
-BMS_TYPE: list = _get_list_from_config("DEFAULT", "BMS_TYPE", lambda v: str(v))
-
-EXCLUDED_DEVICES: list = _get_list_from_config(
-    "DEFAULT", "EXCLUDED_DEVICES", lambda v: str(v)
+CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT: float = (
+    config.CELL_VOLTAGE_DIFF_TO_RESET_VOLTAGE_LIMIT
 )
-
-POLL_INTERVAL: float = (
-    float(config["DEFAULT"]["POLL_INTERVAL"]) * 1000
-    if config["DEFAULT"]["POLL_INTERVAL"] != ""
-    else None
-)
-"""
-Poll interval in milliseconds
-"""
-
-# Auto reset SoC
-AUTO_RESET_SOC: bool = "True" == config["DEFAULT"]["AUTO_RESET_SOC"]
-
-# Publish the config settings to the dbus path "/Info/Config/"
-PUBLISH_CONFIG_VALUES: bool = "True" == config["DEFAULT"]["PUBLISH_CONFIG_VALUES"]
-
-BATTERY_CELL_DATA_FORMAT: int = int(config["DEFAULT"]["BATTERY_CELL_DATA_FORMAT"])
-
-MIDPOINT_ENABLE: bool = "True" == config["DEFAULT"]["MIDPOINT_ENABLE"]
-
-TEMP_BATTERY: int = int(config["DEFAULT"]["TEMP_BATTERY"])
-
-TEMP_1_NAME: str = config["DEFAULT"]["TEMP_1_NAME"]
-TEMP_2_NAME: str = config["DEFAULT"]["TEMP_2_NAME"]
-TEMP_3_NAME: str = config["DEFAULT"]["TEMP_3_NAME"]
-TEMP_4_NAME: str = config["DEFAULT"]["TEMP_4_NAME"]
-
-GUI_PARAMETERS_SHOW_ADDITIONAL_INFO: bool = (
-    "True" == config["DEFAULT"]["GUI_PARAMETERS_SHOW_ADDITIONAL_INFO"]
+MAX_VOLTAGE_TIME_SEC: int = config.MAX_VOLTAGE_TIME_SEC
+SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT: int = config.SOC_LEVEL_TO_RESET_VOLTAGE_LIMIT
+CCCM_CV_ENABLE: bool = config.CCCM_CV_ENABLE
+DCCM_CV_ENABLE: bool = config.DCCM_CV_ENABLE
+CELL_VOLTAGES_WHILE_CHARGING: List[float] = config.CELL_VOLTAGES_WHILE_CHARGING
+MAX_CHARGE_CURRENT_CV: List[float] = config.MAX_CHARGE_CURRENT_CV
+MAX_CHARGE_CURRENT_CV_CURVE: PiecewiseCurve = config.MAX_CHARGE_CURRENT_CV_CURVE
+CELL_VOLTAGES_WHILE_DISCHARGING: List[float] = config.CELL_VOLTAGES_WHILE_DISCHARGING
+MAX_DISCHARGE_CURRENT_CV: List[float] = config.MAX_DISCHARGE_CURRENT_CV
+MAX_DISCHARGE_CURRENT_CV_CURVE: PiecewiseCurve = config.MAX_DISCHARGE_CURRENT_CV_CURVE
+CVL_ICONTROLLER_MODE: bool = config.CVL_ICONTROLLER_MODE
+CVL_ICONTROLLER_FACTOR: float = config.CVL_ICONTROLLER_FACTOR
+CCCM_T_ENABLE: bool = config.CCCM_T_ENABLE
+DCCM_T_ENABLE: bool = config.DCCM_T_ENABLE
+TEMPERATURES_WHILE_CHARGING: List[float] = config.TEMPERATURES_WHILE_CHARGING
+MAX_CHARGE_CURRENT_T: List[float] = config.MAX_CHARGE_CURRENT_T
+MAX_CHARGE_CURRENT_T_CURVE: PiecewiseCurve = config.MAX_CHARGE_CURRENT_T_CURVE
+TEMPERATURES_WHILE_DISCHARGING: List[float] = config.TEMPERATURES_WHILE_DISCHARGING
+MAX_DISCHARGE_CURRENT_T: List[float] = config.MAX_DISCHARGE_CURRENT_T
+MAX_DISCHARGE_CURRENT_T_CURVE: PiecewiseCurve = config.MAX_DISCHARGE_CURRENT_T_CURVE
+CCCM_SOC_ENABLE: bool = config.CCCM_SOC_ENABLE
+DCCM_SOC_ENABLE: bool = config.DCCM_SOC_ENABLE
+SOC_WHILE_CHARGING: List[float] = config.SOC_WHILE_CHARGING
+MAX_CHARGE_CURRENT_SOC: List[float] = config.MAX_CHARGE_CURRENT_SOC
+MAX_CHARGE_CURRENT_SOC_CURVE: PiecewiseCurve = config.MAX_CHARGE_CURRENT_SOC_CURVE
+SOC_WHILE_DISCHARGING: List[float] = config.SOC_WHILE_DISCHARGING
+MAX_DISCHARGE_CURRENT_SOC: List[float] = config.MAX_DISCHARGE_CURRENT_SOC
+MAX_DISCHARGE_CURRENT_SOC_CURVE: PiecewiseCurve = config.MAX_DISCHARGE_CURRENT_SOC_CURVE
+TIME_TO_GO_ENABLE: bool = config.TIME_TO_GO_ENABLE
+TIME_TO_SOC_POINTS: List[int] = config.TIME_TO_SOC_POINTS
+TIME_TO_SOC_VALUE_TYPE: int = config.TIME_TO_SOC_VALUE_TYPE
+TIME_TO_SOC_RECALCULATE_EVERY: int = config.TIME_TO_SOC_RECALCULATE_EVERY
+TIME_TO_SOC_INC_FROM: bool = config.TIME_TO_SOC_INC_FROM
+SOC_CALCULATION: bool = config.SOC_CALCULATION
+SOC_RESET_CURRENT: float = config.SOC_RESET_CURRENT
+SOC_RESET_TIME: int = config.SOC_RESET_TIME
+SOC_CALC_CURRENT_REPORTED_BY_BMS: List[float] = config.SOC_CALC_CURRENT_REPORTED_BY_BMS
+SOC_CALC_CURRENT_MEASURED_BY_USER: List[float] = (
+    config.SOC_CALC_CURRENT_MEASURED_BY_USER
 )
-# --------- BMS specific settings ---------
-
-# -- Unique ID settings
-USE_PORT_AS_UNIQUE_ID: bool = "True" == config["DEFAULT"]["USE_PORT_AS_UNIQUE_ID"]
+SOC_CALC_CURRENT: bool = config.SOC_CALC_CURRENT
+SOC_CALC_CURRENT_CURVE: Union[PiecewiseCurve, None] = config.SOC_CALC_CURRENT_CURVE
+BMS_TYPE: List[str] = config.BMS_TYPE
+EXCLUDED_DEVICES: List[str] = config.EXCLUDED_DEVICES
+BUS_ADDRESSES: List[bytes] = config.BUS_ADDRESSES
+BUS_AGGREGATE: bool = config.BUS_AGGREGATE
+POLL_INTERVAL: Union[float, None] = config.POLL_INTERVAL
+POLL_IN_THREAD: bool = config.POLL_IN_THREAD
+POLL_INTERVAL_ADAPTIVE: bool = config.POLL_INTERVAL_ADAPTIVE
+POLL_INTERVAL_MIN: Union[float, None] = config.POLL_INTERVAL_MIN
+POLL_INTERVAL_MAX: float = config.POLL_INTERVAL_MAX
+REFRESH_PERIOD_MEDIUM: float = config.REFRESH_PERIOD_MEDIUM
+REFRESH_PERIOD_SLOW: float = config.REFRESH_PERIOD_SLOW
+AUTO_RESET_SOC: bool = config.AUTO_RESET_SOC
+PUBLISH_CONFIG_VALUES: bool = config.PUBLISH_CONFIG_VALUES
+SERIAL_CAPTURE: bool = config.SERIAL_CAPTURE
+CONFIG_RELOAD: bool = config.CONFIG_RELOAD
+PUBLISH_TIMING_STATISTICS: bool = config.PUBLISH_TIMING_STATISTICS
+BATTERY_CELL_DATA_FORMAT: int = config.BATTERY_CELL_DATA_FORMAT
+MIDPOINT_ENABLE: bool = config.MIDPOINT_ENABLE
+TEMP_BATTERY: int = config.TEMP_BATTERY
+TEMP_1_NAME: str = config.TEMP_1_NAME
+TEMP_2_NAME: str = config.TEMP_2_NAME
+TEMP_3_NAME: str = config.TEMP_3_NAME
+TEMP_4_NAME: str = config.TEMP_4_NAME
+GUI_PARAMETERS_SHOW_ADDITIONAL_INFO: bool = config.GUI_PARAMETERS_SHOW_ADDITIONAL_INFO
+USE_PORT_AS_UNIQUE_ID: bool = config.USE_PORT_AS_UNIQUE_ID
+SOC_LOW_WARNING: float = config.SOC_LOW_WARNING
+SOC_LOW_ALARM: float = config.SOC_LOW_ALARM
+BATTERY_CAPACITY: float = config.BATTERY_CAPACITY
+INVERT_CURRENT_MEASUREMENT: int = config.INVERT_CURRENT_MEASUREMENT
+JKBMS_CAN_CELL_COUNT: int = config.JKBMS_CAN_CELL_COUNT
+GREENMETER_ADDRESS: int = config.GREENMETER_ADDRESS
+LIPRO_START_ADDRESS: int = config.LIPRO_START_ADDRESS
+LIPRO_END_ADDRESS: int = config.LIPRO_END_ADDRESS
+LIPRO_CELL_COUNT: int = config.LIPRO_CELL_COUNT
+HELTEC_MODBUS_ADDR: List[int] = config.HELTEC_MODBUS_ADDR
+SEPLOS_USE_BMS_VALUES: bool = config.SEPLOS_USE_BMS_VALUES
+VOLTAGE_DROP: float = config.VOLTAGE_DROP
+
+
+def set_logging_level(level: str) -> None:
+    """
+    Set the logging level from the config file
 
-# -- LltJbd settings
-SOC_LOW_WARNING: float = float(config["DEFAULT"]["SOC_LOW_WARNING"])
-SOC_LOW_ALARM: float = float(config["DEFAULT"]["SOC_LOW_ALARM"])
+    :param level: ERROR, WARNING, DEBUG or INFO
+    """
+    if level == "ERROR":
+        logger.setLevel(logging.ERROR)
+    elif level == "WARNING":
+        logger.setLevel(logging.WARNING)
+    elif level == "DEBUG":
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
 
-# -- Daly settings
-BATTERY_CAPACITY: float = float(config["DEFAULT"]["BATTERY_CAPACITY"])
-INVERT_CURRENT_MEASUREMENT: int = int(config["DEFAULT"]["INVERT_CURRENT_MEASUREMENT"])
 
-# -- JK BMS settings
-JKBMS_CAN_CELL_COUNT: int = int(config["DEFAULT"]["JKBMS_CAN_CELL_COUNT"])
+def apply_config_values(values: Dict[str, Any], errors: List[ConfigIssue]) -> None:
+    """
+    Replace config values while the driver is running
 
-# -- ESC GreenMeter and Lipro device settings
-GREENMETER_ADDRESS: int = int(config["DEFAULT"]["GREENMETER_ADDRESS"])
-LIPRO_START_ADDRESS: int = int(config["DEFAULT"]["LIPRO_START_ADDRESS"])
-LIPRO_END_ADDRESS: int = int(config["DEFAULT"]["LIPRO_END_ADDRESS"])
-LIPRO_CELL_COUNT: int = int(config["DEFAULT"]["LIPRO_CELL_COUNT"])
+    The values and their constants are replaced in the main loop. The charge control runs there
+    too, like the config reload, so it never sees a partly applied config.
 
-# -- HeltecModbus device settings
-HELTEC_MODBUS_ADDR: list = _get_list_from_config(
-    "DEFAULT", "HELTEC_MODBUS_ADDR", lambda v: int(v)
-)
+    :param values: the config values to replace by name
+    :param errors: the issues of the new config
+    """
+    global config
+    # raises a ValueError for names, which are not in Config
+    config = config._replace(**values)
+    for name in values:
+        globals()[name] = getattr(config, name)
+    errors_in_config[:] = errors
+    set_logging_level(config.LOGGING)
 
-# -- Seplos V3 settings
-SEPLOS_USE_BMS_VALUES: bool = "True" == config["DEFAULT"]["SEPLOS_USE_BMS_VALUES"]
 
-# --------- Voltage drop ---------
-VOLTAGE_DROP: float = float(config["DEFAULT"]["VOLTAGE_DROP"])
+# get logging level from config file
+set_logging_level(config.LOGGING)
 
 
 # --------- Functions ---------
@@ -494,18 +327,114 @@ def format_value(value, prefix, suffix):
     )
 
 
+# Serial ports that are kept open for the lifetime of the driver, keyed by port
+serial_ports = {}
+# Locks to serialize the access to a shared serial port, keyed by port
+serial_port_locks = {}
+
+
+def get_serial_port(
+    port: str,
+    baud: int,
+    timeout: float = 0.1,
+    parity: str = serial.PARITY_NONE,
+    stopbits: float = serial.STOPBITS_ONE,
+) -> serial.Serial:
+    """
+    Get the shared serial port and open it, if it's not open yet
+
+    The port stays open across polls. Settings are only changed, if they differ from the current
+    ones, since every change reconfigures the port.
+
+    :param port: the serial port
+    :param baud: the baud rate
+    :param timeout: the read timeout in seconds
+    :param parity: the parity, see serial.PARITY_*
+    :param stopbits: the stop bits, see serial.STOPBITS_*
+    :return: the opened serial port
+    """
+    ser = serial_ports.get(port)
+    if ser is None or not ser.is_open:
+        ser = serialcapture.create_serial_port(
+            port,
+            capture=SERIAL_CAPTURE,
+            baudrate=baud,
+            timeout=timeout,
+            parity=parity,
+            stopbits=stopbits,
+        )
+        serial_ports[port] = ser
+        logger.debug(f"Opened serial port {port} with {baud} baud")
+        return ser
+
+    if ser.baudrate != baud:
+        ser.baudrate = baud
+    if ser.timeout != timeout:
+        ser.timeout = timeout
+    if ser.parity != parity:
+        ser.parity = parity
+    if ser.stopbits != stopbits:
+        ser.stopbits = stopbits
+
+    return ser
+
+
+def close_serial_port(port: str) -> None:
+    """
+    Close the shared serial port, it's opened again on the next get_serial_port() call
+
+    :param port: the serial port
+    """
+    ser = serial_ports.pop(port, None)
+    if ser is not None:
+        try:
+            ser.close()
+        except serial.SerialException as e:
+            logger.error(e)
+        logger.debug(f"Closed serial port {port}")
+
+
+def get_serial_port_lock(port: str) -> threading.RLock:
+    """
+    Get the lock that has to be held while communicating over a shared serial port
+
+    :param port: the serial port
+    :return: the lock of the port
+    """
+    if port not in serial_port_locks:
+        serial_port_locks[port] = threading.RLock()
+    return serial_port_locks[port]
+
+
+def use_serial_port_for_modbus(ser: serial.Serial) -> None:
+    """
+    Let the minimalmodbus instruments use the shared serial port instead of opening their own
+
+    The instruments have to be created with close_port_after_each_call=False.
+
+    :param ser: the shared serial port
+    """
+    # imported here, so that minimalmodbus is only loaded by the drivers using it
+    import minimalmodbus
+
+    minimalmodbus._serialports[ser.port] = ser
+
+
 def read_serial_data(
     command, port, baud, length_pos, length_check, length_fixed=None, length_size=None
 ):
-    try:
-        with serial.Serial(port, baudrate=baud, timeout=0.1) as ser:
+    with get_serial_port_lock(port):
+        try:
+            ser = get_serial_port(port, baud)
             return read_serialport_data(
                 ser, command, length_pos, length_check, length_fixed, length_size
             )
 
-    except serial.SerialException as e:
-        logger.error(e)
-        return False
+        except serial.SerialException as e:
+            logger.error(e)
+            # reopen the port on the next request
+            close_serial_port(port)
+            return False
 
 
 # Open the serial port
@@ -524,6 +453,108 @@ def open_serial_port(port, baud):
     return ser
 
 
+# Time to wait for the first bytes of a reply up to the length field
+SERIAL_HEADER_TIMEOUT = 0.25
+# Time to wait for the rest of a reply, the transfer time of the missing bytes is added
+SERIAL_BODY_TIMEOUT = 0.5
+
+# Latency of the received frames per port, see get_serial_statistics()
+serial_statistics = {}
+
+
+def get_serial_statistics(port: str) -> dict:
+    """
+    Get the frame statistics of a serial port
+
+    :param port: the serial port
+    :return: dict with "frames", "errors", "latency_last" and "latency_max" in seconds and
+        "time_total", the summed up time spent in serial transactions in seconds
+    """
+    if port not in serial_statistics:
+        serial_statistics[port] = {
+            "frames": 0,
+            "errors": 0,
+            "latency_last": None,
+            "latency_max": None,
+            "time_total": 0.0,
+        }
+    return serial_statistics[port]
+
+
+def count_serial_frame(port: str, latency: float, error: bool = False) -> None:
+    """
+    Add a serial transaction to the frame statistics of a port
+
+    :param port: the serial port
+    :param latency: the time from sending the request to receiving the reply in seconds
+    :param error: True, if no valid reply was received
+    """
+    statistics = get_serial_statistics(port)
+    statistics["time_total"] += latency
+    if error:
+        statistics["errors"] += 1
+        return
+
+    statistics["frames"] += 1
+    statistics["latency_last"] = latency
+    if statistics["latency_max"] is None or latency > statistics["latency_max"]:
+        statistics["latency_max"] = latency
+
+
+class TimingStatistics:
+    """
+    Keeps the durations of the last polls of a stage to show where the poll time is spent
+    """
+
+    def __init__(self, size: int = 300):
+        self.values = deque(maxlen=size)
+
+    def add(self, value: float) -> None:
+        """
+        Add a duration
+
+        :param value: the duration in seconds
+        """
+        self.values.append(value)
+
+    def get_statistics(self) -> dict:
+        """
+        :return: dict with "last", "mean", "p95" and "max" in seconds, None if no value was added yet
+        """
+        if len(self.values) == 0:
+            return {"last": None, "mean": None, "p95": None, "max": None}
+
+        values_sorted = sorted(self.values)
+        return {
+            "last": self.values[-1],
+            "mean": sum(values_sorted) / len(values_sorted),
+            "p95": values_sorted[math.ceil(len(values_sorted) * 0.95) - 1],
+            "max": values_sorted[-1],
+        }
+
+
+def read_serialport_bytes(ser: serial.Serial, count: int, deadline: float) -> bytes:
+    """
+    Block on the serial port until `count` bytes were received or the deadline passed
+
+    :param ser: the opened serial port
+    :param count: number of bytes to read
+    :param deadline: monotonic time after which the read is aborted
+    :return: the received bytes, shorter than `count` if the deadline passed
+    """
+    data = bytearray()
+    while len(data) < count:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            break
+        ser.timeout = remaining
+        res = ser.read(count - len(data))
+        if not res:
+            break
+        data.extend(res)
+    return data
+
+
 # Read data from previously opened serial port
 def read_serialport_data(
     ser: serial.Serial,
@@ -533,9 +564,19 @@ def read_serialport_data(
     length_fixed=None,
     length_size=None,
 ):
+    """
+    Send a command and read the reply frame
+
+    Instead of polling the receive buffer, the port blocks until the missing bytes arrived. First
+    up to the length field, then the rest of the frame, which is length + length_check + 1 bytes.
+    Bytes that already arrived after the frame are returned too.
+
+    :return: the received frame or False on timeout
+    """
+    time_start = monotonic()
     try:
-        ser.flushOutput()
-        ser.flushInput()
+        # drop stale bytes of a previous, incomplete reply
+        ser.reset_input_buffer()
         ser.write(command)
 
         length_byte_size = 1
@@ -545,54 +586,61 @@ def read_serialport_data(
             elif length_size.upper() == "I" or length_size.upper() == "L":
                 length_byte_size = 4
 
-        count = 0
-        toread = ser.inWaiting()
+        data = read_serialport_bytes(
+            ser, length_pos + length_byte_size, time_start + SERIAL_HEADER_TIMEOUT
+        )
 
-        while toread < (length_pos + length_byte_size):
-            sleep(0.005)
-            toread = ser.inWaiting()
-            count += 1
-            if count > 50:
-                logger.error(">>> ERROR: No reply - returning")
-                return False
+        if len(data) < (length_pos + length_byte_size):
+            logger.error(">>> ERROR: No reply - returning [len:" + str(len(data)) + "]")
+            count_serial_frame(ser.port, monotonic() - time_start, True)
+            return False
 
-        # logger.info('serial data toread ' + str(toread))
-        res = ser.read(toread)
         if length_fixed is not None:
             length = length_fixed
         else:
-            if len(res) < (length_pos + length_byte_size):
-                logger.error(
-                    ">>> ERROR: No reply - returning [len:" + str(len(res)) + "]"
-                )
-                return False
             length_size = length_size if length_size is not None else "B"
-            length = unpack_from(">" + length_size, res, length_pos)[0]
+            length = unpack_from(">" + length_size, data, length_pos)[0]
 
         # logger.info('serial data length ' + str(length))
 
-        count = 0
-        data = bytearray(res)
-        while len(data) <= length + length_check:
-            res = ser.read(length + length_check)
-            data.extend(res)
-            # logger.info('serial data length ' + str(len(data)))
-            sleep(0.005)
-            count += 1
-            if count > 150:
-                logger.error(
-                    ">>> ERROR: No reply - returning [len:"
-                    + str(len(data))
-                    + "/"
-                    + str(length + length_check)
-                    + "]"
+        missing = length + length_check + 1 - len(data)
+        if missing > 0:
+            # allow twice the transfer time of the missing bytes with 10 bits per byte
+            data.extend(
+                read_serialport_bytes(
+                    ser,
+                    missing,
+                    monotonic()
+                    + SERIAL_BODY_TIMEOUT
+                    + missing * 20 / (ser.baudrate or 9600),
                 )
-                return False
+            )
+
+        if len(data) <= length + length_check:
+            logger.error(
+                ">>> ERROR: No reply - returning [len:"
+                + str(len(data))
+                + "/"
+                + str(length + length_check)
+                + "]"
+            )
+            count_serial_frame(ser.port, monotonic() - time_start, True)
+            return False
+
+        # take bytes that already arrived after the frame without waiting for more
+        if ser.in_waiting > 0:
+            data.extend(ser.read(ser.in_waiting))
+
+        count_serial_frame(ser.port, monotonic() - time_start)
 
         return data
 
     except serial.SerialException as e:
         logger.error(e)
+        count_serial_frame(ser.port, monotonic() - time_start, True)
+        # reopen the shared port on the next request
+        if serial_ports.get(ser.port) is ser:
+            close_serial_port(ser.port)
         return False
 
 
@@ -601,6 +649,9 @@ def publish_config_variables(dbusservice):
     for variable, value in locals_copy.items():
         if variable.startswith("__"):
             continue
+        # keep publishing the messages, consumers expect a list of strings
+        if variable == "errors_in_config":
+            value = [issue.message for issue in value]
         if (
             isinstance(value, float)
             or isinstance(value, int)
@@ -618,10 +669,19 @@ def validate_config_values() -> bool:
     """
     # loop through all errors and log them
     for error in errors_in_config:
-        logger.error(error)
+        logger.error(f"**CONFIG ISSUE**: {error.message}")
 
     # return True if there are no errors
     return len(errors_in_config) == 0
 
 
 locals_copy = locals().copy()
+
+# the config cache and the logging level are internal and not published
+for variable in (
+    "PATH_CONFIG_CACHE",
+    "config_cache_file_path",
+    "settings_file_path",
+    "LOGGING",
+):
+    locals_copy.pop(variable, None)